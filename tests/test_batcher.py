@@ -0,0 +1,67 @@
+from vectordb_bench.backend.clients.batcher import AdaptiveBatcher, is_request_too_large, MB
+
+
+class RequestTooLarge(Exception):
+    status_code = 413
+
+
+class TestAdaptiveBatcher:
+    def test_limits(self):
+        assert AdaptiveBatcher(row_bytes=1000, max_bytes=MB).batch_size == 1048
+        assert AdaptiveBatcher(row_bytes=1000, max_bytes=MB, max_rows=100).batch_size == 100
+        assert AdaptiveBatcher(row_bytes=1000, max_bytes=MB, initial_bytes=100_000).batch_size == 100
+        assert AdaptiveBatcher(row_bytes=MB, max_bytes=1000).batch_size == 1
+
+    def test_aimd(self):
+        batcher = AdaptiveBatcher(row_bytes=1, max_bytes=1600, initial_bytes=800, target_latency=1.0)
+        batcher.record(0.5)
+        assert batcher.batch_size == 900
+        batcher.record(2.0)
+        assert batcher.batch_size == 450
+        for _ in range(100):
+            batcher.record(0.1)
+        assert batcher.batch_size == 1600
+
+    def test_insert(self):
+        batcher = AdaptiveBatcher(row_bytes=1, max_bytes=30)
+        sent = []
+
+        def send(s: slice) -> int:
+            sent.append((s.start, s.stop))
+            return s.stop - s.start
+
+        assert batcher.insert(100, send) == (100, None)
+        assert sent[0] == (0, 30)
+        assert sent[-1][1] == 100
+        assert all(a[1] == b[0] for a, b in zip(sent[:-1], sent[1:], strict=True))
+        assert batcher.insert(0, send) == (0, None)
+
+    def test_too_large(self):
+        batcher = AdaptiveBatcher(row_bytes=1, max_bytes=100)
+        sizes = []
+
+        def send(s: slice) -> int:
+            sizes.append(s.stop - s.start)
+            if s.stop - s.start > 30:
+                raise RequestTooLarge()
+            return s.stop - s.start
+
+        assert batcher.insert(100, send) == (100, None)
+        assert sizes[:3] == [100, 50, 25]
+        assert max(sizes[3:]) <= 25
+
+    def test_partial_failure(self):
+        batcher = AdaptiveBatcher(row_bytes=1, max_bytes=10)
+        error = ValueError("connection reset")
+
+        def send(s: slice) -> int:
+            if s.start >= 20:
+                raise error
+            return s.stop - s.start
+
+        assert batcher.insert(100, send) == (20, error)
+
+    def test_is_request_too_large(self):
+        assert is_request_too_large(RequestTooLarge())
+        assert is_request_too_large(Exception("message length 70000000 exceeds the limit 67108864"))
+        assert not is_request_too_large(Exception("connection reset"))
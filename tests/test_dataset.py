@@ -1,11 +1,32 @@
-from vectordb_bench.backend.dataset import Dataset
+from vectordb_bench.backend.dataset import Dataset, DatasetManager, NumpyDataSetIterator, PrefetchDataSetIterator, Synthetic
+from vectordb_bench.backend.clients import MetricType
+from vectordb_bench.backend import utils, synthetic
+from vectordb_bench import config
+import gc
+import os
 import logging
+from hashlib import md5
+import numpy as np
+import pandas as pd
 import pytest
 from pydantic import ValidationError
 
 
 log = logging.getLogger("vectordb_bench")
 
+
+def write_train_files(manager, splits: list[tuple[int, int]], seed: int = 0) -> np.ndarray:
+    """write train files of random embeddings into the data_dir of the manager"""
+    manager.data_dir.mkdir(parents=True, exist_ok=True)
+    embs = np.random.default_rng(seed).random((splits[-1][1], manager.data.dim))
+    for i, (start, end) in enumerate(splits):
+        pd.DataFrame({
+            "id": np.arange(start, end),
+            "emb": list(embs[start:end]),
+        }).to_parquet(manager.data_dir.joinpath(f"{manager.train_prefix}-{i:02d}-of-{len(splits):02d}.parquet"))
+    return embs
+
+
 class TestDataSet:
     def test_iter_dataset(self):
         for ds in Dataset:
@@ -34,3 +55,272 @@ class TestDataSet:
         for i in cohere_10m:
             log.debug(i.head(1))
 
+    def test_vector_cache(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(config, "DATASET_LOCAL_DIR", tmp_path)
+        monkeypatch.setattr(config, "NUM_PER_BATCH", 7)
+        sift = Dataset.SIFT.manager(500_000)
+        embs = write_train_files(sift, [(0, 20), (20, 30)])
+
+        sift.prepare(check=False, use_cache=True)
+        batches = list(sift)
+        assert [len(ids) for ids, _ in batches] == [7, 7, 7, 7, 2]
+
+        ids = np.concatenate([ids for ids, _ in batches])
+        cached = np.concatenate([emb for _, emb in batches])
+        assert cached.dtype == np.float32
+        assert (ids == np.arange(30)).all()
+        assert np.allclose(cached, embs)
+
+        # the cache is reused while the train files are unchanged
+        emb_path, _, _ = sift._cache_paths()
+        mtime = emb_path.stat().st_mtime_ns
+        sift.prepare(check=False, use_cache=True)
+        assert emb_path.stat().st_mtime_ns == mtime
+
+        # and rebuilt once a train file is replaced under the same name
+        embs = write_train_files(sift, [(0, 20), (20, 30)], seed=1)
+        sift.prepare(check=False, use_cache=True)
+        assert emb_path.stat().st_mtime_ns != mtime
+        assert np.allclose(np.concatenate([emb for _, emb in sift]), embs)
+
+    def test_prefetch_iterator(self):
+        it = PrefetchDataSetIterator(iter(range(100)), depth=4)
+        assert list(it) == list(range(100))
+        assert it.stall_count >= 1
+        with pytest.raises(StopIteration):
+            next(it)
+
+    def test_prefetch_iterator_close(self):
+        it = PrefetchDataSetIterator(iter(range(100)), depth=2)
+        assert next(it) == 0
+        thread = it._thread
+        it.close()
+        assert not thread.is_alive()
+        assert it._queue.empty()
+        assert list(it) == []
+        it.close()
+
+    def test_prefetch_iterator_gc(self):
+        it = PrefetchDataSetIterator(iter(range(100)), depth=2)
+        assert next(it) == 0
+        thread = it._thread
+        del it
+        gc.collect()
+        assert not thread.is_alive()
+
+    def test_prefetch_iterator_error(self):
+        def gen():
+            yield 1
+            raise IndexError("no such file")
+
+        it = PrefetchDataSetIterator(gen(), depth=2)
+        assert next(it) == 1
+        with pytest.raises(IndexError):
+            next(it)
+
+    def test_etag_manifest(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(config, "DATASET_LOCAL_DIR", tmp_path)
+        sift = Dataset.SIFT.manager(500_000)
+        sift.data_dir.mkdir(parents=True)
+
+        files = []
+        for name in ["test.parquet", "neighbors.parquet", "train.parquet"]:
+            p = sift.data_dir.joinpath(name)
+            p.write_bytes(os.urandom(1024))
+            files.append((md5(p.read_bytes()).hexdigest(), p))
+
+        assert sift._match_etags(files) == [True, True, True]
+        assert set(sift._read_manifest()["files"]) == {"test.parquet", "neighbors.parquet", "train.parquet"}
+
+        # unchanged files are trusted without hashing
+        def no_hashing(*args):
+            raise AssertionError("unexpected hashing")
+        monkeypatch.setattr(utils, "match_etag", no_hashing)
+        assert sift._match_etags(files) == [True, True, True]
+
+        # a changed file is hashed again
+        monkeypatch.undo()
+        monkeypatch.setattr(config, "DATASET_LOCAL_DIR", tmp_path)
+        files[0][1].write_bytes(os.urandom(1024))
+        assert sift.match_etag(*files[0]) is False
+        assert "test.parquet" not in sift._read_manifest()["files"]
+
+    def test_offline_prepare(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(config, "DATASET_LOCAL_DIR", tmp_path)
+        monkeypatch.setattr(config, "DATASET_OFFLINE", True)
+        sift = Dataset.SIFT.manager(500_000)
+        sift.data_dir.mkdir(parents=True)
+
+        with pytest.raises(ValueError):
+            sift.prepare()
+
+        remote = {}
+        for name in ["test.parquet", "neighbors.parquet"]:
+            p = sift.data_dir.joinpath(name)
+            p.write_bytes(os.urandom(1024))
+            remote[name] = md5(p.read_bytes()).hexdigest()
+        sift._write_manifest({"remote": remote})
+        sift._validate_local_file_offline()
+
+        sift.data_dir.joinpath("neighbors.parquet").unlink()
+        with pytest.raises(ValueError):
+            sift._validate_local_file_offline()
+
+    def test_iter_numpy(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(config, "DATASET_LOCAL_DIR", tmp_path)
+        monkeypatch.setattr(config, "NUM_PER_BATCH", 8)
+        sift = Dataset.SIFT.manager(500_000)
+        embs = write_train_files(sift, [(0, 20), (20, 30)])
+        sift.prepare(check=False, use_cache=False)
+
+        batches = list(sift.iter_numpy())
+        assert [len(ids) for ids, _ in batches] == [8, 8, 4, 8, 2]
+        for (ids, emb), df in zip(batches, sift, strict=True):
+            assert ids.dtype == np.int64
+            assert emb.dtype == np.float32
+            assert emb.shape == (len(ids), sift.data.dim)
+            assert (ids == df["id"].to_numpy()).all()
+            assert np.allclose(emb, np.stack(df["emb"]))
+        assert np.allclose(np.concatenate([emb for _, emb in batches]), embs)
+
+    def test_normalized_cache(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(config, "DATASET_LOCAL_DIR", tmp_path)
+        monkeypatch.setattr(config, "NUM_PER_BATCH", 7)
+        ds = DatasetManager(data=Synthetic(size=1000, dim=8, metric_type=MetricType.COSINE))
+        ds.prepare(normalize=True, use_cache=True)
+        assert ds.use_cache and ds.normalized
+
+        emb = np.concatenate([emb for _, emb in ds.iter_numpy()])
+        raw = np.concatenate([emb for _, emb in NumpyDataSetIterator(ds)])
+        assert np.allclose(np.linalg.norm(emb, axis=1), 1)
+        assert np.allclose(emb, raw / np.linalg.norm(raw, axis=1, keepdims=True))
+
+        test_emb = ds.test_emb()
+        assert np.allclose(np.linalg.norm(test_emb, axis=1), 1)
+
+        # the preprocessed train and test embeddings are reused by the next runs
+        emb_path, _, _ = ds._cache_paths()
+        test_path = ds.cache_dir.joinpath("test_emb_normalized.npy")
+        mtimes = emb_path.stat().st_mtime_ns, test_path.stat().st_mtime_ns
+        ds.prepare(normalize=True, use_cache=True)
+        assert np.array_equal(ds.test_emb(), test_emb)
+        assert (emb_path.stat().st_mtime_ns, test_path.stat().st_mtime_ns) == mtimes
+
+        ds.prepare(normalize=False)
+        assert not ds.use_cache
+        assert np.allclose(np.concatenate([emb for _, emb in ds.iter_numpy()]), raw)
+
+    def test_normalize_without_cache(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(config, "DATASET_LOCAL_DIR", tmp_path)
+        ds = DatasetManager(data=Synthetic(size=1000, dim=8, metric_type=MetricType.COSINE))
+        ds.prepare(normalize=True, use_cache=False)
+        # the train data is left to the insert runners to normalize, nothing is cached
+        assert not ds.use_cache and not ds.normalized
+        assert not list(ds.cache_dir.glob("*_emb*.npy"))
+        raw = np.concatenate([emb for _, emb in NumpyDataSetIterator(ds)])
+        assert np.allclose(np.concatenate([emb for _, emb in ds.iter_numpy()]), raw)
+        assert np.allclose(np.linalg.norm(ds.test_emb(), axis=1), 1)
+
+    @pytest.mark.parametrize("use_cache", [False, True])
+    @pytest.mark.parametrize("num_workers", [1, 2, 3])
+    def test_iter_numpy_shards(self, tmp_path, monkeypatch, num_workers, use_cache):
+        monkeypatch.setattr(config, "DATASET_LOCAL_DIR", tmp_path)
+        monkeypatch.setattr(config, "NUM_PER_BATCH", 4)
+        sift = Dataset.SIFT.manager(500_000)
+        write_train_files(sift, [(0, 10), (10, 30)])
+        sift.prepare(check=False, use_cache=use_cache)
+
+        shards = [np.concatenate([ids for ids, _ in sift.iter_numpy(w, num_workers)]) for w in range(num_workers)]
+        assert all(len(s) > 0 for s in shards)
+        assert (np.sort(np.concatenate(shards)) == np.arange(30)).all()
+
+        with pytest.raises(ValueError):
+            sift.iter_numpy(num_workers, num_workers)
+
+    @pytest.mark.parametrize("distribution", ["gaussian", "clustered", "normalized"])
+    @pytest.mark.parametrize("metric_type", [MetricType.L2, MetricType.COSINE, MetricType.IP])
+    def test_synthetic(self, tmp_path, monkeypatch, distribution, metric_type):
+        monkeypatch.setattr(config, "DATASET_LOCAL_DIR", tmp_path)
+        monkeypatch.setattr(synthetic, "ROWS_PER_FILE", 1000)
+        monkeypatch.setattr(synthetic, "BLOCK_SIZE", 500)
+        ds = DatasetManager(data=Synthetic(size=2500, dim=16, metric_type=metric_type, distribution=distribution))
+        ds.prepare()
+        assert ds.train_files == ["train-00-of-03.parquet", "train-01-of-03.parquet", "train-02-of-03.parquet"]
+
+        batches = list(ds.iter_numpy())
+        ids = np.concatenate([ids for ids, _ in batches])
+        train = np.concatenate([emb for _, emb in batches])
+        assert (ids == np.arange(2500)).all()
+
+        test = np.stack(ds.test_data["emb"]).astype(np.float32)
+        if metric_type == MetricType.L2:
+            scores = -((test[:, np.newaxis, :] - train[np.newaxis, :, :]) ** 2).sum(axis=2)
+        elif metric_type == MetricType.COSINE:
+            scores = (test / np.linalg.norm(test, axis=1, keepdims=True)) @ (train / np.linalg.norm(train, axis=1, keepdims=True)).T
+        else:
+            scores = test @ train.T
+        expected = np.argsort(-scores, axis=1)[:, :100]
+
+        gt = np.stack(ds.get_ground_truth()["neighbors_id"])
+        assert gt.shape == (1000, 100)
+        assert np.mean([len(set(a) & set(b)) / 100 for a, b in zip(gt, expected, strict=True)]) > 0.999
+
+        # the same parameters generate the same dataset, the files are reused
+        mtime = ds.data_dir.joinpath("test.parquet").stat().st_mtime_ns
+        ds.prepare()
+        assert ds.data_dir.joinpath("test.parquet").stat().st_mtime_ns == mtime
+        again = synthetic.SyntheticGenerator(16, distribution, 42).block(500, synthetic.SyntheticGenerator.TRAIN, 1)
+        assert np.array_equal(again, train[500:1000])
+
+    def test_compute_ground_truth(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(config, "DATASET_LOCAL_DIR", tmp_path)
+        sift = Dataset.SIFT.manager(500_000)
+        embs = write_train_files(sift, [(0, 300), (300, 500)])
+        test = np.random.default_rng(1).random((10, sift.data.dim))
+        pd.DataFrame({"id": np.arange(10), "emb": list(test)}).to_parquet(sift.data_dir.joinpath("test.parquet"))
+        sift.prepare(check=False)
+
+        # interrupted after the first train file
+        second = sift.data_dir.joinpath(sift.train_files[1])
+        second.rename(tmp_path.joinpath("moved.parquet"))
+        with pytest.raises(FileNotFoundError):
+            sift.compute_ground_truth()
+        assert sift.cache_dir.joinpath("neighbors.parquet.checkpoint.npz").exists()
+
+        tmp_path.joinpath("moved.parquet").rename(second)
+        gt = sift.get_ground_truth()
+        assert not sift.cache_dir.joinpath("neighbors.parquet.checkpoint.npz").exists()
+
+        dists = np.sqrt(((test[:, np.newaxis, :] - embs[np.newaxis, :, :]) ** 2).sum(axis=2))
+        expected = np.argsort(dists, axis=1)[:, :100]
+        assert (np.stack(gt["neighbors_id"]) == expected).all()
+        assert np.allclose(np.stack(gt["neighbors_distance"]), np.take_along_axis(dists, expected, axis=1), atol=1e-3)
+
+    @pytest.mark.parametrize("filter_rate", [0.001, 0.5, 0.99, 0.999])
+    def test_filtered_ground_truth(self, tmp_path, monkeypatch, filter_rate):
+        monkeypatch.setattr(config, "DATASET_LOCAL_DIR", tmp_path)
+        ds = DatasetManager(data=Synthetic(size=2000, dim=8))
+        ds.prepare()
+
+        gt = np.stack(ds.get_ground_truth(filter_rate)["neighbors_id"])
+        min_id = round(filter_rate * 2000)
+        assert gt.shape == (1000, min(100, 2000 - min_id))
+        assert (gt >= min_id).all()
+
+        # the filtered neighbors are the unfiltered ones in the surviving id range, in the same order
+        full = ds.compute_ground_truth(k=2000, file_name="neighbors_full.parquet")
+        full = np.stack(ds._read_file(full.name)["neighbors_id"])
+        expected = np.stack([row[row >= min_id][:gt.shape[1]] for row in full])
+        assert (gt == expected).mean() > 0.999
+
+    def test_zero_filter_rate(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(config, "DATASET_LOCAL_DIR", tmp_path)
+        ds = DatasetManager(data=Synthetic(size=2000, dim=8))
+        ds.prepare()
+
+        assert ds.get_ground_truth(0).equals(ds.get_ground_truth())
+        assert [p.name for p in ds.data_dir.glob("neighbors*.parquet")] == ["neighbors.parquet"]
+
+    def test_filters_error(self):
+        with pytest.raises(ValueError):
+            Dataset.COHERE.manager(100_000).get_ground_truth(1.5)
@@ -0,0 +1,102 @@
+import os
+import logging
+import pytest
+from fsspec.implementations.local import LocalFileSystem
+
+from vectordb_bench.backend.downloader import ParallelDownloader
+
+
+log = logging.getLogger("vectordb_bench")
+
+
+class CountingFileSystem(LocalFileSystem):
+    """local stand-in of s3, counts the range reads"""
+    cachable = False
+
+    def __init__(self, fail_after: int | None = None, **kwargs):
+        super().__init__(**kwargs)
+        self.reads = []
+        self.fail_after = fail_after
+
+    def cat_file(self, path, start=None, end=None, **kwargs):
+        if self.fail_after is not None and len(self.reads) >= self.fail_after:
+            raise ConnectionError("connection reset")
+        self.reads.append((path, start, end))
+        return super().cat_file(path, start=start, end=end, **kwargs)
+
+
+class TestDownloader:
+    @pytest.fixture
+    def remote(self, tmp_path):
+        remote = tmp_path.joinpath("remote")
+        remote.mkdir()
+        files = {"train.parquet": os.urandom(1000), "test.parquet": os.urandom(250), "empty.parquet": b""}
+        for name, data in files.items():
+            remote.joinpath(name).write_bytes(data)
+        return remote, files
+
+    def test_download(self, tmp_path, remote):
+        remote_dir, files = remote
+        fs = CountingFileSystem()
+        local = tmp_path.joinpath("local")
+
+        n = ParallelDownloader(fs, workers=4, chunk_size=100).download(
+            [remote_dir.joinpath(name).as_posix() for name in files], local)
+
+        assert n == 1250
+        assert len(fs.reads) == 10 + 3
+        for name, data in files.items():
+            assert local.joinpath(name).read_bytes() == data
+        assert sorted(p.name for p in local.iterdir()) == sorted(files)
+
+    def test_resume(self, tmp_path, remote):
+        remote_dir, files = remote
+        local = tmp_path.joinpath("local")
+        paths = [remote_dir.joinpath("train.parquet").as_posix()]
+
+        with pytest.raises(ConnectionError):
+            ParallelDownloader(CountingFileSystem(fail_after=4), workers=1, chunk_size=100).download(paths, local)
+        assert not local.joinpath("train.parquet").exists()
+        assert local.joinpath("train.parquet.partial").exists()
+
+        fs = CountingFileSystem()
+        n = ParallelDownloader(fs, workers=4, chunk_size=100).download(paths, local)
+        assert n == 600
+        assert len(fs.reads) == 6
+        assert local.joinpath("train.parquet").read_bytes() == files["train.parquet"]
+        assert not local.joinpath("train.parquet.partial").exists()
+        assert not local.joinpath("train.parquet.partial.json").exists()
+
+    def test_resume_changed_remote(self, tmp_path, remote):
+        remote_dir, _ = remote
+        local = tmp_path.joinpath("local")
+        remote_file = remote_dir.joinpath("train.parquet")
+        paths = [remote_file.as_posix()]
+
+        with pytest.raises(ConnectionError):
+            ParallelDownloader(CountingFileSystem(fail_after=4), workers=1, chunk_size=100).download(paths, local)
+
+        # same size, new content and modification time
+        data = os.urandom(1000)
+        remote_file.write_bytes(data)
+        st = remote_file.stat()
+        os.utime(remote_file, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+        fs = CountingFileSystem()
+        n = ParallelDownloader(fs, workers=4, chunk_size=100).download(paths, local)
+        assert n == 1000
+        assert len(fs.reads) == 10
+        assert local.joinpath("train.parquet").read_bytes() == data
+
+    def test_etag_mismatch(self, tmp_path, remote):
+        class ETagFileSystem(CountingFileSystem):
+            def info(self, path, **kwargs):
+                return {**super().info(path, **kwargs), "ETag": '"0123456789abcdef0123456789abcdef"'}
+
+        remote_dir, _ = remote
+        local = tmp_path.joinpath("local")
+
+        with pytest.raises(IOError, match="ETag"):
+            ParallelDownloader(ETagFileSystem(), workers=4, chunk_size=100).download(
+                [remote_dir.joinpath("test.parquet").as_posix()], local)
+        assert list(local.iterdir()) == []
@@ -0,0 +1,63 @@
+import logging
+import numpy as np
+import pytest
+
+from vectordb_bench.backend.clients import MetricType
+from vectordb_bench.backend.ground_truth import TopK
+
+
+log = logging.getLogger("vectordb_bench")
+
+
+def brute_force(test, train, k, metric_type):
+    if metric_type == MetricType.L2:
+        dists = np.sqrt(((test[:, np.newaxis, :] - train[np.newaxis, :, :]) ** 2).sum(axis=2))
+    elif metric_type == MetricType.COSINE:
+        t = test / np.linalg.norm(test, axis=1, keepdims=True)
+        x = train / np.linalg.norm(train, axis=1, keepdims=True)
+        dists = 1 - t @ x.T
+    else:
+        dists = -(test @ train.T)
+    order = np.argsort(dists, axis=1)[:, :k]
+    return order, np.take_along_axis(dists, order, axis=1)
+
+
+class TestGroundTruth:
+    @pytest.mark.parametrize("use_faiss", [True, False])
+    @pytest.mark.parametrize("metric_type", [MetricType.L2, MetricType.COSINE, MetricType.IP])
+    def test_topk(self, metric_type, use_faiss):
+        rng = np.random.default_rng(1)
+        train = rng.standard_normal((3000, 32)).astype(np.float32)
+        test = rng.standard_normal((50, 32)).astype(np.float32)
+
+        topk = TopK(test, 10, metric_type, workers=4, use_faiss=use_faiss)
+        for start in range(0, len(train), 700):
+            topk.add(np.arange(start, min(start + 700, len(train))), train[start : start + 700])
+        ids, dists = topk.result()
+
+        expected_ids, expected_dists = brute_force(test, train, 10, metric_type)
+        assert ids.shape == (50, 10)
+        assert (ids == expected_ids).mean() > 0.99
+        assert np.allclose(dists, expected_dists, atol=1e-3)
+
+    def test_checkpoint(self, tmp_path):
+        rng = np.random.default_rng(2)
+        train = rng.standard_normal((1000, 8)).astype(np.float32)
+        test = rng.standard_normal((20, 8)).astype(np.float32)
+
+        topk = TopK(test, 5, MetricType.L2)
+        topk.add(np.arange(500), train[:500])
+        train_files = ["train-00.parquet", "train-01.parquet"]
+        topk.save(tmp_path.joinpath("ckpt.npz"), ["train-00.parquet"], train_files)
+
+        # checkpoints of another k, metric or train files are ignored
+        assert TopK(test, 10, MetricType.L2).load(tmp_path.joinpath("ckpt.npz"), train_files) == []
+        assert TopK(test, 5, MetricType.IP).load(tmp_path.joinpath("ckpt.npz"), train_files) == []
+        assert TopK(test, 5, MetricType.L2).load(tmp_path.joinpath("ckpt.npz"), ["train-00.parquet"]) == []
+
+        resumed = TopK(test, 5, MetricType.L2)
+        assert resumed.load(tmp_path.joinpath("ckpt.npz"), train_files) == ["train-00.parquet"]
+        resumed.add(np.arange(500, 1000), train[500:])
+
+        expected_ids, _ = brute_force(test, train, 5, MetricType.L2)
+        assert (resumed.result()[0] == expected_ids).all()
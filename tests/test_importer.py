@@ -0,0 +1,98 @@
+import sys
+import logging
+import numpy as np
+import pytest
+
+from vectordb_bench import config
+from vectordb_bench.backend import importer, synthetic
+from vectordb_bench.backend.clients import MetricType
+from vectordb_bench.backend.dataset import DatasetManager, Imported
+
+
+log = logging.getLogger("vectordb_bench")
+
+
+def write_vecs(path, data):
+    dim = np.full((len(data), 1), data.shape[1], dtype=np.int32)
+    with open(path, "wb") as f:
+        f.write(np.hstack([dim.view(np.uint8), data.view(np.uint8).reshape(len(data), -1)]).tobytes())
+
+
+class TestImporter:
+    @pytest.fixture(autouse=True)
+    def small_files(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(config, "DATASET_LOCAL_DIR", tmp_path.joinpath("dataset"))
+        monkeypatch.setattr(synthetic, "ROWS_PER_FILE", 400)
+        monkeypatch.setattr(synthetic, "BLOCK_SIZE", 100)
+        monkeypatch.setattr(importer, "ROWS_PER_FILE", 400)
+        monkeypatch.setattr(importer, "BLOCK_SIZE", 100)
+
+    @pytest.mark.parametrize("suffix, dtype", [(".fvecs", np.float32), (".bvecs", np.uint8)])
+    def test_import_vecs(self, tmp_path, suffix, dtype):
+        rng = np.random.default_rng(0)
+        train = (rng.random((1000, 12)) * 255).astype(dtype)
+        test = (rng.random((20, 12)) * 255).astype(dtype)
+        neighbors = rng.integers(0, 1000, (20, 10)).astype(np.int32)
+        write_vecs(tmp_path.joinpath(f"base{suffix}"), train)
+        write_vecs(tmp_path.joinpath(f"query{suffix}"), test)
+        write_vecs(tmp_path.joinpath("gt.ivecs"), neighbors)
+
+        assert np.array_equal(importer.open_vecs(tmp_path.joinpath(f"base{suffix}")), train)
+
+        data = Imported.from_files(
+            "mine", tmp_path.joinpath(f"base{suffix}"), tmp_path.joinpath(f"query{suffix}"), tmp_path.joinpath("gt.ivecs"))
+        assert (data.size, data.dim, data.metric_type) == (1000, 12, MetricType.L2)
+
+        ds = DatasetManager(data=data)
+        ds.prepare()
+        assert len(ds.train_files) == 3
+
+        batches = list(ds.iter_numpy())
+        assert (np.concatenate([ids for ids, _ in batches]) == np.arange(1000)).all()
+        assert np.array_equal(np.concatenate([emb for _, emb in batches]), train.astype(np.float32))
+        assert np.array_equal(np.stack(ds.test_data["emb"]), test.astype(np.float32))
+        assert np.array_equal(np.stack(ds.get_ground_truth()["neighbors_id"]), neighbors)
+
+    def test_import_vecs_without_neighbors(self, tmp_path):
+        rng = np.random.default_rng(0)
+        train = rng.random((500, 8)).astype(np.float32)
+        write_vecs(tmp_path.joinpath("base.fvecs"), train)
+        write_vecs(tmp_path.joinpath("query.fvecs"), train[:5])
+
+        ds = DatasetManager(data=Imported.from_files("mine", tmp_path.joinpath("base.fvecs"), tmp_path.joinpath("query.fvecs")))
+        ds.prepare()
+        gt = np.stack(ds.get_ground_truth()["neighbors_id"])
+        assert (gt[:, 0] == np.arange(5)).all()
+
+    def test_import_hdf5(self, tmp_path):
+        h5py = pytest.importorskip("h5py")
+        rng = np.random.default_rng(0)
+        train = rng.random((900, 16)).astype(np.float32)
+        test = rng.random((10, 16)).astype(np.float32)
+        with h5py.File(tmp_path.joinpath("ann.hdf5"), "w") as f:
+            f.attrs["distance"] = "angular"
+            f["train"], f["test"] = train, test
+            f["neighbors"] = rng.integers(0, 900, (10, 100)).astype(np.int32)
+            f["distances"] = rng.random((10, 100)).astype(np.float32)
+
+        data = Imported.from_files("ann", tmp_path.joinpath("ann.hdf5"))
+        assert (data.size, data.dim, data.metric_type) == (900, 16, MetricType.COSINE)
+
+        ds = DatasetManager(data=data)
+        ds.prepare()
+        assert np.array_equal(np.concatenate([emb for _, emb in ds.iter_numpy()]), train)
+        gt = ds.get_ground_truth()
+        assert set(gt.columns) == {"id", "neighbors_id", "neighbors_distance"}
+
+    def test_hdf5_missing(self, tmp_path, monkeypatch):
+        monkeypatch.setitem(sys.modules, "h5py", None)
+        tmp_path.joinpath("ann.hdf5").write_bytes(b"")
+        with pytest.raises(ImportError, match=r"vectordb-bench\[hdf5\]"):
+            Imported.from_files("ann", tmp_path.joinpath("ann.hdf5"))
+
+    def test_corrupted_vecs(self, tmp_path):
+        write_vecs(tmp_path.joinpath("base.fvecs"), np.zeros((10, 4), dtype=np.float32))
+        with open(tmp_path.joinpath("base.fvecs"), "ab") as f:
+            f.write(b"\x00")
+        with pytest.raises(ValueError):
+            importer.open_vecs(tmp_path.joinpath("base.fvecs"))
@@ -0,0 +1,404 @@
+import logging
+import pathlib
+import time
+import types
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+import pytest
+
+from vectordb_bench import config
+from vectordb_bench.backend.clients.api import VectorDB, EmptyDBCaseConfig
+from vectordb_bench.backend.dataset import DatasetManager, Synthetic
+from vectordb_bench.backend.runner import MultiProcessingInsertRunner, SerialInsertRunner
+from vectordb_bench.backend.runner.pipeline import Pipeline, StageStats, merge_stage_stats
+from vectordb_bench.backend.runner.load_stats import InsertTimeline
+from vectordb_bench.backend.runner.checkpoint import LoadCheckpoint
+from vectordb_bench.backend.runner.capacity_runner import CapacityCurve, CapacityInsertRunner, EndlessBatches
+from vectordb_bench.models import LoadTimeoutError
+from vectordb_bench.backend import synthetic
+from vectordb_bench.backend.task_runner import CaseRunner
+
+
+log = logging.getLogger("vectordb_bench")
+
+
+class FileDB(VectorDB):
+    """records every insert_embeddings call as a file, so that inserts from several processes can be checked"""
+
+    def __init__(self, dim, db_config, db_case_config=None, collection_name="FileDB", drop_old=False, **kwargs):
+        self.dir = pathlib.Path(db_config["dir"])
+
+    @classmethod
+    def config_cls(cls):
+        raise NotImplementedError
+
+    @classmethod
+    def case_config_cls(cls, index_type=None):
+        return EmptyDBCaseConfig
+
+    @contextmanager
+    def init(self):
+        yield
+
+    def insert_embeddings(self, embeddings, metadata, **kwargs):
+        if self.numpy_vectors:
+            assert embeddings.dtype == np.float32 and metadata.dtype == np.int64
+        else:
+            assert isinstance(embeddings, list) and isinstance(metadata, list)
+        name = "last_batch" if kwargs.get("last_batch") else "batch"
+        np.save(self.dir.joinpath(f"{name}-{uuid.uuid4().hex}.npy"), np.asarray(metadata, dtype=np.int64))
+        return len(metadata), None
+
+    def search_embedding(self, query, k=100, filters=None):
+        return []
+
+    def optimize(self):
+        pass
+
+    def ready_to_load(self):
+        pass
+
+
+class TestPipeline:
+    @pytest.mark.parametrize("depth", [0, 1, 3])
+    def test_pipeline(self, depth):
+        out = []
+        pipeline = Pipeline(range(50), [("double", lambda x: x * 2), ("collect", out.append)], depth=depth)
+        stats = pipeline.run()
+        assert out == [x * 2 for x in range(50)]
+        assert [(st.name, st.count) for st in stats] == [("read", 50), ("double", 50), ("collect", 50)]
+
+    def test_stalls(self):
+        def slow(x):
+            time.sleep(0.01)
+
+        stats = Pipeline(range(20), [("slow", slow)], depth=1).run()
+        assert stats[1].busy >= 0.2
+        assert stats[0].stall > stats[1].idle
+
+    @pytest.mark.parametrize("depth", [0, 2])
+    def test_error(self, depth):
+        def fail(x):
+            if x == 10:
+                raise ValueError("fail")
+            return x
+
+        with pytest.raises(ValueError):
+            Pipeline(range(1000), [("fail", fail), ("noop", lambda x: x)], depth=depth).run()
+
+    def test_merge(self):
+        merged = merge_stage_stats([[StageStats("read", 1, 1.0)], [StageStats("read", 2, 0.5)]])
+        assert merged == [StageStats("read", 3, 1.5)]
+
+
+class TestInsertTimeline:
+    def test_percentiles(self):
+        timeline = InsertTimeline()
+        assert timeline.percentiles() == (0.0, 0.0, 0.0)
+        assert timeline.series() == {}
+        for i in range(1, 101):
+            timeline.add(i / 1000, 10)
+        p50, p99, max_ = timeline.percentiles()
+        assert p50 == pytest.approx(0.0505, abs=1e-4)
+        assert p99 == pytest.approx(0.099, abs=1e-3)
+        assert max_ == 0.1
+
+    def test_series(self):
+        timeline = InsertTimeline(
+            ends=[100.0 + t for t in range(1, 1001)],
+            latencies=[0.5] * 1000,
+            rows=[10] * 1000,
+        )
+        series = timeline.series(max_points=100)
+        # 999.5s from the start of the first insert to the end of the last one
+        assert series["interval"] == 10
+        assert len(series["rows_per_sec"]) == len(series["latency_p99"]) == 100
+        assert series["rows_per_sec"][1] == 10
+        assert set(series["latency_p99"]) == {0.5}
+        assert sum(series["rows_per_sec"][:-1]) * 10 + series["rows_per_sec"][-1] * 9.5 == pytest.approx(10_000)
+
+
+class TestMultiProcessingInsertRunner:
+    @pytest.mark.parametrize("workers", [1, 3])
+    def test_insert(self, tmp_path, monkeypatch, workers):
+        # spawned writers read the config from the environment
+        monkeypatch.setenv("DATASET_LOCAL_DIR", str(tmp_path.joinpath("dataset")))
+        monkeypatch.setenv("NUM_PER_BATCH", "100")
+        monkeypatch.setattr(config, "DATASET_LOCAL_DIR", tmp_path.joinpath("dataset"))
+        monkeypatch.setattr(synthetic, "ROWS_PER_FILE", 400)
+        monkeypatch.setattr(synthetic, "BLOCK_SIZE", 100)
+        ds = DatasetManager(data=Synthetic(size=1000, dim=8))
+        ds.prepare()
+
+        db_dir = tmp_path.joinpath("db")
+        db_dir.mkdir()
+        runner = MultiProcessingInsertRunner(FileDB(8, {"dir": db_dir}), ds, normalize=False, timeout=120, workers=workers)
+        assert runner.run() == 1000
+        assert {st.name: st.count for st in runner.load_stats.stages}["send"] == 10
+        assert sum(runner.load_stats.timeline.rows) == 1000
+        assert len(runner.load_stats.timeline.latencies) == 10
+
+        ids = np.concatenate([np.load(p) for p in db_dir.glob("*.npy")])
+        assert (np.sort(ids) == np.arange(1000)).all()
+        last_batches = list(db_dir.glob("last_batch-*.npy"))
+        assert len(last_batches) == 1
+        # a single writer sends last_batch with its last rows, several writers in an empty insert after them
+        assert len(np.load(last_batches[0])) == (100 if workers == 1 else 0)
+
+    def test_no_parallel_insert(self, tmp_path):
+        db = FileDB(8, {"dir": tmp_path})
+        db.parallel_insert = False
+        ds = DatasetManager(data=Synthetic(size=1000, dim=8))
+        assert MultiProcessingInsertRunner(db, ds, normalize=False, workers=4).workers == 1
+
+    @pytest.mark.parametrize("mp_runner", [False, True])
+    def test_memory_db(self, tmp_path, monkeypatch, mp_runner):
+        monkeypatch.setenv("DATASET_LOCAL_DIR", str(tmp_path.joinpath("dataset")))
+        monkeypatch.setenv("NUM_INSERT_WORKERS", "4")
+        monkeypatch.setattr(config, "DATASET_LOCAL_DIR", tmp_path.joinpath("dataset"))
+        monkeypatch.setattr(config, "NUM_INSERT_WORKERS", 4)
+        ds = DatasetManager(data=Synthetic(size=1000, dim=8))
+        ds.prepare()
+
+        db = MemoryDB(8, {"dir": tmp_path})
+        if mp_runner:
+            runner = MultiProcessingInsertRunner(db, ds, normalize=False, timeout=120)
+            assert runner.run() == 1000
+        else:
+            case_runner = CaseRunner.construct(
+                config=types.SimpleNamespace(db=types.SimpleNamespace(init_cls=MemoryDB)),
+                ca=types.SimpleNamespace(dataset=ds, load_timeout=120),
+                db=db,
+                checkpoint=LoadCheckpoint(tmp_path.joinpath("checkpoint")),
+                resume_load=False,
+            )
+            case_runner._load_train_data()
+        assert (np.sort(np.load(tmp_path.joinpath("last_batch.npy"))) == np.arange(1000)).all()
+
+    @pytest.mark.parametrize("numpy_vectors", [False, True])
+    def test_numpy_vectors(self, tmp_path, monkeypatch, numpy_vectors):
+        monkeypatch.setattr(config, "DATASET_LOCAL_DIR", tmp_path.joinpath("dataset"))
+        ds = DatasetManager(data=Synthetic(size=1000, dim=8))
+        ds.prepare()
+
+        db = FileDB(8, {"dir": tmp_path})
+        db.numpy_vectors = numpy_vectors
+        count, stats = SerialInsertRunner(db, ds, normalize=True).task()
+        assert count == 1000
+        assert [st.name for st in stats.stages] == ["read", "preprocess", "encode", "send"]
+        assert all(st.count == 1 for st in stats.stages)
+        assert len(list(tmp_path.glob("last_batch-*.npy"))) == 1
+
+
+class MemoryDB(FileDB):
+    """keeps the inserted ids in process memory and writes them all at the last batch, like the faiss client"""
+    parallel_insert = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ids = []
+
+    def insert_embeddings(self, embeddings, metadata, **kwargs):
+        self.ids.append(np.asarray(metadata, dtype=np.int64))
+        if kwargs.get("last_batch"):
+            ids = np.concatenate([i for i in self.ids if len(i)])
+            np.save(self.dir.joinpath("last_batch.npy"), ids)
+        return len(metadata), None
+
+
+class FailingDB(FileDB):
+    """fails fatally once `fail_after` batches are inserted"""
+
+    def __init__(self, *args, fail_after: int = 5, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fail_after = fail_after
+
+    def insert_embeddings(self, embeddings, metadata, **kwargs):
+        if len(list(self.dir.glob("batch-*.npy"))) >= self.fail_after:
+            raise ValueError("killed")
+        return super().insert_embeddings(embeddings, metadata, **kwargs)
+
+
+class TestLoadCheckpoint:
+    @pytest.mark.parametrize("use_cache", [False, True])
+    @pytest.mark.parametrize("num_workers", [1, 4])
+    def test_resume(self, tmp_path, monkeypatch, use_cache, num_workers):
+        monkeypatch.setattr(config, "DATASET_LOCAL_DIR", tmp_path.joinpath("dataset"))
+        monkeypatch.setattr(config, "NUM_PER_BATCH", 100)
+        monkeypatch.setattr(synthetic, "ROWS_PER_FILE", 400)
+        monkeypatch.setattr(synthetic, "BLOCK_SIZE", 100)
+        ds = DatasetManager(data=Synthetic(size=1000, dim=8))
+        ds.prepare(use_cache=use_cache)
+
+        db_dir = tmp_path.joinpath("db")
+        db_dir.mkdir()
+        checkpoint = LoadCheckpoint(tmp_path.joinpath("checkpoint"))
+        checkpoint.reset(num_workers, use_cache)
+        send_last_batch = num_workers == 1
+        # writer 0 is interrupted, the others haven't started yet
+        fail_after = 5 if num_workers == 1 else 2
+        with pytest.raises(ValueError):
+            SerialInsertRunner(FailingDB(8, {"dir": db_dir}, fail_after=fail_after), ds, False, checkpoint=checkpoint).task(
+                0, num_workers, send_last_batch,
+            )
+        assert checkpoint.progress(0)["batches"] == fail_after
+        assert checkpoint.rows() == fail_after * 100
+
+        checkpoint.resume()
+        assert checkpoint.duration > 0
+        runner = SerialInsertRunner(FileDB(8, {"dir": db_dir}), ds, False, checkpoint=checkpoint)
+        counts = [runner.task(w, num_workers, send_last_batch)[0] for w in range(num_workers)]
+        assert sum(counts) == 1000 - fail_after * 100
+        assert checkpoint.rows() == 1000
+
+        ids = np.concatenate([np.load(p) for p in db_dir.glob("*.npy")])
+        assert (np.sort(ids) == np.arange(1000)).all()
+
+        # nothing left to insert, only the last batch is sent again
+        assert runner.task(0, num_workers, send_last_batch)[0] == 0
+        assert len(list(db_dir.glob("last_batch-*.npy"))) == (2 if send_last_batch else 0)
+
+    def test_resumable(self, tmp_path):
+        checkpoint = LoadCheckpoint.of(tmp_path, "key")
+        assert checkpoint.meta() == {}
+        checkpoint.reset(2, use_cache=False)
+        assert checkpoint.resumable(2, use_cache=False)
+        assert not checkpoint.resumable(3, use_cache=False)
+        # the batches of the vector cache aren't those of the train files
+        assert not checkpoint.resumable(2, use_cache=True)
+        checkpoint.ack(1, batches=3, rows=250, started=checkpoint.started)
+        assert checkpoint.rows() == 250
+        checkpoint.clear()
+        assert not checkpoint.path.exists()
+
+
+class FullDB(FileDB):
+    """fails like a full database once `capacity` batches are inserted"""
+
+    def __init__(self, *args, capacity: int = 25, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.capacity = capacity
+
+    def insert_embeddings(self, embeddings, metadata, **kwargs):
+        if len(list(self.dir.glob("batch-*.npy"))) >= self.capacity:
+            return 0, Exception("memory limit exceeded")
+        return super().insert_embeddings(embeddings, metadata, **kwargs)
+
+
+class SlowingDB(FileDB):
+    """slows down to 1 batch per 0.5s once `fast` batches are inserted"""
+
+    def __init__(self, *args, fast: int = 30, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fast = fast
+
+    def insert_embeddings(self, embeddings, metadata, **kwargs):
+        if len(list(self.dir.glob("batch-*.npy"))) >= self.fast:
+            time.sleep(0.5)
+        return super().insert_embeddings(embeddings, metadata, **kwargs)
+
+
+class TestCapacityInsertRunner:
+    def test_endless_batches(self):
+        block = np.arange(50, dtype=np.float32).reshape(10, 5)
+        it = iter(EndlessBatches(block, batch_size=4, worker=1, num_workers=2))
+        ids, emb = next(it)
+        assert ids.tolist() == [4, 5, 6, 7] and np.shares_memory(emb, block)
+        ids, emb = next(it)
+        assert ids.tolist() == [14, 15, 16, 17] and (emb == block[4:8]).all()
+        ids, _ = next(it)
+        assert ids.tolist() == [24, 25, 26, 27]
+
+        with pytest.raises(ValueError):
+            EndlessBatches(block, batch_size=4, worker=0, num_workers=4)
+
+    @pytest.mark.parametrize("workers", [1, 3])
+    def test_capacity(self, tmp_path, monkeypatch, workers):
+        monkeypatch.setenv("DATASET_LOCAL_DIR", str(tmp_path.joinpath("dataset")))
+        monkeypatch.setenv("NUM_PER_BATCH", "100")
+        monkeypatch.setattr(config, "DATASET_LOCAL_DIR", tmp_path.joinpath("dataset"))
+        monkeypatch.setattr(config, "NUM_PER_BATCH", 100)
+        ds = DatasetManager(data=Synthetic(size=1000, dim=8))
+        ds.prepare()
+
+        db_dir = tmp_path.joinpath("db")
+        db_dir.mkdir()
+        runner = CapacityInsertRunner(FullDB(8, {"dir": db_dir}), ds, normalize=False, timeout=120, workers=workers)
+        count = runner.run_endlessness()
+
+        ids = np.concatenate([np.load(p) for p in db_dir.glob("batch-*.npy")])
+        assert count == len(ids)
+        assert 2500 <= count <= 2500 + 100 * (workers - 1)
+        assert len(np.unique(ids)) == count
+        assert 1 <= runner.load_stats.retry.errors["fatal"] <= workers
+        assert runner.curve.to_dict()["rows"][-1] == count
+
+    def test_collapse(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("DATASET_LOCAL_DIR", str(tmp_path.joinpath("dataset")))
+        monkeypatch.setenv("NUM_PER_BATCH", "100")
+        monkeypatch.setattr(config, "DATASET_LOCAL_DIR", tmp_path.joinpath("dataset"))
+        monkeypatch.setattr(config, "NUM_PER_BATCH", 100)
+        monkeypatch.setattr(config, "CAPACITY_SAMPLE_ROWS", 100)
+        monkeypatch.setattr(config, "CAPACITY_COLLAPSE_RATIO", 0.5)
+        monkeypatch.setattr(config, "CAPACITY_COLLAPSE_WINDOW", 2)
+        ds = DatasetManager(data=Synthetic(size=1000, dim=8))
+        ds.prepare()
+
+        db_dir = tmp_path.joinpath("db")
+        db_dir.mkdir()
+        runner = CapacityInsertRunner(SlowingDB(8, {"dir": db_dir}), ds, normalize=False, timeout=60, workers=1)
+        count = runner.run_endlessness()
+        assert count == len(list(db_dir.glob("batch-*.npy"))) * 100
+        assert count < 3000 + 100 * 30
+        assert runner.curve.baseline is not None
+
+    def test_timeout(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(config, "DATASET_LOCAL_DIR", tmp_path.joinpath("dataset"))
+        monkeypatch.setenv("DATASET_LOCAL_DIR", str(tmp_path.joinpath("dataset")))
+        ds = DatasetManager(data=Synthetic(size=1000, dim=8))
+        ds.prepare()
+
+        db = FullDB(8, {"dir": tmp_path}, capacity=10**9)
+        with pytest.raises(LoadTimeoutError):
+            CapacityInsertRunner(db, ds, normalize=False, timeout=1, workers=1).run_endlessness()
+
+
+class TestCapacityCurve:
+    def test_samples(self):
+        curve = CapacityCurve(sample_rows=100, start=0.0)
+        assert not curve.update(50, 1.0)
+        assert curve.update(100, 2.0)
+        curve.sample(100, 2.0, mem=1024)
+        assert not curve.update(150, 3.0)
+        assert curve.update(300, 4.0)
+        curve.sample(300, 4.0)
+        assert curve.to_dict() == {"rows": [100, 300], "elapsed": [2.0, 4.0], "rows_per_sec": [50.0, 100.0], "mem": [1024, None]}
+
+    def test_collapse(self):
+        curve = CapacityCurve(sample_rows=100, collapse_ratio=0.5, collapse_window=10, start=0.0)
+        rows = 0
+        for t in range(1, 31):
+            rows += 100
+            if curve.update(rows, t):
+                curve.sample(rows, t)
+            assert not curve.collapsed(t)
+        assert curve.baseline == 100
+
+        # 40 rows/s is below half of the baseline, the average of the last 10s drops below it after a while
+        for t in range(31, 36):
+            rows += 40
+            curve.update(rows, t)
+            assert not curve.collapsed(t)
+        for t in range(36, 41):
+            rows += 40
+            curve.update(rows, t)
+        assert curve.collapsed(40)
+
+    def test_disabled(self):
+        curve = CapacityCurve(sample_rows=1, collapse_ratio=0, collapse_window=1, start=0.0)
+        for t in range(1, 10):
+            curve.update(100, t)
+            curve.sample(100, t)
+        assert not curve.collapsed(10)
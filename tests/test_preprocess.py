@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from vectordb_bench.backend import preprocess
+from vectordb_bench.backend.clients import MetricType
+
+
+class TestPreprocess:
+    def test_needs_normalize(self):
+        assert preprocess.needs_normalize(MetricType.COSINE)
+        assert not preprocess.needs_normalize(MetricType.L2)
+        assert not preprocess.needs_normalize(MetricType.IP)
+
+    def test_normalize_inplace(self, monkeypatch):
+        monkeypatch.setattr(preprocess, "CHUNK_SIZE", 10)
+        emb = np.random.default_rng(0).random((95, 16), dtype=np.float32)
+        emb[3] = 0
+        expected = emb / np.maximum(np.linalg.norm(emb, axis=1, keepdims=True), 1e-30)
+
+        assert preprocess.normalize_inplace(emb, workers=4) is emb
+        assert np.allclose(emb, expected)
+        assert (emb[3] == 0).all()
+
+    def test_normalize_copy(self):
+        emb = np.random.default_rng(0).random((5, 4))
+        normalized = preprocess.normalize(emb)
+        assert normalized.dtype == np.float32
+        assert np.allclose(np.linalg.norm(normalized, axis=1), 1)
+        assert not np.allclose(np.linalg.norm(emb, axis=1), 1)
+
+    def test_normalize_readonly(self):
+        emb = np.ones((4, 4), dtype=np.float32)
+        emb.flags.writeable = False
+        with pytest.raises(ValueError):
+            preprocess.normalize_inplace(emb)
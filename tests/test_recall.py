@@ -0,0 +1,56 @@
+import time
+
+import numpy as np
+import pytest
+
+from vectordb_bench.backend.recall import calc_recall_stats, hits, to_matrix
+
+
+def naive_hits(results, ground_truth):
+    return np.array([[r >= 0 and r in set(gt) for r in res] for res, gt in zip(results, ground_truth, strict=True)])
+
+
+class TestRecall:
+    def test_to_matrix(self):
+        assert to_matrix([[1, 2, 3], [4]], 2).tolist() == [[1, 2], [4, -1]]
+        assert to_matrix(np.array([[1, 2], [3, 4]]), 3).tolist() == [[1, 2, -1], [3, 4, -1]]
+
+    def test_hits(self):
+        rng = np.random.default_rng(0)
+        results = rng.integers(0, 50, (200, 10))
+        results[::7, 5:] = -1
+        ground_truth = rng.integers(0, 50, (200, 10))
+        assert (hits(results, ground_truth) == naive_hits(results, ground_truth)).all()
+
+    def test_recall_stats(self):
+        gt = [[0, 1, 2, 3], [10, 11, 12, 13]]
+        stats = calc_recall_stats([[1, 0, 9, 8], [13, 12]], gt, k=4)
+        assert stats["recall"] == 0.5
+        assert stats["recall_at_1"] == 0.0
+        assert "recall_at_10" not in stats
+        # hits at rank 0 and 1 of both queries
+        assert stats["ndcg"] == pytest.approx((1 + 1 / np.log2(3)) / sum(1 / np.log2(np.arange(4) + 2)), abs=1e-4)
+        # the nearest neighbor is the 2nd result of the 1st query, missing from the 2nd
+        assert stats["mrr"] == 0.25
+        assert "distance_ratio" not in stats
+
+        exact = calc_recall_stats(gt, gt, k=4)
+        assert exact == {"recall": 1.0, "recall_at_1": 1.0, "ndcg": 1.0, "mrr": 1.0}
+        assert calc_recall_stats([], [], k=4) == {}
+
+    def test_distance_ratio(self):
+        stats = calc_recall_stats(
+            [[0, 5], [1, 2]], [[0, 1], [1, 2]], k=2,
+            result_distances=[[1.0, 3.0], [1.0, 2.0]], gt_distances=[[1.0, 1.0], [1.0, 2.0]],
+        )
+        assert stats["distance_ratio"] == 1.5
+
+    def test_large(self):
+        rng = np.random.default_rng(0)
+        ground_truth = np.argsort(rng.random((100_000, 100)), axis=1) + rng.integers(0, 10**9, (100_000, 1))
+        results = ground_truth.copy()
+        results[:, 50:] += 1000
+        s = time.perf_counter()
+        stats = calc_recall_stats(results, ground_truth, k=100)
+        assert time.perf_counter() - s < 30
+        assert stats["recall"] == 0.5 and stats["recall_at_10"] == 1.0 and stats["mrr"] == 1.0
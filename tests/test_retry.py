@@ -0,0 +1,74 @@
+import pytest
+
+from vectordb_bench.backend.runner.retry import (
+    ErrorKind, RetryPolicy, RetryStats, classify, insert_with_retry,
+)
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code: int, msg: str = ""):
+        super().__init__(msg)
+        self.status_code = status_code
+
+
+class FlakyDB:
+    """inserts `per_call` rows per call, failing with the next of `errors` after the rows are inserted"""
+
+    def __init__(self, errors: list[Exception], per_call: int = 3):
+        self.errors = list(errors)
+        self.per_call = per_call
+        self.inserted = []
+
+    def insert_embeddings(self, embeddings, metadata, **kwargs):
+        if self.errors:
+            rows = list(metadata[:self.per_call])
+            self.inserted.extend(rows)
+            return len(rows), self.errors.pop(0)
+        self.inserted.extend(metadata)
+        return len(metadata), None
+
+
+class TestRetry:
+    def test_classify(self):
+        assert classify(HTTPError(429)) == ErrorKind.THROTTLED
+        assert classify(Exception("Rate limit reached")) == ErrorKind.THROTTLED
+        assert classify(HTTPError(400)) == ErrorKind.FATAL
+        assert classify(HTTPError(408)) == ErrorKind.RETRYABLE
+        assert classify(HTTPError(503)) == ErrorKind.RETRYABLE
+        assert classify(Exception("memory limit exceeded")) == ErrorKind.FATAL
+        assert classify(AssertionError()) == ErrorKind.FATAL
+        assert classify(ConnectionError("connection reset")) == ErrorKind.RETRYABLE
+
+    def test_delay(self):
+        policy = RetryPolicy(max_tries=10, base_delay=1.0, max_delay=5.0)
+        for retry in range(8):
+            assert 0 <= policy.delay(retry, ErrorKind.RETRYABLE) <= min(5.0, 2 ** retry)
+            assert 0 <= policy.delay(retry, ErrorKind.THROTTLED) <= min(5.0, 2 ** (retry + 1))
+
+    def test_insert_with_retry(self):
+        db = FlakyDB([ConnectionError("reset"), HTTPError(429)])
+        stats = RetryStats()
+        policy = RetryPolicy(max_tries=3, base_delay=0.001, max_delay=0.001)
+        assert insert_with_retry(db, list(range(10)), list(range(10)), policy, stats) == 10
+        assert db.inserted == list(range(10))
+        assert stats.retries == 2
+        assert 0 <= stats.backoff <= 0.002
+        assert stats.errors == {"retryable": 1, "throttled": 1}
+
+    def test_give_up(self):
+        policy = RetryPolicy(max_tries=2, base_delay=0.001, max_delay=0.001)
+
+        stats = RetryStats()
+        with pytest.raises(ConnectionError):
+            insert_with_retry(FlakyDB([ConnectionError()] * 3), list(range(10)), list(range(10)), policy, stats)
+        assert stats.retries == 1 and stats.errors == {"retryable": 2}
+
+        stats = RetryStats()
+        with pytest.raises(HTTPError):
+            insert_with_retry(FlakyDB([HTTPError(403)]), list(range(10)), list(range(10)), policy, stats)
+        assert stats.retries == 0 and stats.errors == {"fatal": 1}
+
+    def test_extend(self):
+        a, b = RetryStats(1, 0.5, {"retryable": 1}), RetryStats(2, 1.0, {"retryable": 1, "throttled": 1})
+        a.extend(b)
+        assert a == RetryStats(3, 1.5, {"retryable": 2, "throttled": 1})
@@ -0,0 +1,147 @@
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from vectordb_bench.backend.clients.api import VectorDB, EmptyDBCaseConfig
+from vectordb_bench.backend.runner import SerialSearchRunner, MultiProcessingSearchRunner
+from vectordb_bench.backend.runner.histogram import LatencyHistogram
+from vectordb_bench.metric import calc_latency_stats
+
+
+class SleepDB(VectorDB):
+    """returns the ids 0..k-1 of every query after sleeping query[0] seconds"""
+
+    def __init__(self, dim=2, db_config=None, db_case_config=None, collection_name="SleepDB", drop_old=False, **kwargs):
+        pass
+
+    @classmethod
+    def config_cls(cls):
+        raise NotImplementedError
+
+    @classmethod
+    def case_config_cls(cls, index_type=None):
+        return EmptyDBCaseConfig
+
+    @contextmanager
+    def init(self):
+        yield
+
+    def insert_embeddings(self, embeddings, metadata, **kwargs):
+        return len(metadata), None
+
+    def search_embedding(self, query, k=100, filters=None):
+        time.sleep(query[0])
+        return list(range(k))
+
+    def optimize(self):
+        pass
+
+    def ready_to_load(self):
+        pass
+
+
+class FailingSearchDB(SleepDB):
+    """fails the queries of negative query[0]"""
+
+    def search_embedding(self, query, k=100, filters=None):
+        if query[0] < 0:
+            raise ConnectionError("connection reset")
+        return super().search_embedding(query, k, filters)
+
+
+class TestSerialSearchRunner:
+    def test_latency_stats(self):
+        stats = calc_latency_stats(np.arange(1, 1001) * 1_000_000)
+        assert stats["serial_latency_p50"] == pytest.approx(0.5005)
+        assert stats["serial_latency_p99"] == pytest.approx(0.99, abs=1e-3)
+        assert stats["serial_latency_max"] == 1.0
+        assert stats["serial_latency_mean"] == pytest.approx(0.5005)
+        assert calc_latency_stats([]) == {
+            "serial_latency_p50": 0.0, "serial_latency_p90": 0.0, "serial_latency_p95": 0.0, "serial_latency_p99": 0.0,
+            "serial_latency_p999": 0.0, "serial_latency_max": 0.0, "serial_latency_mean": 0.0,
+        }
+
+    def test_search(self):
+        # one slow query out of 20
+        test_data = [[0.0, 0.0]] * 19 + [[0.2, 0.0]]
+        gt = pd.DataFrame({"neighbors_id": [list(range(5)) + list(range(100, 105))] * 20})
+        result = SerialSearchRunner(SleepDB(), test_data, gt, k=10).run()
+
+        assert result["recall"] == 0.5
+        assert result["recall_at_1"] == 1.0 and result["recall_at_10"] == 0.5 and result["mrr"] == 1.0
+        assert result["serial_latency_p50"] < 0.01
+        assert result["serial_latency_max"] >= 0.2
+        assert result["serial_latency_p50"] <= result["serial_latency_p90"] <= result["serial_latency_p99"]
+        # the default search_batch searches the queries one by one
+        assert result["batch_search_nq"] == 20
+        assert 0 < result["batch_search_qps"] < 20 / 0.2
+        assert result["load_mem"] == 0
+
+    def test_search_empty(self):
+        runner = SerialSearchRunner(SleepDB(), [], pd.DataFrame({"neighbors_id": []}), k=10)
+        result = runner.search((runner.test_data, runner.ground_truth))
+        assert result["serial_latency_p99"] == 0.0 and result["batch_search_nq"] == 0
+
+    def test_search_batch(self):
+        db = SleepDB()
+        assert db.search_batch([[0.0, 0.0], [0.0, 1.0]], k=3) == [[0, 1, 2], [0, 1, 2]]
+        assert db.search_batch([], k=3) == []
+
+
+class TestMultiProcessingSearchRunner:
+    def test_conc_results(self):
+        runner = MultiProcessingSearchRunner(SleepDB(), [[0.01, 0.0]] * 10, k=10, concurrencies=(1, 2), duration=1)
+        assert runner.run() > 0
+        assert [r["concurrency"] for r in runner.conc_results] == [1, 2]
+        for r in runner.conc_results:
+            assert 0 < r["qps"] <= r["concurrency"] * 100
+            assert r["errors"] == 0 and r["duration"] >= 1
+            assert 0.01 <= r["latency_p50"] <= r["latency_p95"] <= r["latency_p99"] <= r["latency_p999"] < 0.5
+
+    def test_errors(self):
+        # every other query fails
+        runner = MultiProcessingSearchRunner(
+            FailingSearchDB(), [[0.01, 0.0], [-1.0, 0.0]], k=10, concurrencies=(2,), duration=1, max_error_ratio=1.0)
+        assert runner.run() > 0
+        r, = runner.conc_results
+        assert r["errors"] > 0 and r["qps"] > 0
+
+    def test_max_error_ratio(self):
+        # every other query fails, above the ratio the remaining concurrencies are not run
+        runner = MultiProcessingSearchRunner(
+            FailingSearchDB(), [[0.01, 0.0], [-1.0, 0.0]], k=10, concurrencies=(1, 2), duration=1, max_error_ratio=0.1)
+        with pytest.raises(RuntimeError, match="max_error_ratio"):
+            runner.run()
+        r, = runner.conc_results
+        assert r["concurrency"] == 1 and r["errors"] > 0
+
+
+class TestLatencyHistogram:
+    def test_percentiles(self):
+        latencies = np.random.default_rng(0).lognormal(-5, 1, 10_000)
+        hist = LatencyHistogram()
+        for latency in latencies:
+            hist.record(latency)
+        for name, p in [("p50", 50), ("p95", 95), ("p99", 99), ("p999", 99.9)]:
+            exact = np.percentile(latencies, p, method="inverted_cdf")
+            assert hist.percentiles()[name] == pytest.approx(exact, rel=0.011)
+        assert hist.percentile(100) == latencies.max()
+        assert hist.mean == pytest.approx(latencies.mean())
+        assert LatencyHistogram().percentiles() == {"p50": 0.0, "p95": 0.0, "p99": 0.0, "p999": 0.0}
+
+    def test_merge(self):
+        latencies = np.random.default_rng(0).lognormal(-5, 1, 1000)
+        hists = [LatencyHistogram() for _ in range(4)]
+        whole = LatencyHistogram()
+        for i, latency in enumerate(latencies):
+            hists[i % 4].record(latency)
+            whole.record(latency)
+
+        merged = LatencyHistogram.merge(hists)
+        assert merged.count == 1000 and (merged.counts == whole.counts).all()
+        assert merged.percentiles() == whole.percentiles()
+        with pytest.raises(ValueError):
+            merged.add(LatencyHistogram(precision=0.1))
@@ -12,14 +12,35 @@ class config:
 
     DEFAULT_DATASET_URL = env.str("DEFAULT_DATASET_URL", "assets.zilliz.com/benchmark/")
     DATASET_LOCAL_DIR = env.path("DATASET_LOCAL_DIR", "/tmp/vectordb_bench/dataset")
+    DATASET_OFFLINE = env.bool("DATASET_OFFLINE", False)
+    DOWNLOAD_WORKERS = env.int("DOWNLOAD_WORKERS", 8)
+    DOWNLOAD_CHUNK_SIZE = env.int("DOWNLOAD_CHUNK_SIZE", 64 * 1024 * 1024)
     NUM_PER_BATCH = env.int("NUM_PER_BATCH", 10000)
+    # decode the train files once into a float32 copy in the dataset dir, normalized for COSINE datasets,
+    # it takes size * dim * 4 bytes of disk on top of the parquet files, e.g. ~30 GB for Cohere 10M
+    USE_VECTOR_CACHE = env.bool("USE_VECTOR_CACHE", False)
+    PREFETCH_DEPTH = env.int("PREFETCH_DEPTH", 0) # 0 disables prefetching
+    NUM_INSERT_WORKERS = env.int("NUM_INSERT_WORKERS", 1) # writer processes of the load phase
+    BATCH_TARGET_LATENCY = env.float("BATCH_TARGET_LATENCY", 1.0) # seconds, insert requests grow until slower than it
+    INSERT_MAX_TRIES = env.int("INSERT_MAX_TRIES", 10) # tries of one insert, including the first one
+    RETRY_BASE_DELAY = env.float("RETRY_BASE_DELAY", 1.0) # seconds, doubled after each retry
+    RETRY_MAX_DELAY = env.float("RETRY_MAX_DELAY", 60.0) # seconds
+    SEARCH_RETRY_BASE_DELAY = env.float("SEARCH_RETRY_BASE_DELAY", 0.01) # seconds a search process waits after a failed search, doubled while they keep failing
+    SEARCH_RETRY_MAX_DELAY = env.float("SEARCH_RETRY_MAX_DELAY", 1.0) # seconds
+    SEARCH_MAX_ERROR_RATIO = env.float("SEARCH_MAX_ERROR_RATIO", 0.1) # the concurrent search stops once more of its searches failed
+    INSERT_PIPELINE_DEPTH = env.int("INSERT_PIPELINE_DEPTH", 1) # batches queued between insert stages, 0 runs them serially
 
     DROP_OLD = env.bool("DROP_OLD", True)
+    LOAD_CHECKPOINT_DIR = env.path("LOAD_CHECKPOINT_DIR", "/tmp/vectordb_bench/checkpoint")
+    LOAD_RESUME = env.bool("LOAD_RESUME", False) # resume the interrupted load of a case from its checkpoint
     USE_SHUFFLED_DATA = env.bool("USE_SHUFFLED_DATA", True)
 
     RESULTS_LOCAL_DIR = pathlib.Path(__file__).parent.joinpath("results")
 
     CAPACITY_TIMEOUT_IN_SECONDS = 24 * 3600 # 24h
+    CAPACITY_SAMPLE_ROWS = env.int("CAPACITY_SAMPLE_ROWS", 100_000) # rows between two samples of the capacity curve
+    CAPACITY_COLLAPSE_RATIO = env.float("CAPACITY_COLLAPSE_RATIO", 0.0) # stop once the throughput is below it of the initial one, 0 disables it
+    CAPACITY_COLLAPSE_WINDOW = env.float("CAPACITY_COLLAPSE_WINDOW", 30 * 60) # seconds the throughput stays collapsed
     LOAD_TIMEOUT_DEFAULT        = 2.5 * 3600 # 2.5h
     LOAD_TIMEOUT_768D_1M        = 2.5 * 3600 # 2.5h
     LOAD_TIMEOUT_768D_10M       =  25 * 3600 # 25h
@@ -75,7 +75,7 @@ class Case(BaseModel):
         case_id(CaseType): default 9 case type plus one custom cases.
         label(CaseLabel): performance or load.
         dataset(DataSet): dataset for this case runner.
-        filter_rate(float | None): one of 99% | 1% | None
+        filter_rate(float | None): rate of the data filtered out in [0, 1), e.g. 99% | 1% | None
         filters(dict | None): filters for search
     """
 
@@ -80,8 +80,20 @@ class VectorDB(ABC):
         >>> with milvus.init():
         >>>     milvus.insert_embeddings()
         >>>     milvus.search_embedding()
+
+    Attributes:
+        parallel_insert(bool): whether the train data can be inserted from several processes at once,
+            each with its own init(). False if the client keeps the inserted data in process memory.
+        numpy_vectors(bool): whether insert_embeddings and search_embedding accept numpy arrays, i.e.
+            embeddings in np.ndarray[float32] of shape (n, dim), metadata in np.ndarray[int64] and
+            queries in np.ndarray[float32]. Otherwise they're passed in python lists.
+        load_mem(float): memory in MB taken to load the index for searching, 0 if it's not measured.
     """
 
+    parallel_insert: bool = True
+    numpy_vectors: bool = False
+    load_mem: float = 0
+
     @abstractmethod
     def __init__(
         self,
@@ -139,8 +151,10 @@ class VectorDB(ABC):
         each insert_embeddings is 5000.
 
         Args:
-            embeddings(list[list[float]]): list of embedding to add to the vector database.
-            metadatas(list[int]): metadata associated with the embeddings, for filtering.
+            embeddings(list[list[float]]): list of embedding to add to the vector database,
+                or np.ndarray[float32] of shape (n, dim) if numpy_vectors.
+            metadatas(list[int]): metadata associated with the embeddings, for filtering,
+                or np.ndarray[int64] if numpy_vectors.
             **kwargs(Any): vector database specific parameters.
 
         Returns:
@@ -158,7 +172,8 @@ class VectorDB(ABC):
         """Get k most similar embeddings to query vector.
 
         Args:
-            query(list[float]): query embedding to look up documents similar to.
+            query(list[float]): query embedding to look up documents similar to,
+                or np.ndarray[float32] if numpy_vectors.
             k(int): Number of most similar embeddings to return. Defaults to 100.
             filters(dict, optional): filtering expression to filter the data while searching.
 
@@ -167,6 +182,42 @@ class VectorDB(ABC):
         """
         raise NotImplementedError
 
+    def search_batch(
+        self,
+        queries: list[list[float]],
+        k: int = 100,
+        filters: dict | None = None,
+    ) -> list[list[int]]:
+        """Get k most similar embeddings to each of the query vectors, in as few requests as the database allows.
+
+        The default searches the queries one by one with search_embedding,
+        override it if the database can search several vectors in one request.
+
+        Args:
+            queries(list[list[float]]): query embeddings, or np.ndarray[float32] of shape (nq, dim) if numpy_vectors.
+            k(int): Number of most similar embeddings to return for each query. Defaults to 100.
+            filters(dict, optional): filtering expression applied to every query.
+
+        Returns:
+            list[list[int]]: the IDs of the k most similar embeddings of each query, in the order of the queries.
+        """
+        return [self.search_embedding(query, k, filters) for query in queries]
+
+    def count(self) -> int:
+        """Number of the embeddings inserted, called within init().
+
+        Used to verify the collection before resuming an interrupted load,
+        raise NotImplementedError if the count can't be got, the load then starts over.
+        """
+        raise NotImplementedError
+
+    def mem_usage(self) -> int:
+        """Memory used by the database in bytes, called within init().
+
+        Sampled along the capacity curve of the capacity cases, raise NotImplementedError if it's not reported.
+        """
+        raise NotImplementedError
+
     # TODO: remove
     @abstractmethod
     def optimize(self):
@@ -0,0 +1,104 @@
+"""
+Usage:
+    >>> batcher = AdaptiveBatcher(row_bytes=dim * 4, max_bytes=64 * MB, initial_bytes=2 * MB)
+    >>> def send(s: slice) -> int:
+    >>>     return len(client.insert(ids[s], embeddings[s]))
+    >>> insert_count, error = batcher.insert(len(ids), send)
+"""
+
+import re
+import time
+import logging
+from typing import Callable
+
+from ... import config
+
+log = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+_TOO_LARGE = re.compile(r"too large|too big|exceed|larger than|message length|max_content_length", re.IGNORECASE)
+
+
+def is_request_too_large(e: Exception) -> bool:
+    """whether the engine rejected the request for its size, by HTTP 413 or the error message"""
+    for attr in ("status_code", "status", "code"):
+        if getattr(e, attr, None) == 413:
+            return True
+    return _TOO_LARGE.search(str(e)) is not None
+
+
+class AdaptiveBatcher:
+    """Split the rows of insert_embeddings into requests sized by their encoded payload bytes,
+    and adapt the request size to the measured latency by AIMD:
+
+    - additive increase: the batch grows by 1/16 of the max rows after a request faster than target_latency.
+    - multiplicative decrease: the batch halves after a slower request, or a request rejected as too large,
+      which is then retried in smaller batches.
+
+    Args:
+        row_bytes(int): encoded bytes of one row in a request of the engine.
+        max_bytes(int): request size limit of the engine.
+        max_rows(int | None): rows per request limit of the engine.
+        initial_bytes(int | None): size of the first request, default to max_bytes.
+        target_latency(float): seconds, default to config.BATCH_TARGET_LATENCY.
+        min_rows(int): the batch never shrinks below it.
+    """
+
+    def __init__(
+        self,
+        row_bytes: int,
+        max_bytes: int,
+        max_rows: int | None = None,
+        initial_bytes: int | None = None,
+        target_latency: float = config.BATCH_TARGET_LATENCY,
+        min_rows: int = 1,
+    ):
+        self.max_rows = max(int(max_bytes // row_bytes), min_rows)
+        if max_rows is not None:
+            self.max_rows = max(min(self.max_rows, max_rows), min_rows)
+        self.min_rows = min_rows
+        self.step = max(self.max_rows // 16, 1)
+        self.target_latency = target_latency
+        initial_rows = self.max_rows if initial_bytes is None else int(initial_bytes // row_bytes)
+        self.batch_size = min(max(initial_rows, min_rows), self.max_rows)
+
+    def record(self, latency: float):
+        """adapt the batch size to the latency of the last request"""
+        if latency > self.target_latency:
+            self.shrink()
+        else:
+            self.batch_size = min(self.batch_size + self.step, self.max_rows)
+
+    def shrink(self):
+        self.batch_size = max(self.batch_size // 2, self.min_rows)
+
+    def insert(
+        self,
+        num_rows: int,
+        send: Callable[[slice], int],
+        too_large: Callable[[Exception], bool] = is_request_too_large,
+    ) -> tuple[int, Exception | None]:
+        """Send num_rows in adaptive batches, send(slice) inserts the rows of the slice and returns the count.
+
+        Returns:
+            tuple[int, Exception | None]: rows inserted, and the error that stopped the insertion if any,
+                the same contract as VectorDB.insert_embeddings.
+        """
+        offset, inserted = 0, 0
+        while offset < num_rows:
+            end = min(offset + self.batch_size, num_rows)
+            s = time.perf_counter()
+            try:
+                count = send(slice(offset, end))
+            except Exception as e:
+                if too_large(e) and self.batch_size > self.min_rows:
+                    self.shrink()
+                    self.max_rows = self.batch_size
+                    log.info(f"request of {end - offset} rows too large, retry in batches of {self.batch_size}")
+                    continue
+                return inserted, e
+            self.record(time.perf_counter() - s)
+            inserted += count
+            offset = end
+        return inserted, None
@@ -5,9 +5,13 @@ from contextlib import contextmanager
 from typing import Any, Type
 from ..api import VectorDB, DBConfig, DBCaseConfig, EmptyDBCaseConfig, IndexType
 from .config import ChromaConfig
+from ..batcher import AdaptiveBatcher, MB
 from chromadb.config import Settings
 
 log = logging.getLogger(__name__)
+
+CHROMA_MAX_REQUEST_BYTES = 32 * MB
+
 class ChromaClient(VectorDB):
     """Chroma client for VectorDB. 
     To set up Chroma in docker, see https://docs.trychroma.com/usage-guide
@@ -33,6 +37,12 @@ class ChromaClient(VectorDB):
         client = chromadb.HttpClient(host=self.db_config["host"], 
                                      port=self.db_config["port"])
         assert client.heartbeat() is not None
+        # embeddings are sent in json, about 20 bytes per float
+        self.batcher = AdaptiveBatcher(
+            row_bytes=dim * 20 + 32,
+            max_bytes=CHROMA_MAX_REQUEST_BYTES,
+            max_rows=getattr(client, "max_batch_size", None),
+        )
         if drop_old:
             try:
                 client.reset() # Reset the database
@@ -73,6 +83,9 @@ class ChromaClient(VectorDB):
     def optimize(self) -> None:
         pass
 
+    def count(self) -> int:
+        return self.collection.count()
+
     def insert_embeddings(
         self,
         embeddings: list[list[float]],
@@ -91,9 +104,12 @@ class ChromaClient(VectorDB):
         """
         ids=[str(i) for i in metadata]
         metadata = [{"id": int(i)} for i in metadata] 
-        if len(embeddings) > 0:
-            self.collection.add(embeddings=embeddings, ids=ids, metadatas=metadata)
-        return len(embeddings), None
+
+        def send(s: slice) -> int:
+            self.collection.add(embeddings=embeddings[s], ids=ids[s], metadatas=metadata[s])
+            return len(ids[s])
+
+        return self.batcher.insert(len(embeddings), send)
     
     def search_embedding(
         self,
@@ -5,6 +5,7 @@ from typing import Iterable, Type
 from ..api import VectorDB, DBCaseConfig, DBConfig, IndexType
 from .config import ElasticCloudIndexConfig, ElasticCloudConfig
 from elasticsearch.helpers import bulk
+from ..batcher import AdaptiveBatcher, MB
 
 
 for logger in ("elasticsearch", "elastic_transport"):
@@ -12,6 +13,10 @@ for logger in ("elasticsearch", "elastic_transport"):
 
 log = logging.getLogger(__name__)
 
+ELASTIC_MAX_REQUEST_BYTES = 100 * MB # http.max_content_length
+ELASTIC_INITIAL_REQUEST_BYTES = 10 * MB
+ELASTIC_MSEARCH_NQ = 100 # searches per msearch request
+
 class ElasticCloud(VectorDB):
     def __init__(
         self,
@@ -30,6 +35,12 @@ class ElasticCloud(VectorDB):
         self.indice = indice
         self.id_col_name = id_col_name
         self.vector_col_name = vector_col_name
+        # documents are sent in json, about 20 bytes per float
+        self.batcher = AdaptiveBatcher(
+            row_bytes=dim * 20 + 64,
+            max_bytes=ELASTIC_MAX_REQUEST_BYTES,
+            initial_bytes=ELASTIC_INITIAL_REQUEST_BYTES,
+        )
 
         from elasticsearch import Elasticsearch
 
@@ -101,12 +112,25 @@ class ElasticCloud(VectorDB):
             }
             for i in range(len(embeddings))
         ]
-        try:
-            bulk_insert_res = bulk(self.client, insert_data)
-            return (bulk_insert_res[0], None)
-        except Exception as e:
-            log.warning(f"Failed to insert data: {self.indice} error: {str(e)}")
-            return (0, e)
+        def send(s: slice) -> int:
+            actions = insert_data[s]
+            # the batcher sizes the requests, one bulk request per call
+            return bulk(self.client, actions, chunk_size=len(actions), max_chunk_bytes=ELASTIC_MAX_REQUEST_BYTES)[0]
+
+        insert_count, error = self.batcher.insert(len(insert_data), send)
+        if error is not None:
+            log.warning(f"Failed to insert data: {self.indice} error: {str(error)}")
+        return (insert_count, error)
+
+    def count(self) -> int:
+        assert self.client is not None, "should self.init() first"
+        self.client.indices.refresh(index=self.indice)
+        return self.client.count(index=self.indice)["count"]
+
+    def mem_usage(self) -> int:
+        assert self.client is not None, "should self.init() first"
+        stats = self.client.nodes.stats(metric="jvm")
+        return sum(n["jvm"]["mem"]["heap_used_in_bytes"] for n in stats["nodes"].values())
 
     def search_embedding(
         self,
@@ -128,15 +152,7 @@ class ElasticCloud(VectorDB):
         # is_existed_res = self.client.indices.exists(index=self.indice)
         # assert is_existed_res.raw == True, "should self.init() first"
 
-        knn = {
-            "field": self.vector_col_name,
-            "k": k,
-            "num_candidates": self.case_config.num_candidates,
-            "filter": [{"range": {self.id_col_name: {"gt": filters["id"]}}}]
-            if filters
-            else [],
-            "query_vector": query,
-        }
+        knn = self._knn(query, k, filters)
         size = k
         try:
             res = self.client.search(
@@ -155,6 +171,60 @@ class ElasticCloud(VectorDB):
             log.warning(f"Failed to search: {self.indice} error: {str(e)}")
             raise e from None
 
+    def search_batch(
+        self,
+        queries: list[list[float]],
+        k: int = 100,
+        filters: dict | None = None,
+    ) -> list[list[int]]:
+        """Search the query embeddings with msearch, ELASTIC_MSEARCH_NQ of them per request."""
+        assert self.client is not None, "should self.init() first"
+
+        ret = []
+        for start in range(0, len(queries), ELASTIC_MSEARCH_NQ):
+            batch = queries[start : start + ELASTIC_MSEARCH_NQ]
+            searches = []
+            for query in batch:
+                searches.append({})
+                searches.append({
+                    "knn": self._knn(query, k, filters),
+                    "size": k,
+                    "_source": False,
+                    "docvalue_fields": [self.id_col_name],
+                    "stored_fields": "_none_",
+                })
+            try:
+                res = self.client.msearch(
+                    index=self.indice,
+                    searches=searches,
+                    filter_path=[
+                        f"responses.hits.hits.fields.{self.id_col_name}", "responses.error", "responses.status",
+                    ],
+                )
+            except Exception as e:
+                log.warning(f"Failed to msearch: {self.indice} error: {str(e)}")
+                raise e from None
+
+            # the status keeps the responses without any hit in place, filter_path would drop them
+            responses = res.get("responses", [])
+            assert len(responses) == len(batch), f"{len(responses)} msearch responses of {len(batch)} queries"
+            for r in responses:
+                if "error" in r:
+                    raise RuntimeError(f"Failed to msearch: {self.indice} error: {r['error']}")
+                ret.append([h["fields"][self.id_col_name][0] for h in r.get("hits", {}).get("hits", [])])
+        return ret
+
+    def _knn(self, query: list[float], k: int, filters: dict | None) -> dict:
+        return {
+            "field": self.vector_col_name,
+            "k": k,
+            "num_candidates": self.case_config.num_candidates,
+            "filter": [{"range": {self.id_col_name: {"gt": filters["id"]}}}]
+            if filters
+            else [],
+            "query_vector": query,
+        }
+
     def optimize(self):
         """optimize will be called between insertion and search in performance cases."""
         assert self.client is not None, "should self.init() first"
@@ -10,12 +10,15 @@ from pymilvus import Collection, utility
 from pymilvus import CollectionSchema, DataType, FieldSchema, MilvusException
 
 from ..api import VectorDB, DBCaseConfig, DBConfig, IndexType
+from ..batcher import AdaptiveBatcher, MB
 from .config import MilvusConfig, _milvus_case_config
 
 
 log = logging.getLogger(__name__)
 
-MILVUS_LOAD_REQS_SIZE = 1.5 * 1024 *1024
+MILVUS_MAX_REQUEST_BYTES = 64 * MB # proxy.maxReceiveMessageSize
+MILVUS_INITIAL_REQUEST_BYTES = 1.5 * MB
+MILVUS_MAX_NQ = 16384 # quotaAndLimits.limits.maxNQ
 
 class Milvus(VectorDB):
     def __init__(
@@ -33,7 +36,13 @@ class Milvus(VectorDB):
         self.db_config = db_config
         self.case_config = db_case_config
         self.collection_name = collection_name
-        self.batch_size = int(MILVUS_LOAD_REQS_SIZE / (dim *4))
+        # vector, pk and scalar field of each row
+        self.batcher = AdaptiveBatcher(
+            row_bytes=dim * 4 + 16,
+            max_bytes=MILVUS_MAX_REQUEST_BYTES,
+            initial_bytes=MILVUS_INITIAL_REQUEST_BYTES,
+        )
+        self._max_nq = int(min(MILVUS_MAX_NQ, MILVUS_MAX_REQUEST_BYTES // (dim * 4)))
 
         self._primary_field = "pk"
         self._scalar_field = "id"
@@ -168,23 +177,25 @@ class Milvus(VectorDB):
         # use the first insert_embeddings to init collection
         assert self.col is not None
         assert len(embeddings) == len(metadata)
-        insert_count = 0
+
+        def send(s: slice) -> int:
+            res = self.col.insert([metadata[s], metadata[s], embeddings[s]])
+            return len(res.primary_keys)
+
+        insert_count, error = self.batcher.insert(len(embeddings), send)
         try:
-            for batch_start_offset in range(0, len(embeddings), self.batch_size):
-                batch_end_offset = min(batch_start_offset + self.batch_size, len(embeddings))
-                insert_data = [
-                        metadata[batch_start_offset : batch_end_offset],
-                        metadata[batch_start_offset : batch_end_offset],
-                        embeddings[batch_start_offset : batch_end_offset],
-                ]
-                res = self.col.insert(insert_data)
-                insert_count += len(res.primary_keys)
-            if kwargs.get("last_batch"):
+            if error is None and kwargs.get("last_batch"):
                 self._post_insert()
         except MilvusException as e:
-            log.info(f"Failed to insert data: {e}")
-            return (insert_count, e)
-        return (insert_count, None)
+            error = e
+        if error is not None:
+            log.info(f"Failed to insert data: {error}")
+        return (insert_count, error)
+
+    def count(self) -> int:
+        assert self.col, "Please call self.init() before"
+        self.col.flush()
+        return self.col.num_entities
 
     def search_embedding(
         self,
@@ -210,3 +221,25 @@ class Milvus(VectorDB):
         # Organize results.
         ret = [result.id for result in res[0]]
         return ret
+
+    def search_batch(
+        self,
+        queries: list[list[float]],
+        k: int = 100,
+        filters: dict | None = None,
+    ) -> list[list[int]]:
+        """Search the query embeddings in requests of up to _max_nq vectors."""
+        assert self.col is not None
+
+        expr = f"{self._scalar_field} {filters.get('metadata')}" if filters else ""
+        ret = []
+        for start in range(0, len(queries), self._max_nq):
+            res = self.col.search(
+                data=list(queries[start : start + self._max_nq]),
+                anns_field=self._vector_field,
+                param=self.case_config.search_param(),
+                limit=k,
+                expr=expr,
+            )
+            ret.extend([result.id for result in hits] for hits in res)
+        return ret
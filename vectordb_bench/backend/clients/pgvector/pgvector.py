@@ -7,6 +7,7 @@ from typing import Any, Type
 from functools import wraps
 
 from ..api import VectorDB, DBConfig, DBCaseConfig, IndexType
+from ..batcher import AdaptiveBatcher, MB
 from pgvector.sqlalchemy import Vector
 from .config import PgVectorConfig, PgVectorIndexConfig
 from sqlalchemy import (
@@ -29,6 +30,10 @@ from sqlalchemy.orm import (
 
 log = logging.getLogger(__name__) 
 
+PGVECTOR_MAX_REQUEST_BYTES = 64 * MB
+PGVECTOR_BATCH_NQ = 100 # queries per LATERAL search
+PGVECTOR_OPERATORS = {"l2_distance": "<->", "max_inner_product": "<#>", "cosine_distance": "<=>"}
+
 class PgVector(VectorDB):
     """ Use SQLAlchemy instructions"""
     def __init__(
@@ -45,6 +50,9 @@ class PgVector(VectorDB):
         self.table_name = collection_name
         self.dim = dim
 
+        # vectors are sent in text, about 20 bytes per float
+        self.batcher = AdaptiveBatcher(row_bytes=dim * 20 + 8, max_bytes=PGVECTOR_MAX_REQUEST_BYTES)
+
         self._index_name = "pqvector_index"
         self._primary_field = "id"
         self._vector_field = "embedding"
@@ -141,14 +149,24 @@ class PgVector(VectorDB):
         metadata: list[int],
         **kwargs: Any,
     ) -> (int, Exception):
-        try:
-            items = [dict(id = metadata[i], embedding=embeddings[i]) for i in range(len(metadata))]
-            self.pg_session.execute(insert(self.pg_table), items)
-            self.pg_session.commit()
-            return len(metadata), None
-        except Exception as e:
-            log.warning(f"Failed to insert data into pgvector table ({self.table_name}), error: {e}")   
-            return 0, e
+        def send(s: slice) -> int:
+            items = [dict(id = metadata[i], embedding=embeddings[i]) for i in range(s.start, s.stop)]
+            try:
+                self.pg_session.execute(insert(self.pg_table), items)
+                self.pg_session.commit()
+            except Exception:
+                self.pg_session.rollback()
+                raise
+            return len(items)
+
+        insert_count, error = self.batcher.insert(len(metadata), send)
+        if error is not None:
+            log.warning(f"Failed to insert data into pgvector table ({self.table_name}), error: {error}")
+        return insert_count, error
+
+    def count(self) -> int:
+        assert self.pg_session is not None, "Please call self.init() before"
+        return self.pg_session.scalar(text(f'SELECT count(*) FROM "{self.table_name}"'))
 
     def search_embedding(        
         self,
@@ -168,4 +186,40 @@ class PgVector(VectorDB):
         else: 
             res = self.pg_session.scalars(select(self.pg_table).order_by(op_fun(query)).limit(k))
         return list(res)
-        
\ No newline at end of file
+        
+
+    def search_batch(
+        self,
+        queries: list[list[float]],
+        k: int = 100,
+        filters: dict | None = None,
+    ) -> list[list[int]]:
+        """Search PGVECTOR_BATCH_NQ query embeddings per statement, a LATERAL join of
+        the VALUES list of the queries with the k nearest rows of each one."""
+        assert self.pg_table is not None
+        search_param = self.case_config.search_param()
+        op = PGVECTOR_OPERATORS[search_param["metric_fun"]]
+        where = f'WHERE t."{self._primary_field}" > :filter_id' if filters else ""
+
+        ret = []
+        with self.pg_engine.connect() as conn:
+            conn.execute(text(f'SET ivfflat.probes = {search_param["probes"]}'))
+            for start in range(0, len(queries), PGVECTOR_BATCH_NQ):
+                batch = queries[start : start + PGVECTOR_BATCH_NQ]
+                values = ", ".join(f"({i}, CAST(:q{i} AS vector))" for i in range(len(batch)))
+                stmt = text(
+                    f'SELECT q.i, r.id FROM (VALUES {values}) AS q(i, v) CROSS JOIN LATERAL ('
+                    f'SELECT t."{self._primary_field}" AS id, t."{self._vector_field}" {op} q.v AS d '
+                    f'FROM "{self.table_name}" t {where} ORDER BY t."{self._vector_field}" {op} q.v LIMIT :k'
+                    f') r ORDER BY q.i, r.d'
+                )
+                params = {f"q{i}": "[" + ",".join(map(str, query)) + "]" for i, query in enumerate(batch)}
+                params["k"] = k
+                if filters:
+                    params["filter_id"] = filters.get("id")
+
+                res = [[] for _ in batch]
+                for i, id_ in conn.execute(stmt, params):
+                    res[i].append(id_)
+                ret.extend(res)
+        return ret
@@ -5,13 +5,14 @@ from contextlib import contextmanager
 from typing import Type
 
 from ..api import VectorDB, DBConfig, DBCaseConfig, EmptyDBCaseConfig, IndexType
+from ..batcher import AdaptiveBatcher, MB
 from .config import PineconeConfig
 
 
 log = logging.getLogger(__name__)
 
 PINECONE_MAX_NUM_PER_BATCH = 1000
-PINECONE_MAX_SIZE_PER_BATCH = 2 * 1024 * 1024 # 2MB
+PINECONE_MAX_SIZE_PER_BATCH = 2 * MB
 
 class Pinecone(VectorDB):
     def __init__(
@@ -26,7 +27,11 @@ class Pinecone(VectorDB):
         self.index_name = db_config["index_name"]
         self.api_key = db_config["api_key"]
         self.environment = db_config["environment"]
-        self.batch_size = int(min(PINECONE_MAX_SIZE_PER_BATCH / (dim * 5), PINECONE_MAX_NUM_PER_BATCH))
+        self.batcher = AdaptiveBatcher(
+            row_bytes=dim * 5,
+            max_bytes=PINECONE_MAX_SIZE_PER_BATCH,
+            max_rows=PINECONE_MAX_NUM_PER_BATCH,
+        )
         # Pincone will make connections with server while import
         # so place the import here.
         import pinecone
@@ -73,6 +78,9 @@ class Pinecone(VectorDB):
     def optimize(self):
         pass
 
+    def count(self) -> int:
+        return self.index.describe_index_stats()["total_vector_count"]
+
     def insert_embeddings(
         self,
         embeddings: list[list[float]],
@@ -80,20 +88,17 @@ class Pinecone(VectorDB):
         **kwargs,
     ) -> (int, Exception):
         assert len(embeddings) == len(metadata)
-        insert_count = 0
-        try:
-            for batch_start_offset in range(0, len(embeddings), self.batch_size):
-                batch_end_offset = min(batch_start_offset + self.batch_size, len(embeddings))
-                insert_datas = []
-                for i in range(batch_start_offset, batch_end_offset):
-                    insert_data = (str(metadata[i]), embeddings[i], {
-                                self._metadata_key: metadata[i]})
-                    insert_datas.append(insert_data)
-                self.index.upsert(insert_datas)
-                insert_count += batch_end_offset - batch_start_offset
-        except Exception as e:
-            return (insert_count, e)
-        return (len(embeddings), None)
+
+        def send(s: slice) -> int:
+            insert_datas = []
+            for i in range(s.start, s.stop):
+                insert_data = (str(metadata[i]), embeddings[i], {
+                            self._metadata_key: metadata[i]})
+                insert_datas.append(insert_data)
+            self.index.upsert(insert_datas)
+            return s.stop - s.start
+
+        return self.batcher.insert(len(embeddings), send)
 
     def search_embedding(
         self,
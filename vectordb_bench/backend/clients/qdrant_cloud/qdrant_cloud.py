@@ -27,6 +27,10 @@ log = logging.getLogger(__name__)
 
 
 class QdrantCloud(VectorDB):
+    # the faiss index is trained on the embeddings collected in this process
+    parallel_insert = False
+    numpy_vectors = True
+
     def __init__(
         self,
         dim: int,
@@ -110,12 +114,14 @@ class QdrantCloud(VectorDB):
         assert self.index != None
         if (self._train == False):
             return len(metadata), None
-        for i in range(len(embeddings)):
-            self._train_set.append(np.array(embeddings[i]))
-            self._train_ids.append(metadata[i])
+        if len(metadata) > 0:
+            # copied, the batches may be views of buffers the caller reuses
+            self._train_set.append(np.array(embeddings, dtype=np.float32, copy=True))
+            self._train_ids.append(np.array(metadata, dtype=np.int64, copy=True))
         if kwargs.get("last_batch"):
             print("begin to train faiss index", type(self._train_set))
-            self._train_set = np.array(self._train_set)
+            self._train_set = np.concatenate(self._train_set)
+            self._train_ids = np.concatenate(self._train_ids)
             self.index.train(self._train_set)
             print("add data into faiss index")
             self.index.add_with_ids(self._train_set, self._train_ids)
@@ -134,19 +140,18 @@ class QdrantCloud(VectorDB):
         """Perform a search on a query embedding and return results with score.
         Should call self.init() first.
         """
-        D, I = self.index.search(np.array(query).reshape((1, self._dim)), k = k)
+        D, I = self.index.search(np.asarray(query, dtype=np.float32).reshape((1, self._dim)), k = k)
         
         return [i for i in I[0]]
     
     def search_batch(
         self,
-        query: list[list[float]],
+        queries: list[list[float]],
         k: int = 100,
         filters: dict | None = None,
-        timeout: int | None = None,
-    ) -> list[int]:
-        """Perform a search on a query embedding and return results with score.
+    ) -> list[list[int]]:
+        """Perform a search on all the query embeddings at once.
         Should call self.init() first.
         """
-        D, I = self.index.search(np.stack(query), k = k)
-        return I
\ No newline at end of file
+        D, I = self.index.search(np.asarray(queries, dtype=np.float32), k = k)
+        return I.tolist()
\ No newline at end of file
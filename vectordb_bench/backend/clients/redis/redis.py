@@ -3,6 +3,7 @@ from contextlib import contextmanager
 from typing import Any, Type
 from ..api import VectorDB, DBConfig, DBCaseConfig, EmptyDBCaseConfig, IndexType
 from .config import RedisConfig
+from ..batcher import AdaptiveBatcher, MB
 import redis
 from redis.commands.search.field import TagField, VectorField, NumericField
 from redis.commands.search.indexDefinition import IndexDefinition, IndexType
@@ -12,8 +13,11 @@ import numpy as np
 
 log = logging.getLogger(__name__)
 INDEX_NAME = "index"                              # Vector Index Name
+REDIS_MAX_REQUEST_BYTES = 64 * MB
 
 class Redis(VectorDB):
+    numpy_vectors = True
+
     def __init__(
             self,
             dim: int,
@@ -27,6 +31,8 @@ class Redis(VectorDB):
         self.db_config = db_config
         self.case_config = db_case_config
         self.collection_name = INDEX_NAME
+        # vector, id and metadata fields of each hash
+        self.batcher = AdaptiveBatcher(row_bytes=dim * 4 + 64, max_bytes=REDIS_MAX_REQUEST_BYTES)
 
         # Create a redis connection, if db has password configured, add it to the connection here and in init():
         # password=self.db_config["password"]
@@ -99,6 +105,12 @@ class Redis(VectorDB):
     def optimize(self) -> None:
         pass
 
+    def count(self) -> int:
+        return int(self.conn.ft(INDEX_NAME).info()["num_docs"])
+
+    def mem_usage(self) -> int:
+        return int(self.conn.info("memory")["used_memory"])
+
 
     def insert_embeddings(
 
@@ -110,20 +122,20 @@ class Redis(VectorDB):
         """Insert embeddings into the database.
         Should call self.init() first.
         """
-        try:
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+
+        def send(s: slice) -> int:
             with self.conn.pipeline() as pipe:
-                for i, embedding in enumerate(embeddings):
-                    embedding = np.array(embedding).astype(np.float32)
-                    pipe.hset(metadata[i], mapping = {
-                        "id": str(metadata[i]),
-                        "metadata": metadata[i], 
-                        "vector": embedding.tobytes(),
+                for i in range(s.start, s.stop):
+                    id_ = int(metadata[i])
+                    pipe.hset(id_, mapping = {
+                        "id": str(id_),
+                        "metadata": id_,
+                        "vector": embeddings[i].tobytes(),
                     })
-                res = pipe.execute()
-        except Exception as e:
-            return 0, e
-        
-        return len(res), None
+                return len(pipe.execute())
+
+        return self.batcher.insert(len(embeddings), send)
     
     def search_embedding(
         self,
@@ -135,25 +147,47 @@ class Redis(VectorDB):
     ) -> (list[int]):
         assert self.conn is not None
         
-        query_vector = np.array(query).astype(np.float32).tobytes()
-        query_obj = Query(f"*=>[KNN {k} @vector $vec as score]").sort_by("score").return_fields("id", "score").paging(0, k).dialect(2)
+        query_vector = np.asarray(query, dtype=np.float32).tobytes()
+        query_obj = self._query(k, filters)
         query_params = {"vec": query_vector}
-        
-        if filters:
-            # benchmark test filters of format: {'metadata': '>=10000', 'id': 10000}
-            # gets exact match for id, and range for metadata if they exist in filters
-            id_value = filters.get("id")
-            metadata_value = filters.get("metadata")
-            if id_value and metadata_value:
-                query_obj = Query(f"(@metadata:[{metadata_value} +inf] @id:{ {id_value} })=>[KNN {k} @vector $vec as score]").sort_by("score").return_fields("id", "score").paging(0, k).dialect(2)
-            elif id_value:
-                #gets exact match for id
-                query_obj = Query(f"@id:{ {id_value} }=>[KNN {k} @vector $vec as score]").sort_by("score").return_fields("id", "score").paging(0, k).dialect(2)
-            else: #metadata only case, greater than or equal to metadata value
-                query_obj = Query(f"@metadata:[{metadata_value} +inf]=>[KNN {k} @vector $vec as score]").sort_by("score").return_fields("id", "score").paging(0, k).dialect(2) 
         res = self.conn.ft(INDEX_NAME).search(query_obj, query_params)
         # doc in res of format {'id': '9831', 'payload': None, 'score': '1.19209289551e-07'}
         return [int(doc["id"]) for doc in res.docs]
 
+    def search_batch(
+        self,
+        queries: list[list[float]],
+        k: int = 100,
+        filters: dict | None = None,
+    ) -> list[list[int]]:
+        """Send the FT.SEARCH of every query in one pipeline."""
+        assert self.conn is not None
+
+        query_obj = self._query(k, filters)
+        with self.conn.ft(INDEX_NAME).pipeline(transaction=False) as pipe:
+            for query in queries:
+                pipe.search(query_obj, {"vec": np.asarray(query, dtype=np.float32).tobytes()})
+            replies = pipe.execute()
+        # replies are not parsed in a pipeline, each of format [total, key1, [field, value, ...], key2, ...],
+        # the key of a doc is its id
+        return [[int(key) for key in reply[1::2]] for reply in replies]
+
+    @staticmethod
+    def _query(k: int, filters: dict | None) -> Query:
+        if not filters:
+            return Query(f"*=>[KNN {k} @vector $vec as score]").sort_by("score").return_fields("id", "score").paging(0, k).dialect(2)
+
+        # benchmark test filters of format: {'metadata': '>=10000', 'id': 10000}
+        # gets exact match for id, and range for metadata if they exist in filters
+        id_value = filters.get("id")
+        metadata_value = filters.get("metadata")
+        if id_value and metadata_value:
+            return Query(f"(@metadata:[{metadata_value} +inf] @id:{ {id_value} })=>[KNN {k} @vector $vec as score]").sort_by("score").return_fields("id", "score").paging(0, k).dialect(2)
+        elif id_value:
+            #gets exact match for id
+            return Query(f"@id:{ {id_value} }=>[KNN {k} @vector $vec as score]").sort_by("score").return_fields("id", "score").paging(0, k).dialect(2)
+        else: #metadata only case, greater than or equal to metadata value
+            return Query(f"@metadata:[{metadata_value} +inf]=>[KNN {k} @vector $vec as score]").sort_by("score").return_fields("id", "score").paging(0, k).dialect(2)
+
     
         
\ No newline at end of file
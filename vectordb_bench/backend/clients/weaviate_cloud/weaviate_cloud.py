@@ -103,6 +103,8 @@ class WeaviateCloud(VectorDB):
     ) -> (int, Exception):
         """Insert embeddings into Weaviate"""
         assert self.client.schema.exists(self.collection_name)
+        if len(metadata) == 0:
+            return (0, None)
         insert_count = 0
         try:
             with self.client.batch as batch:
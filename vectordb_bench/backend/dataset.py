@@ -5,12 +5,20 @@ Usage:
 """
 
 import os
+import json
+import math
+import time
+import queue
 import logging
 import pathlib
-from hashlib import md5
+import threading
+import concurrent
+import multiprocessing as mp
 from enum import Enum
 import s3fs
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 from tqdm import tqdm
 from pydantic import validator, PrivateAttr
 import polars as pl
@@ -20,6 +28,9 @@ from ..base import BaseModel
 from .. import config
 from ..backend.clients import MetricType
 from . import utils
+from .downloader import ParallelDownloader
+from .synthetic import SyntheticDistribution, write_synthetic_dataset
+from . import ground_truth, importer, preprocess
 
 log = logging.getLogger(__name__)
 
@@ -109,10 +120,95 @@ class OpenAI(BaseDataset):
     }
 
 
+class LocalDataset(BaseDataset):
+    """Dataset built on the local machine instead of downloaded from S3"""
+    _size_label: dict = {}
+
+    @validator("size")
+    def verify_size(cls, v):
+        if v <= 0:
+            raise ValueError(f"Size {v} not supported for the dataset, expected a positive size")
+        return v
+
+    def build(self, data_dir: pathlib.Path) -> list[str]:
+        """Write the train*/test/neighbors*.parquet files into data_dir
+
+        Returns:
+            list[str]: names of the files written.
+        """
+        raise NotImplementedError
+
+
+class Synthetic(LocalDataset):
+    """Random vectors of any size, dim, metric and distribution with exact ground truth.
+
+    The same parameters always generate the same dataset.
+    """
+    name: str = "Synthetic"
+    dim: int = 128
+    metric_type: MetricType = MetricType.L2
+    use_shuffled: bool = False
+    distribution: SyntheticDistribution = SyntheticDistribution.GAUSSIAN
+    seed: int = 42
+
+    @property
+    def label(self) -> str:
+        return f"{self.distribution.value}-{self.metric_type.value}-{self.dim}D-seed{self.seed}".upper()
+
+    @property
+    def dir_name(self) -> str:
+        return f"{self.name}_{self.label}_{utils.numerize(self.size)}".lower()
+
+    def build(self, data_dir: pathlib.Path) -> list[str]:
+        return write_synthetic_dataset(
+            data_dir, self.size, self.dim, self.metric_type, self.distribution, self.seed,
+        )
+
+
+class Imported(LocalDataset):
+    """Dataset converted from an ANN-benchmarks .hdf5 file, or from .fvecs/.bvecs train and test
+    files with optional .ivecs neighbors. Use Imported.from_files to get the size, dim and metric from the files.
+    """
+    use_shuffled: bool = False
+    source: pathlib.Path
+    test_source: pathlib.Path | None = None
+    neighbors_source: pathlib.Path | None = None
+
+    @classmethod
+    def from_files(
+        cls,
+        name: str,
+        source: str | pathlib.Path,
+        test_source: str | pathlib.Path | None = None,
+        neighbors_source: str | pathlib.Path | None = None,
+        metric_type: MetricType | None = None,
+    ) -> "Imported":
+        size, dim, file_metric = importer.inspect(source)
+        return cls(
+            name=name,
+            size=size,
+            dim=dim,
+            metric_type=metric_type or file_metric or MetricType.L2,
+            source=source,
+            test_source=test_source,
+            neighbors_source=neighbors_source,
+        )
+
+    @property
+    def label(self) -> str:
+        return "IMPORTED"
+
+    def build(self, data_dir: pathlib.Path) -> list[str]:
+        return importer.import_dataset(data_dir, self.size, self.source, self.test_source, self.neighbors_source)
+
+
 class DatasetManager(BaseModel):
     """Download dataset if not int the local directory. Provide data for cases.
 
-    DatasetManager is iterable, each iteration will return the next batch of data in pandas.DataFrame
+    DatasetManager is iterable, each iteration will return the next batch of data in pandas.DataFrame,
+    or a tuple of (ids, embeddings) numpy views if the vector cache is enabled by prepare(use_cache=True).
+    iter_numpy() always returns batches in (ids, embeddings) numpy arrays.
+    If prefetch_depth > 0, the next batches are read in a background thread while the current one is consumed.
 
     Examples:
         >>> cohere = Dataset.COHERE.manager(100_000)
@@ -122,10 +218,17 @@ class DatasetManager(BaseModel):
     data:   BaseDataset
     test_data: pd.DataFrame | None = None
     train_files : list[str] = []
+    use_cache: bool = False
+    # the embeddings are l2 normalized for the run, see prepare()
+    normalize: bool = False
+    # the train embeddings read are normalized already, by the normalized vector cache
+    normalized: bool = False
+    prefetch_depth: int = config.PREFETCH_DEPTH
 
     def __eq__(self, obj):
         if isinstance(obj, DatasetManager):
-            return self.data.name == obj.data.name and self.data.label == obj.data.label
+            return self.data.name == obj.data.name and self.data.label == obj.data.label and \
+                self.data.size == obj.data.size
         return False
 
     @property
@@ -150,8 +253,72 @@ class DatasetManager(BaseModel):
         """
         return f"{config.DEFAULT_DATASET_URL}{self.data.dir_name}"
 
+    @property
+    def cache_dir(self) -> pathlib.Path:
+        """ local directory for files derived from the dataset: data_dir/cache
+
+        Examples:
+            >>> sift_s = Dataset.SIFT.manager(500_000)
+            >>> sift_s.cache_dir
+            '/tmp/vectordb_bench/dataset/sift/sift_small_500k/cache'
+        """
+        return self.data_dir.joinpath("cache")
+
+    @property
+    def train_prefix(self) -> str:
+        return "shuffle_train" if self.data.use_shuffled else "train"
+
+    def _cache_paths(self) -> tuple[pathlib.Path, pathlib.Path, pathlib.Path]:
+        """paths of the vector cache: (embeddings, ids, meta)"""
+        variant = "_normalized" if self.normalized else ""
+        return (
+            self.cache_dir.joinpath(f"{self.train_prefix}_emb{variant}.npy"),
+            self.cache_dir.joinpath(f"{self.train_prefix}_id.npy"),
+            self.cache_dir.joinpath(f"{self.train_prefix}_meta{variant}.json"),
+        )
+
     def __iter__(self):
-        return DataSetIterator(self)
+        return self._prefetch(CachedDataSetIterator(self) if self.use_cache else DataSetIterator(self))
+
+    def iter_numpy(self, worker: int = 0, num_workers: int = 1, start: int = 0):
+        """Iterate the train data in (ids: np.ndarray[int64], embeddings: np.ndarray[float32, (n, dim)]),
+        read from the vector cache or straight from the arrow buffers of the train files, no pandas involved.
+
+        With num_workers > 1, only the shard of `worker` is returned, see `shard_train_files`.
+        The first `start` batches of the shard are skipped, the files before them aren't read at all.
+        """
+        if self.use_cache:
+            return self._prefetch(CachedDataSetIterator(self, worker, num_workers, start))
+        return self._prefetch(NumpyDataSetIterator(self, worker, num_workers, start))
+
+    def train_block(self) -> np.ndarray:
+        """All the train embeddings in one contiguous float32 matrix of shape (size, dim), in the order of the files.
+
+        With the vector cache it's a read-only memmap of the cache, shared by the processes through the page cache,
+        otherwise the train files are decoded into memory.
+        """
+        if self.use_cache:
+            return np.load(self._cache_paths()[0], mmap_mode="r")
+
+        files = [self.data_dir.joinpath(f) for f in self.train_files]
+        block = np.empty((sum(ParquetFile(p).metadata.num_rows for p in files), self.data.dim), dtype=np.float32)
+        offset = 0
+        for _, emb in NumpyDataSetIterator(self):
+            block[offset : offset + len(emb)] = emb
+            offset += len(emb)
+        return block
+
+    def file_batches(self, files: list[str]) -> list[int]:
+        """number of the config.NUM_PER_BATCH batches of each train file, from the parquet metadata"""
+        return [
+            math.ceil(ParquetFile(self.data_dir.joinpath(f)).metadata.num_rows / config.NUM_PER_BATCH)
+            for f in files
+        ]
+
+    def _prefetch(self, it):
+        if self.prefetch_depth > 0:
+            return PrefetchDataSetIterator(it, self.prefetch_depth)
+        return it
 
     def _validate_local_file(self):
         if not self.data_dir.exists():
@@ -183,62 +350,132 @@ class DatasetManager(BaseModel):
         else:
             # if local file exists, check the etag of local file with s3,
             # make sure data files aren't corrupted.
-            for name in tqdm([key.split("/")[-1] for key in path2etag.keys()]):
+            to_check = []
+            for name in [key.split("/")[-1] for key in path2etag.keys()]:
                 s3_path = f"{self.download_dir}/{name}"
                 local_path = self.data_dir.joinpath(name)
                 log.debug(f"s3 path: {s3_path}, local_path: {local_path}")
                 if not local_path.exists():
                     log.info(f"local file not exists: {local_path}, add to downloading lists")
                     downloads.append(s3_path)
+                else:
+                    to_check.append((s3_path, local_path))
 
-                elif not self.match_etag(path2etag.get(s3_path), local_path):
+            matched = self._match_etags([(path2etag.get(s3_path), local_path) for s3_path, local_path in to_check])
+            for (s3_path, local_path), ok in zip(to_check, matched, strict=True):
+                if not ok:
                     log.info(f"local file etag not match with s3 file: {local_path}, add to downloading lists")
                     downloads.append(s3_path)
 
-        for s3_file in tqdm(downloads):
-            log.debug(f"downloading file {s3_file} to {self.data_dir}")
-            fs.download(s3_file, self.data_dir.as_posix())
+        if downloads:
+            log.debug(f"downloading files {downloads} to {self.data_dir}")
+            ParallelDownloader(fs).download(list(downloads), self.data_dir)
+
+        # record the s3 files for validating the dataset offline
+        manifest = self._read_manifest()
+        manifest["remote"] = {key.split("/")[-1]: etag for key, etag in path2etag.items()}
+        self._write_manifest(manifest)
+
+    def _build_local_file(self):
+        """Build the files of a LocalDataset once, the files built are recorded in the manifest"""
+        built = self._read_manifest().get("local", [])
+        if built and all(self.data_dir.joinpath(name).exists() for name in built):
+            log.info(f"{self.data.name}: reuse the local files in {self.data_dir}")
+            return
+
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        files = self.data.build(self.data_dir)
+        manifest = self._read_manifest()
+        manifest["local"] = files
+        self._write_manifest(manifest)
+
+    def _validate_local_file_offline(self):
+        """Validate the local files against the manifest written by the last online validation,
+        without connecting to S3."""
+        remote = self._read_manifest().get("remote")
+        if not remote:
+            raise ValueError(f"No manifest of the dataset in {self.data_dir}, prepare it online once before running offline")
+
+        missing = [name for name in remote if not self.data_dir.joinpath(name).exists()]
+        if missing:
+            raise ValueError(f"Dataset files not exist in offline mode: {missing}")
+
+        files = [(etag, self.data_dir.joinpath(name)) for name, etag in remote.items()]
+        corrupted = [p.name for (_, p), ok in zip(files, self._match_etags(files), strict=True) if not ok]
+        if corrupted:
+            raise ValueError(f"Dataset files etag not match with the manifest in offline mode: {corrupted}")
+        log.info(f"{self.data.name}: validated {len(files)} local files offline")
 
     def match_etag(self, expected_etag: str, local_file) -> bool:
         """Check if local files' etag match with S3"""
-        def factor_of_1MB(filesize, num_parts):
-            x = filesize / int(num_parts)
-            y = x % 1048576
-            return int(x + 1048576 - y)
-
-        def calc_etag(inputfile, partsize):
-            md5_digests = []
-            with open(inputfile, 'rb') as f:
-                for chunk in iter(lambda: f.read(partsize), b''):
-                    md5_digests.append(md5(chunk).digest())
-            return md5(b''.join(md5_digests)).hexdigest() + '-' + str(len(md5_digests))
-
-        def possible_partsizes(filesize, num_parts):
-            return lambda partsize: partsize < filesize and (float(filesize) / float(partsize)) <= num_parts
-
-        filesize = os.path.getsize(local_file)
-        le = ""
-        if '-' not in expected_etag: # no spliting uploading
-            with open(local_file, 'rb') as f:
-                le = md5(f.read()).hexdigest()
-                log.debug(f"calculated local etag {le}, expected etag: {expected_etag}")
-                return expected_etag == le
-        else:
-            num_parts = int(expected_etag.split('-')[-1])
-            partsizes = [ ## Default Partsizes Map
-                8388608, # aws_cli/boto3
-                15728640, # s3cmd
-                factor_of_1MB(filesize, num_parts) # Used by many clients to upload large files
-            ]
-
-            for partsize in filter(possible_partsizes(filesize, num_parts), partsizes):
-                le = calc_etag(local_file, partsize)
-                log.debug(f"calculated local etag {le}, expected etag: {expected_etag}")
-                if expected_etag == le:
-                    return True
-        return False
+        return self._match_etags([(expected_etag, pathlib.Path(local_file))])[0]
 
-    def prepare(self, check=True) -> bool:
+    @property
+    def manifest_path(self) -> pathlib.Path:
+        return self.data_dir.joinpath("manifest.json")
+
+    def _read_manifest(self) -> dict:
+        if not self.manifest_path.exists():
+            return {}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest: dict):
+        tmp = self.manifest_path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2)
+        tmp.replace(self.manifest_path)
+
+    def _match_etags(self, files: list[tuple[str, pathlib.Path]]) -> list[bool]:
+        """Check if local files' etag match with S3.
+
+        The etags that matched are recorded in the manifest of the data_dir along with the file stat,
+        a file whose size, mtime and inode are unchanged since is trusted without hashing it again.
+        The files that do need hashing are hashed in a process pool.
+        """
+        manifest = self._read_manifest()
+        stats = manifest.setdefault("files", {})
+
+        def stat_of(p: pathlib.Path) -> dict:
+            st = p.stat()
+            return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "inode": st.st_ino}
+
+        matched, to_hash = [False] * len(files), []
+        for i, (etag, p) in enumerate(files):
+            record = stats.get(p.name, {})
+            if record.get("etag") == etag and all(record.get(k) == v for k, v in stat_of(p).items()):
+                log.debug(f"trust the etag of unchanged local file {p}")
+                matched[i] = True
+            else:
+                to_hash.append(i)
+
+        if len(to_hash) == 0:
+            return matched
+
+        log.info(f"calculating etags of {len(to_hash)} local files")
+        args = ([files[i][0] for i in to_hash], [files[i][1] for i in to_hash])
+        if len(to_hash) == 1:
+            part_sizes = list(map(utils.match_etag, *args))
+        else:
+            with concurrent.futures.ProcessPoolExecutor(
+                mp_context=mp.get_context("spawn"),
+                max_workers=min(len(to_hash), os.cpu_count()),
+            ) as executor:
+                part_sizes = list(executor.map(utils.match_etag, *args))
+
+        for i, part_size in zip(to_hash, part_sizes, strict=True):
+            etag, p = files[i]
+            log.debug(f"local file {p} etag matched: {part_size is not None}, expected etag: {etag}")
+            if part_size is not None:
+                matched[i] = True
+                stats[p.name] = {**stat_of(p), "etag": etag, "part_size": part_size}
+            else:
+                stats.pop(p.name, None)
+
+        self._write_manifest(manifest)
+        return matched
+
+    def prepare(self, check=True, use_cache: bool = config.USE_VECTOR_CACHE, normalize: bool = False) -> bool:
         """Download the dataset from S3
          url = f"{config.DEFAULT_DATASET_URL}/{self.data.dir_name}"
 
@@ -248,29 +485,173 @@ class DatasetManager(BaseModel):
              - neighbors.parquet: ground_truth of the test.parquet
              - neighbors_head_1p.parquet: ground_truth of the test.parquet after filtering 1% data
              - neighbors_99p.parquet: ground_truth of the test.parquet after filtering 99% data
+
+         with config.DATASET_OFFLINE, nothing is downloaded, the local files are validated
+         against data_dir/manifest.json written by the last online prepare.
+
+         if use_cache, the train files are decoded once into data_dir/cache:
+             - {prefix}_emb.npy: float32 embeddings of all the train files, shape (n, dim)
+             - {prefix}_id.npy: int64 ids of all the train files, shape (n,)
+             - {prefix}_meta.json: the train files, their size and mtime, and the shape the cache is built from
+
+         if normalize, the test embeddings are l2 normalized and cached in test_emb_normalized.npy, see test_emb().
+         With use_cache, the train embeddings are normalized once into the vector cache,
+         in {prefix}_emb_normalized.npy and {prefix}_meta_normalized.json. Otherwise they're read
+         as is, not normalized, and the insert runners normalize every batch.
         """
         if check:
-            self._validate_local_file()
-
-        prefix = "shuffle_train" if self.data.use_shuffled else "train"
-        self.train_files = sorted([f.name for f in self.data_dir.glob(f'{prefix}*.parquet')])
+            if isinstance(self.data, LocalDataset):
+                self._build_local_file()
+            elif config.DATASET_OFFLINE:
+                self._validate_local_file_offline()
+            else:
+                self._validate_local_file()
+
+        self.train_files = sorted([f.name for f in self.data_dir.glob(f'{self.train_prefix}*.parquet')])
         log.debug(f"{self.data.name}: available train files {self.train_files}")
+        self.normalize = normalize
+        self.use_cache = use_cache
+        self.normalized = normalize and use_cache
+        if self.use_cache:
+            self._build_vector_cache()
         self.test_data = self._read_file("test.parquet")
         return True
 
+    def test_emb(self) -> np.ndarray:
+        """float32 test embeddings of shape (nq, dim), normalized like the train data.
+
+        The normalized test embeddings are cached in cache_dir.
+        """
+        if not self.normalize:
+            return np.stack(self.test_data["emb"]).astype(np.float32, copy=False)
+
+        path = self.cache_dir.joinpath("test_emb_normalized.npy")
+        test_path = self.data_dir.joinpath("test.parquet")
+        if path.exists() and path.stat().st_mtime_ns >= test_path.stat().st_mtime_ns:
+            return np.load(path)
+
+        emb = preprocess.normalize(np.stack(self.test_data["emb"]))
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp.npy")
+        np.save(tmp, emb)
+        tmp.replace(path)
+        return emb
+
+    def _build_vector_cache(self):
+        """Decode the train files into a contiguous float32 matrix and an int64 id array on disk.
+
+        The cache is built only once, it's reused as long as the train files, their size and mtime, and dim are unchanged.
+        If normalized, the embeddings are l2 normalized in place batch by batch.
+        """
+        emb_path, id_path, meta_path = self._cache_paths()
+        train_stats = {}
+        for f in self.train_files:
+            st = self.data_dir.joinpath(f).stat()
+            train_stats[f] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        meta = {
+            "train_files": self.train_files,
+            "train_stats": train_stats,
+            "dim": self.data.dim,
+            "normalized": self.normalized,
+        }
+        if meta_path.exists() and emb_path.exists() and id_path.exists():
+            with open(meta_path) as f:
+                cached = json.load(f)
+            if all(cached.get(k) == v for k, v in meta.items()):
+                log.info(f"{self.data.name}: reuse the vector cache in {self.cache_dir}")
+                return
+
+        files = [self.data_dir.joinpath(f) for f in self.train_files]
+        total = sum(ParquetFile(p).metadata.num_rows for p in files)
+        log.info(f"{self.data.name}: build the vector cache of {total} rows in {self.cache_dir}")
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_emb, tmp_id = emb_path.with_suffix(".tmp"), id_path.with_suffix(".tmp")
+        emb = np.lib.format.open_memmap(tmp_emb, mode="w+", dtype=np.float32, shape=(total, self.data.dim))
+        ids = np.lib.format.open_memmap(tmp_id, mode="w+", dtype=np.int64, shape=(total,))
+
+        offset = 0
+        for p in tqdm(files):
+            for batch in ParquetFile(p).iter_batches(config.NUM_PER_BATCH, columns=["id", "emb"]):
+                n = batch.num_rows
+                ids[offset : offset + n] = batch.column("id").to_numpy()
+                emb[offset : offset + n] = emb_to_numpy(batch.column("emb"), self.data.dim)
+                if self.normalized:
+                    preprocess.normalize_inplace(emb[offset : offset + n])
+                offset += n
+
+        emb.flush()
+        ids.flush()
+        del emb, ids
+        tmp_emb.replace(emb_path)
+        tmp_id.replace(id_path)
+        with open(meta_path, "w") as f:
+            json.dump({**meta, "rows": total}, f)
+
     def get_ground_truth(self, filters: int | float | None = None) -> pd.DataFrame:
+        """Ground truth of the test data, filters is the rate of the train data filtered out by `id >= filters * size`.
 
-        file_name = ""
-        if filters is None:
+        Any rate in [0, 1) is supported, 0 filters out nothing and shares the unfiltered ground truth.
+        A ground truth file not in the dataset is computed from the train files and kept in data_dir for the next runs.
+        """
+        min_id = None
+        if filters is None or filters == 0:
             file_name = "neighbors.parquet"
-        elif filters == 0.01:
-            file_name = "neighbors_head_1p.parquet"
-        elif filters == 0.99:
-            file_name = "neighbors_tail_1p.parquet"
+        elif not 0 <= filters < 1:
+            raise ValueError(f"Filters not supported: {filters}, expected a rate in [0, 1)")
         else:
-            raise ValueError(f"Filters not supported: {filters}")
+            min_id = round(filters * self.data.size)
+            if filters == 0.01:
+                file_name = "neighbors_head_1p.parquet"
+            elif filters == 0.99:
+                file_name = "neighbors_tail_1p.parquet"
+            else:
+                file_name = f"neighbors_filter_{filters:g}.parquet"
+
+        if not self.data_dir.joinpath(file_name).exists() and self.train_files:
+            log.info(f"{self.data.name}: no ground truth file {file_name}, computing it from the train files")
+            self.compute_ground_truth(file_name=file_name, min_id=min_id)
         return self._read_file(file_name)
 
+    def compute_ground_truth(
+        self,
+        k: int = 100,
+        file_name: str = "neighbors.parquet",
+        min_id: int | None = None,
+    ) -> pathlib.Path:
+        """Compute the exact top-k ground truth of the test data over the train files into data_dir/file_name,
+        with columns id, neighbors_id and neighbors_distance. If min_id is set, only the train data
+        with `id >= min_id` are searched, which is how Case.filters filters the data.
+
+        The train files are streamed in blocks of ground_truth.BLOCK_SIZE rows. The top-k is checkpointed
+        into cache_dir after every train file, an interrupted computation resumes from the last checkpoint.
+        """
+        test_ids = np.asarray(self.test_data["id"], dtype=np.int64)
+        topk = ground_truth.TopK(np.stack(self.test_data["emb"]), k, self.data.metric_type)
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        checkpoint = self.cache_dir.joinpath(f"{file_name}.checkpoint.npz")
+        done = topk.load(checkpoint, self.train_files)
+        if done:
+            log.info(f"{self.data.name}: resume computing {file_name}, train files done: {done}")
+
+        for file_name_ in tqdm([f for f in self.train_files if f not in done]):
+            p = self.data_dir.joinpath(file_name_)
+            for batch in ParquetFile(p).iter_batches(ground_truth.BLOCK_SIZE, columns=["id", "emb"]):
+                ids, emb = batch.column("id").to_numpy(), emb_to_numpy(batch.column("emb"), self.data.dim)
+                if min_id is not None:
+                    mask = ids >= min_id
+                    ids, emb = ids[mask], emb[mask]
+                topk.add(ids, emb)
+            done.append(file_name_)
+            topk.save(checkpoint, done, self.train_files)
+
+        output = self.data_dir.joinpath(file_name)
+        ground_truth.write_neighbors(output, test_ids, *topk.result())
+        checkpoint.unlink(missing_ok=True)
+        log.info(f"{self.data.name}: computed ground truth top-{k} of {len(test_ids)} queries into {output}")
+        return output
+
     def _read_file(self, file_name: str) -> pd.DataFrame:
         """read one file from disk into memory"""
         log.info(f"Read the entire file into memory: {file_name}")
@@ -282,12 +663,64 @@ class DatasetManager(BaseModel):
         return pl.read_parquet(p)
 
 
+def emb_to_numpy(emb: pa.Array, dim: int) -> np.ndarray:
+    """View a list<float> arrow column as a (n, dim) float32 numpy matrix without going through pandas.
+
+    No copy is made if the values are already float32.
+    """
+    return emb.flatten().to_numpy(zero_copy_only=False).astype(np.float32, copy=False).reshape(-1, dim)
+
+
+def shard_train_files(train_files: list[str], worker: int, num_workers: int) -> tuple[list[str], int, int]:
+    """Split the train data into num_workers disjoint shards.
+
+    The files are assigned round-robin if there are at least num_workers of them,
+    otherwise every worker reads all the files and keeps every num_workers-th batch.
+
+    Returns:
+        tuple[list[str], int, int]: files of the shard, and the (offset, step) of the batches to keep.
+    """
+    if not 0 <= worker < num_workers:
+        raise ValueError(f"Invalid worker {worker} of {num_workers}")
+    if num_workers <= len(train_files):
+        return train_files[worker::num_workers], 0, 1
+    return train_files, worker, num_workers
+
+
+def locate_batch(file_batches: list[int], batch: int) -> tuple[int, int]:
+    """Returns:
+        tuple[int, int]: (file index, batch offset in the file) of the batch-th batch of the files,
+            (len(file_batches), 0) if it's past the end.
+    """
+    for i, n in enumerate(file_batches):
+        if batch < n:
+            return i, batch
+        batch -= n
+    return len(file_batches), 0
+
+
 class DataSetIterator:
-    def __init__(self, dataset: DatasetManager):
+    def __init__(self, dataset: DatasetManager, worker: int = 0, num_workers: int = 1, start: int = 0):
         self._ds = dataset
+        self._files, self._batch_offset, self._batch_step = shard_train_files(dataset.train_files, worker, num_workers)
+        self._batch_idx = 0
         self._idx = 0  # file number
         self._cur = None
-        self._sub_idx = [0 for i in range(len(self._ds.train_files))] # iter num for each file
+        self._sub_idx = [0 for i in range(len(self._files))] # iter num for each file
+        if start > 0:
+            self._seek(start * self._batch_step)
+
+    def _seek(self, batch_idx: int):
+        """position at the batch_idx-th batch of the files, only its file is opened"""
+        self._idx, offset = locate_batch(self._ds.file_batches(self._files), batch_idx)
+        self._batch_idx = batch_idx
+        if self._idx < len(self._files):
+            self._cur = self._get_iter(self._files[self._idx])
+            for _ in range(offset):
+                next(self._cur)
+
+    def __iter__(self):
+        return self
 
     def _get_iter(self, file_name: str):
         p = pathlib.Path(self._ds.data_dir, file_name)
@@ -299,23 +732,160 @@ class DataSetIterator:
 
     def __next__(self) -> pd.DataFrame:
         """return the data in the next file of the training list"""
-        if self._idx < len(self._ds.train_files):
+        while True:
+            batch = self._next_batch()
+            self._batch_idx += 1
+            if (self._batch_idx - 1) % self._batch_step == self._batch_offset:
+                return self._convert(batch)
+
+    def _next_batch(self) -> pa.RecordBatch:
+        if self._idx < len(self._files):
             if self._cur is None:
-                file_name = self._ds.train_files[self._idx]
+                file_name = self._files[self._idx]
                 self._cur = self._get_iter(file_name)
 
             try:
-                return next(self._cur).to_pandas()
+                return next(self._cur)
             except StopIteration:
-                if self._idx == len(self._ds.train_files) - 1:
+                if self._idx == len(self._files) - 1:
                     raise StopIteration from None
 
                 self._idx += 1
-                file_name = self._ds.train_files[self._idx]
+                file_name = self._files[self._idx]
                 self._cur = self._get_iter(file_name)
-                return next(self._cur).to_pandas()
+                return next(self._cur)
         raise StopIteration
 
+    def _convert(self, batch: pa.RecordBatch) -> pd.DataFrame:
+        return batch.to_pandas()
+
+
+class NumpyDataSetIterator(DataSetIterator):
+    """Iterate the train files in (ids, embeddings) decoded from the arrow buffers directly,
+    ids is np.ndarray[int64] of shape (n,), embeddings is np.ndarray[float32] of shape (n, dim).
+    """
+    def _get_iter(self, file_name: str):
+        p = pathlib.Path(self._ds.data_dir, file_name)
+        log.info(f"Get iterator for {p.name}")
+        if not p.exists():
+            raise IndexError(f"No such file {p}")
+        return ParquetFile(p).iter_batches(config.NUM_PER_BATCH, columns=["id", "emb"])
+
+    def _convert(self, batch: pa.RecordBatch) -> tuple[np.ndarray, np.ndarray]:
+        ids = batch.column("id").to_numpy().astype(np.int64, copy=False)
+        return ids, emb_to_numpy(batch.column("emb"), self._ds.data.dim)
+
+
+class CachedDataSetIterator:
+    """Iterate the vector cache of the train files, each iteration returns
+    (ids, embeddings) of config.NUM_PER_BATCH rows as read-only np.memmap slices.
+    With num_workers > 1, only every num_workers-th batch starting from the worker-th is returned.
+    """
+    def __init__(self, dataset: DatasetManager, worker: int = 0, num_workers: int = 1, start: int = 0):
+        if not 0 <= worker < num_workers:
+            raise ValueError(f"Invalid worker {worker} of {num_workers}")
+        emb_path, id_path, _ = dataset._cache_paths()
+        self._emb = np.load(emb_path, mmap_mode="r")
+        self._ids = np.load(id_path, mmap_mode="r")
+        self._offset = (worker + start * num_workers) * config.NUM_PER_BATCH
+        self._stride = (num_workers - 1) * config.NUM_PER_BATCH
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> tuple[np.ndarray, np.ndarray]:
+        if self._offset >= len(self._ids):
+            raise StopIteration
+
+        start = self._offset
+        end = min(start + config.NUM_PER_BATCH, len(self._ids))
+        self._offset = end + self._stride
+        return self._ids[start : end], self._emb[start : end]
+
+
+class PrefetchDataSetIterator:
+    """Read and decode the next `depth` batches of the wrapped iterator in a background thread,
+    so that reading the dataset overlaps with inserting the current batch.
+
+    close() stops the thread if the batches aren't all consumed, it's called on garbage collection too,
+    the thread holds no reference to the iterator for that.
+
+    stall_count and stall_duration record how often and how long the consumer waited for data.
+    """
+    _END = object()
+    _POLL_INTERVAL = 0.1  # seconds a blocked producer waits before checking whether it's stopped
+
+    def __init__(self, it: DataSetIterator | NumpyDataSetIterator | CachedDataSetIterator, depth: int):
+        self._queue = queue.Queue(maxsize=depth)
+        self._stop = threading.Event()
+        self._done = False
+        self.stall_count = 0
+        self.stall_duration = 0.0
+        self._thread = threading.Thread(target=self._prefetch, args=(it, self._queue, self._stop), daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def _prefetch(cls, it, q: queue.Queue, stop: threading.Event):
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=cls._POLL_INTERVAL)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        try:
+            for data in it:
+                if not put(data):
+                    return
+        except Exception as e:
+            put(e)
+        else:
+            put(cls._END)
+
+    def close(self):
+        """stop the thread and drop the batches prefetched, it's a no-op once closed"""
+        self._done = True
+        self._stop.set()
+        self._drain()
+        self._thread.join()
+        self._drain()
+
+    def _drain(self):
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+
+    def __del__(self):
+        if hasattr(self, "_thread"):
+            self.close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._done:
+            raise StopIteration
+
+        try:
+            data = self._queue.get_nowait()
+        except queue.Empty:
+            self.stall_count += 1
+            s = time.perf_counter()
+            data = self._queue.get()
+            self.stall_duration += time.perf_counter() - s
+
+        if data is self._END:
+            self._done = True
+            raise StopIteration
+        if isinstance(data, Exception):
+            self._done = True
+            raise data
+        return data
+
 
 class Dataset(Enum):
     """
@@ -331,6 +901,7 @@ class Dataset(Enum):
     GLOVE = Glove
     SIFT = SIFT
     OPENAI = OpenAI
+    SYNTHETIC = Synthetic
 
     def get(self, size: int) -> BaseDataset:
         return self.value(size=size)
@@ -0,0 +1,209 @@
+"""
+Usage:
+    >>> from xxx.downloader import ParallelDownloader
+    >>> fs = s3fs.S3FileSystem(anon=True)
+    >>> ParallelDownloader(fs).download(["assets.zilliz.com/benchmark/sift_small_500k/test.parquet"], local_dir)
+"""
+
+import json
+import time
+import math
+import logging
+import pathlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from fsspec import AbstractFileSystem
+from tqdm import tqdm
+
+from .. import config
+from . import utils
+
+log = logging.getLogger(__name__)
+
+
+def _remote_etag(info: dict) -> str | None:
+    """ETag of an s3 object without the quotes, None if the filesystem has none"""
+    etag = info.get("ETag") or info.get("etag")
+    return etag.strip('"') if etag else None
+
+
+def _remote_version(info: dict) -> str | None:
+    """what changes when the remote file is rewritten: its ETag, or its modification time"""
+    for key in ("ETag", "etag", "LastModified", "last_modified", "mtime"):
+        if info.get(key) is not None:
+            return str(info[key])
+    return None
+
+
+class _PartialFile:
+    """A file being downloaded: data goes to {name}.partial, the finished chunks to {name}.partial.json.
+
+    Both files survive a crash, a new download of the same file only fetches the unfinished chunks,
+    unless the remote file has changed since, its size, ETag or modification time differ.
+    """
+
+    def __init__(
+        self,
+        remote_path: str,
+        local_path: pathlib.Path,
+        size: int,
+        chunk_size: int,
+        version: str | None = None,
+        etag: str | None = None,
+    ):
+        self.remote_path = remote_path
+        self.local_path = local_path
+        self.size = size
+        self.chunk_size = chunk_size
+        self.version = version
+        self.etag = etag
+        self.num_chunks = math.ceil(size / chunk_size)
+
+        self.data_path = local_path.with_name(local_path.name + ".partial")
+        self.progress_path = local_path.with_name(local_path.name + ".partial.json")
+        self._lock = threading.Lock()
+        self.done = self._load_progress()
+
+        if not self.data_path.exists() or self.data_path.stat().st_size != size:
+            with open(self.data_path, "wb") as f:
+                f.truncate(size)
+            self.done = set()
+
+    def _load_progress(self) -> set[int]:
+        if not (self.data_path.exists() and self.progress_path.exists()):
+            return set()
+        with open(self.progress_path) as f:
+            progress = json.load(f)
+        if progress.get("size") != self.size or progress.get("chunk_size") != self.chunk_size:
+            return set()
+        if progress.get("version") != self.version:
+            log.info(f"{self.remote_path} changed since the interrupted download, discard the partial file")
+            return set()
+        return set(progress.get("done", []))
+
+    def pending_chunks(self) -> list[int]:
+        return [i for i in range(self.num_chunks) if i not in self.done]
+
+    def chunk_range(self, idx: int) -> tuple[int, int]:
+        start = idx * self.chunk_size
+        return start, min(start + self.chunk_size, self.size)
+
+    def write_chunk(self, idx: int, data: bytes):
+        start, end = self.chunk_range(idx)
+        if len(data) != end - start:
+            raise IOError(f"Short read of {self.remote_path} [{start}, {end}): got {len(data)} bytes")
+
+        with open(self.data_path, "r+b") as f:
+            f.seek(start)
+            f.write(data)
+
+        with self._lock:
+            self.done.add(idx)
+            with open(self.progress_path, "w") as f:
+                json.dump({
+                    "size": self.size,
+                    "chunk_size": self.chunk_size,
+                    "version": self.version,
+                    "done": sorted(self.done),
+                }, f)
+
+    def finished(self) -> bool:
+        return len(self.done) == self.num_chunks
+
+    def discard(self):
+        self.data_path.unlink(missing_ok=True)
+        self.progress_path.unlink(missing_ok=True)
+
+    def commit(self):
+        """Move the finished file in place once its size, and its ETag if any, match the remote file.
+
+        Raises:
+            IOError: the partial files are removed, the next download starts over.
+        """
+        size = self.data_path.stat().st_size
+        if size != self.size:
+            self.discard()
+            raise IOError(f"Size of the downloaded {self.remote_path} mismatch: {size} != {self.size}")
+        if self.etag is not None and utils.match_etag(self.etag, self.data_path) is None:
+            self.discard()
+            raise IOError(f"ETag of the downloaded {self.remote_path} mismatch: {self.etag}")
+
+        self.data_path.replace(self.local_path)
+        self.progress_path.unlink(missing_ok=True)
+
+
+class ParallelDownloader:
+    """Download files from a fsspec filesystem, e.g. s3fs.S3FileSystem or a local directory.
+
+    Every file is split into byte ranges of chunk_size, the ranges of all the files are fetched
+    concurrently by `workers` threads. Interrupted downloads are resumed from the .partial files.
+
+    Args:
+        fs(AbstractFileSystem): the remote filesystem.
+        workers(int): number of concurrent range reads, default to config.DOWNLOAD_WORKERS.
+        chunk_size(int): bytes of one range read, default to config.DOWNLOAD_CHUNK_SIZE.
+    """
+
+    def __init__(
+        self,
+        fs: AbstractFileSystem,
+        workers: int = config.DOWNLOAD_WORKERS,
+        chunk_size: int = config.DOWNLOAD_CHUNK_SIZE,
+    ):
+        self.fs = fs
+        self.workers = workers
+        self.chunk_size = chunk_size
+
+    def _fetch(self, pf: _PartialFile, idx: int) -> int:
+        start, end = pf.chunk_range(idx)
+        pf.write_chunk(idx, self.fs.cat_file(pf.remote_path, start=start, end=end))
+        return end - start
+
+    def download(self, remote_paths: list[str], local_dir: pathlib.Path) -> int:
+        """Download remote_paths into local_dir, keeping the file names.
+
+        Returns:
+            int: bytes downloaded in this call, chunks resumed from .partial files excluded.
+        """
+        local_dir.mkdir(parents=True, exist_ok=True)
+        files = []
+        for p in remote_paths:
+            info = self.fs.info(p)
+            files.append(_PartialFile(
+                p, local_dir.joinpath(p.split("/")[-1]), info["size"], self.chunk_size,
+                version=_remote_version(info), etag=_remote_etag(info),
+            ))
+        for pf in files:
+            if pf.done:
+                log.info(f"resume downloading {pf.remote_path}: {len(pf.done)}/{pf.num_chunks} chunks finished")
+
+        tasks = [(pf, idx) for pf in files for idx in pf.pending_chunks()]
+        total = sum(pf.chunk_range(idx)[1] - pf.chunk_range(idx)[0] for pf, idx in tasks)
+        log.info(f"start downloading {len(files)} files, {utils.numerize(total)}B in {len(tasks)} chunks, workers={self.workers}")
+
+        downloaded, start = 0, time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor, \
+                tqdm(total=total, unit="B", unit_scale=True) as bar:
+            futures = [executor.submit(self._fetch, pf, idx) for pf, idx in tasks]
+            try:
+                for future in as_completed(futures):
+                    n = future.result()
+                    downloaded += n
+                    bar.update(n)
+            except Exception as e:
+                log.warning(f"download failed, finished chunks are kept for resuming: {e}")
+                for f in futures:
+                    f.cancel()
+                raise e from None
+
+        for pf in files:
+            if pf.finished():
+                pf.commit()
+
+        dur = time.perf_counter() - start
+        log.info(
+            f"finish downloading {len(files)} files: {utils.numerize(downloaded)}B in {round(dur, 4)}s, "
+            f"throughput={round(downloaded / dur / 1024 / 1024, 2) if dur > 0 else 0}MB/s"
+        )
+        return downloaded
@@ -0,0 +1,178 @@
+"""
+Usage:
+    >>> from xxx.ground_truth import TopK
+    >>> topk = TopK(test_emb, k=100, metric_type=MetricType.L2)
+    >>> for ids, emb in train_blocks:
+    >>>     topk.add(ids, emb)
+    >>> neighbors_id, neighbors_distance = topk.result()
+"""
+
+import os
+import logging
+import pathlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .clients import MetricType
+from .preprocess import normalize
+
+log = logging.getLogger(__name__)
+
+BLOCK_SIZE = 100_000  # train rows per distance computation
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+
+def distances(query: np.ndarray, emb: np.ndarray, metric_type: MetricType) -> np.ndarray:
+    """Pairwise distances of shape (len(query), len(emb)), the lower the closer.
+
+    L2: euclidean distance, COSINE: 1 - cosine similarity, IP: negative inner product.
+    query and emb are expected to be normalized already for COSINE.
+    """
+    ip = query @ emb.T
+    if metric_type == MetricType.L2:
+        sq = (query ** 2).sum(axis=1)[:, np.newaxis] - 2 * ip + (emb ** 2).sum(axis=1)[np.newaxis, :]
+        return np.sqrt(np.maximum(sq, 0))
+    if metric_type == MetricType.COSINE:
+        return 1 - ip
+    return -ip
+
+
+class TopK:
+    """Exact top-k neighbors of the test queries over train data fed in blocks,
+    memory is bounded by the size of one block.
+
+    Distances are computed by faiss IndexFlat if faiss is installed, otherwise by numpy matmul,
+    both use all the cores. The top-k selection of numpy is sharded by queries over `workers` threads.
+
+    Args:
+        test(np.ndarray): test queries of shape (nq, dim).
+        k(int): number of neighbors.
+        metric_type(MetricType): L2, IP or COSINE, see `distances` for the distance of each metric.
+        workers(int): threads for the top-k selection, default to the cpu count.
+        use_faiss(bool): compute distances by faiss, default to True if faiss is installed.
+    """
+
+    def __init__(
+        self,
+        test: np.ndarray,
+        k: int,
+        metric_type: MetricType,
+        workers: int | None = None,
+        use_faiss: bool | None = None,
+    ):
+        self.k = k
+        self.metric_type = metric_type
+        self.workers = workers or os.cpu_count()
+        self.use_faiss = faiss is not None if use_faiss is None else use_faiss
+        self.test = self._prepare(test)
+        self.ids = np.empty((len(test), 0), dtype=np.int64)
+        self.dists = np.empty((len(test), 0), dtype=np.float32)
+
+    def _prepare(self, emb: np.ndarray) -> np.ndarray:
+        if self.metric_type == MetricType.COSINE:
+            return normalize(emb)
+        return np.ascontiguousarray(emb, dtype=np.float32)
+
+    def _search_faiss(self, ids: np.ndarray, emb: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        if self.metric_type == MetricType.L2:
+            index = faiss.IndexFlatL2(emb.shape[1])
+        else:
+            index = faiss.IndexFlatIP(emb.shape[1])
+        index.add(emb)
+        d, i = index.search(self.test, min(self.k, len(emb)))
+
+        if self.metric_type == MetricType.L2:
+            d = np.sqrt(np.maximum(d, 0))
+        elif self.metric_type == MetricType.COSINE:
+            d = 1 - d
+        else:
+            d = -d
+        return ids[i], d
+
+    def _search_numpy(self, ids: np.ndarray, emb: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        dists = distances(self.test, emb, self.metric_type)
+        if dists.shape[1] <= self.k:
+            return np.broadcast_to(ids, dists.shape), dists
+
+        def select(rows: slice) -> np.ndarray:
+            return np.argpartition(dists[rows], self.k - 1, axis=1)[:, : self.k]
+
+        shards = [slice(i, i + 1024) for i in range(0, len(dists), 1024)]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            part = np.concatenate(list(executor.map(select, shards)), axis=0)
+        return ids[part], np.take_along_axis(dists, part, axis=1)
+
+    def add(self, ids: np.ndarray, emb: np.ndarray):
+        """merge one block of train data into the current top-k"""
+        ids, emb = np.asarray(ids, dtype=np.int64), self._prepare(emb)
+        if len(ids) == 0:
+            return
+
+        search = self._search_faiss if self.use_faiss else self._search_numpy
+        new_ids, new_dists = search(ids, emb)
+        cand = np.concatenate([self.ids, new_ids], axis=1)
+        dists = np.concatenate([self.dists, new_dists.astype(np.float32)], axis=1)
+
+        if dists.shape[1] > self.k:
+            part = np.argpartition(dists, self.k - 1, axis=1)[:, : self.k]
+            dists = np.take_along_axis(dists, part, axis=1)
+            cand = np.take_along_axis(cand, part, axis=1)
+        self.ids, self.dists = cand, dists
+
+    def result(self) -> tuple[np.ndarray, np.ndarray]:
+        """Returns:
+            tuple[np.ndarray, np.ndarray]: neighbor ids and distances of shape (nq, k), closest first.
+        """
+        order = np.argsort(self.dists, axis=1, kind="stable")
+        return np.take_along_axis(self.ids, order, axis=1), np.take_along_axis(self.dists, order, axis=1)
+
+    def save(self, path: pathlib.Path, done: list[str], train_files: list[str]):
+        """checkpoint the current top-k and the names of the train files merged,
+        along with k, the metric and all the train files of the computation it belongs to"""
+        tmp = path.with_name(path.name + ".tmp.npz")
+        np.savez(
+            tmp, ids=self.ids, dists=self.dists, done=np.array(done, dtype=str),
+            k=self.k, metric_type=str(self.metric_type.value), train_files=np.array(train_files, dtype=str),
+        )
+        tmp.replace(path)
+
+    def load(self, path: pathlib.Path, train_files: list[str]) -> list[str]:
+        """restore the top-k from a checkpoint of the same queries, k, metric and train files
+
+        Returns:
+            list[str]: names of the train files merged already, empty if there's no matching checkpoint.
+        """
+        if not path.exists():
+            return []
+        with np.load(path) as ckpt:
+            if (
+                "k" not in ckpt
+                or int(ckpt["k"]) != self.k
+                or str(ckpt["metric_type"]) != self.metric_type.value
+                or ckpt["train_files"].tolist() != list(train_files)
+                or ckpt["ids"].shape[0] != len(self.test)
+                or ckpt["ids"].shape[1] > self.k
+            ):
+                log.warning(f"ignore mismatched ground truth checkpoint {path}")
+                return []
+            self.ids, self.dists = ckpt["ids"], ckpt["dists"]
+            return ckpt["done"].tolist()
+
+
+def write_neighbors(path: pathlib.Path, test_ids: np.ndarray, neighbors_id: np.ndarray, neighbors_distance: np.ndarray):
+    """write the ground truth in the layout of neighbors.parquet"""
+    pq.write_table(
+        pa.table({
+            "id": np.asarray(test_ids, dtype=np.int64),
+            "neighbors_id": list(neighbors_id),
+            "neighbors_distance": list(neighbors_distance),
+        }),
+        path,
+    )
@@ -0,0 +1,145 @@
+"""
+Usage:
+    >>> from xxx.dataset import Imported, DatasetManager
+    >>> sift = Imported.from_files("sift1m", "sift_base.fvecs", "sift_query.fvecs", "sift_groundtruth.ivecs")
+    >>> glove = Imported.from_files("glove100", "glove-100-angular.hdf5")
+    >>> DatasetManager(data=sift).prepare()
+"""
+
+import math
+import logging
+import pathlib
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .clients import MetricType
+from .synthetic import to_arrow, ROWS_PER_FILE, BLOCK_SIZE
+
+log = logging.getLogger(__name__)
+
+VECS_DTYPES = {
+    ".fvecs": np.float32,
+    ".bvecs": np.uint8,
+    ".ivecs": np.int32,
+}
+
+HDF5_SUFFIXES = (".hdf5", ".h5")
+
+# ANN-benchmarks `distance` attribute
+HDF5_METRICS = {
+    "euclidean": MetricType.L2,
+    "angular": MetricType.COSINE,
+    "dot": MetricType.IP,
+}
+
+
+def open_vecs(path: pathlib.Path) -> np.ndarray:
+    """Memory-map a .fvecs/.bvecs/.ivecs file as a (n, dim) array, no data is read until sliced.
+
+    Every row of the file is an int32 dim followed by dim values of the type of the suffix.
+    """
+    path = pathlib.Path(path)
+    dtype = np.dtype(VECS_DTYPES[path.suffix])
+    dim = int(np.fromfile(path, dtype=np.int32, count=1)[0])
+    row_bytes = 4 + dim * dtype.itemsize
+    raw = np.memmap(path, dtype=np.uint8, mode="r")
+    if raw.size % row_bytes != 0:
+        raise ValueError(f"Corrupted file {path}: size {raw.size} is not a multiple of the row size {row_bytes}")
+    return raw.reshape(-1, row_bytes)[:, 4:].view(dtype)
+
+
+def _open_hdf5(path: pathlib.Path):
+    try:
+        import h5py
+    except ImportError as e:
+        raise ImportError(
+            "h5py is required for importing ANN-benchmarks hdf5 datasets, "
+            "install the hdf5 extra: pip install 'vectordb-bench[hdf5]'"
+        ) from e
+    return h5py.File(path, "r")
+
+
+def is_hdf5(path: pathlib.Path) -> bool:
+    return pathlib.Path(path).suffix in HDF5_SUFFIXES
+
+
+def inspect(path: pathlib.Path) -> tuple[int, int, MetricType | None]:
+    """Returns:
+        tuple[int, int, MetricType | None]: size and dim of the train data, and the metric if the file records it.
+    """
+    if is_hdf5(path):
+        with _open_hdf5(path) as f:
+            n, dim = f["train"].shape
+            return n, dim, HDF5_METRICS.get(f.attrs.get("distance"))
+    n, dim = open_vecs(path).shape
+    return n, dim, None
+
+
+def _write_train(data_dir: pathlib.Path, train, size: int) -> list[str]:
+    """write a sliceable (n, dim) array into train-*.parquet files, one BLOCK_SIZE slice in memory at a time"""
+    if len(train) != size:
+        raise ValueError(f"Expected {size} train vectors, got {len(train)}")
+
+    num_files = math.ceil(size / ROWS_PER_FILE)
+    file_names = [f"train-{i:02d}-of-{num_files:02d}.parquet" for i in range(num_files)]
+    schema = to_arrow(np.empty(0, dtype=np.int64), np.empty((0, train.shape[1]), dtype=np.float32)).schema
+    for file_idx, file_name in enumerate(file_names):
+        with pq.ParquetWriter(data_dir.joinpath(file_name), schema) as writer:
+            file_end = min((file_idx + 1) * ROWS_PER_FILE, size)
+            for start in range(file_idx * ROWS_PER_FILE, file_end, BLOCK_SIZE):
+                end = min(start + BLOCK_SIZE, file_end)
+                emb = np.asarray(train[start:end], dtype=np.float32)
+                writer.write_batch(to_arrow(np.arange(start, end, dtype=np.int64), emb))
+        log.info(f"imported {file_name}")
+    return file_names
+
+
+def _write_test(data_dir: pathlib.Path, test) -> str:
+    test = np.asarray(test[:], dtype=np.float32)
+    batch = to_arrow(np.arange(len(test), dtype=np.int64), test)
+    pq.write_table(pa.Table.from_batches([batch]), data_dir.joinpath("test.parquet"))
+    return "test.parquet"
+
+
+def _write_neighbors(data_dir: pathlib.Path, neighbors, distances=None) -> str:
+    neighbors = np.asarray(neighbors[:], dtype=np.int64)
+    columns = {"id": np.arange(len(neighbors), dtype=np.int64), "neighbors_id": list(neighbors)}
+    if distances is not None:
+        columns["neighbors_distance"] = list(np.asarray(distances[:], dtype=np.float32))
+    pq.write_table(pa.table(columns), data_dir.joinpath("neighbors.parquet"))
+    return "neighbors.parquet"
+
+
+def import_dataset(
+    data_dir: pathlib.Path,
+    size: int,
+    source: pathlib.Path,
+    test_source: pathlib.Path | None = None,
+    neighbors_source: pathlib.Path | None = None,
+) -> list[str]:
+    """Convert an ANN-benchmarks .hdf5 file, or .fvecs/.bvecs train and test files with optional .ivecs
+    neighbors, into train-*.parquet, test.parquet and neighbors.parquet in data_dir.
+
+    Without neighbors, the ground truth is computed by DatasetManager.get_ground_truth when needed.
+
+    Returns:
+        list[str]: names of the files written.
+    """
+    data_dir.mkdir(parents=True, exist_ok=True)
+    if is_hdf5(source):
+        with _open_hdf5(source) as f:
+            files = _write_train(data_dir, f["train"], size)
+            files.append(_write_test(data_dir, f["test"]))
+            if "neighbors" in f:
+                files.append(_write_neighbors(data_dir, f["neighbors"], f.get("distances")))
+        return files
+
+    if test_source is None:
+        raise ValueError(f"Test vectors are required for importing {source}")
+    files = _write_train(data_dir, open_vecs(source), size)
+    files.append(_write_test(data_dir, open_vecs(test_source)))
+    if neighbors_source is not None:
+        files.append(_write_neighbors(data_dir, open_vecs(neighbors_source)))
+    return files
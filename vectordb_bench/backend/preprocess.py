@@ -0,0 +1,55 @@
+"""
+Usage:
+    >>> from xxx.preprocess import needs_normalize, normalize_inplace
+    >>> if needs_normalize(dataset.data.metric_type):
+    >>>     normalize_inplace(emb)
+"""
+
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .clients import MetricType
+
+log = logging.getLogger(__name__)
+
+CHUNK_SIZE = 16_384  # rows normalized by one thread at a time
+
+
+def needs_normalize(metric_type: MetricType) -> bool:
+    """only COSINE datasets are l2 normalized, L2 and IP distances depend on the norms"""
+    return metric_type == MetricType.COSINE
+
+
+def _normalize_chunk(emb: np.ndarray):
+    norm = np.linalg.norm(emb, axis=1, keepdims=True)
+    np.divide(emb, norm, out=emb, where=norm != 0)
+
+
+def normalize_inplace(emb: np.ndarray, workers: int | None = None) -> np.ndarray:
+    """l2 normalize the rows of a writable float32 matrix in place, chunked over `workers` threads.
+
+    Rows of zeros are left unchanged.
+
+    Returns:
+        np.ndarray: emb itself.
+    """
+    if emb.dtype != np.float32 or not emb.flags.writeable:
+        raise ValueError(f"Expected a writable float32 matrix, got {emb.dtype}, writeable={emb.flags.writeable}")
+
+    chunks = [emb[i : i + CHUNK_SIZE] for i in range(0, len(emb), CHUNK_SIZE)]
+    if len(chunks) <= 1:
+        for c in chunks:
+            _normalize_chunk(c)
+        return emb
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        list(executor.map(_normalize_chunk, chunks))
+    return emb
+
+
+def normalize(emb: np.ndarray, workers: int | None = None) -> np.ndarray:
+    """l2 normalize the rows of emb into a new float32 array"""
+    return normalize_inplace(np.array(emb, dtype=np.float32), workers)
@@ -0,0 +1,110 @@
+"""
+Usage:
+    >>> from xxx.recall import calc_recall_stats
+    >>> results = [db.search_embedding(query, k=100) for query in test_emb]
+    >>> stats = calc_recall_stats(results, np.stack(gt_df["neighbors_id"]), k=100)
+    >>> stats["recall"], stats["recall_at_10"], stats["ndcg"], stats["mrr"]
+"""
+
+import logging
+from typing import Sequence
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+RECALL_AT = (1, 10, 100)
+CHUNK_SIZE = 65_536  # queries matched at a time
+
+
+def to_matrix(rows: Sequence[Sequence] | np.ndarray, k: int, fill=-1, dtype=np.int64) -> np.ndarray:
+    """the first k values of every row in a (len(rows), k) matrix, rows shorter than k are padded with fill"""
+    if isinstance(rows, np.ndarray) and rows.ndim == 2:
+        m = rows[:, :k].astype(dtype, copy=False)
+        if m.shape[1] == k:
+            return m
+        return np.pad(m, ((0, 0), (0, k - m.shape[1])), constant_values=fill)
+
+    m = np.full((len(rows), k), fill, dtype=dtype)
+    for i, row in enumerate(rows):
+        row = np.asarray(row)[:k]
+        m[i, : len(row)] = row
+    return m
+
+
+def hits(results: np.ndarray, ground_truth: np.ndarray) -> np.ndarray:
+    """Whether results[i, j] is one of ground_truth[i], a bool matrix of the shape of results.
+
+    Ids are non-negative, the negative padding never hits. Every row of the ground truth is sorted,
+    and offset by its row number so that the whole matrix is one sorted array searched at once,
+    O(nq * k * log(k)) instead of O(nq * k²) of the membership test of every result.
+    """
+    out = np.zeros(results.shape, dtype=bool)
+    if results.size == 0 or ground_truth.size == 0:
+        return out
+
+    # ids are shifted by 1 to move the padding to 0, span is the range of the ids of a row
+    span = int(max(results.max(), ground_truth.max())) + 2
+    chunk = max(min(CHUNK_SIZE, np.iinfo(np.int64).max // span), 1)
+    for start in range(0, len(results), chunk):
+        res, gt = results[start : start + chunk], ground_truth[start : start + chunk]
+        offsets = np.arange(len(res), dtype=np.int64)[:, np.newaxis] * span
+        gt_keys = (np.sort(np.maximum(gt, -1), axis=1) + 1 + offsets).ravel()
+        res_keys = np.maximum(res, -1) + 1 + offsets
+        pos = np.minimum(np.searchsorted(gt_keys, res_keys), len(gt_keys) - 1)
+        out[start : start + chunk] = (gt_keys[pos] == res_keys) & (res >= 0)
+    return out
+
+
+def calc_recall_stats(
+    results: Sequence[Sequence[int]] | np.ndarray,
+    ground_truth: Sequence[Sequence[int]] | np.ndarray,
+    k: int = 100,
+    result_distances: Sequence[Sequence[float]] | np.ndarray | None = None,
+    gt_distances: Sequence[Sequence[float]] | np.ndarray | None = None,
+) -> dict[str, float]:
+    """Recall metrics of the top-k results of nq queries against their ground truth neighbors, closest first.
+
+    - recall: |results[:k] ∩ ground_truth[:k]| / k, averaged over the queries.
+    - recall_at_{1, 10, 100}: the recall of the first 1, 10, 100 results, for those not above k.
+    - ndcg: nDCG@k with the ground truth top-k as the relevant results.
+    - mrr: mean of 1 / rank of the nearest neighbor in the results, 0 if it's missing.
+    - distance_ratio: sum of the distances of the results / sum of the top-k ground truth distances,
+      averaged over the queries, 1 is exact. Only if both result_distances and gt_distances are given.
+
+    Args:
+        results: ids of shape (nq, k), or nq lists of ids, shorter if a query found less than k.
+        ground_truth: ids of shape (nq, >= k), or nq lists of ids.
+
+    Returns:
+        dict: the metrics rounded to 4 decimal places, an empty dict if there are no queries.
+    """
+    nq = len(results)
+    if nq == 0:
+        return {}
+    res, gt = to_matrix(results, k), to_matrix(ground_truth, k)
+    hit = hits(res, gt)
+
+    stats = {"recall": hit.sum(axis=1).mean() / k}
+    for at in RECALL_AT:
+        if at <= k:
+            stats[f"recall_at_{at}"] = hits(res[:, :at], gt[:, :at]).sum(axis=1).mean() / at
+
+    discounts = 1 / np.log2(np.arange(k) + 2)
+    dcg = hit @ discounts
+    num_relevant = (gt >= 0).sum(axis=1)
+    idcg = np.concatenate(([0.0], np.cumsum(discounts)))[num_relevant]
+    stats["ndcg"] = np.divide(dcg, idcg, out=np.zeros(nq), where=idcg > 0).mean()
+
+    nearest = (res == gt[:, :1]) & (gt[:, :1] >= 0)
+    found = nearest.any(axis=1)
+    stats["mrr"] = np.where(found, 1 / (nearest.argmax(axis=1) + 1), 0.0).mean()
+
+    if result_distances is not None and gt_distances is not None:
+        res_sum = np.nansum(to_matrix(result_distances, k, np.nan, np.float64), axis=1)
+        gt_sum = np.nansum(to_matrix(gt_distances, k, np.nan, np.float64), axis=1)
+        valid = gt_sum > 0
+        if valid.any():
+            stats["distance_ratio"] = (res_sum[valid] / gt_sum[valid]).mean()
+
+    return {name: round(float(v), 4) for name, v in stats.items()}
@@ -3,10 +3,14 @@ from .mp_runner import (
 )
 
 from .serial_runner import SerialSearchRunner, SerialInsertRunner
+from .mp_insert_runner import MultiProcessingInsertRunner
+from .capacity_runner import CapacityInsertRunner
 
 
 __all__ = [
     'MultiProcessingSearchRunner',
     'SerialSearchRunner',
     'SerialInsertRunner',
+    'MultiProcessingInsertRunner',
+    'CapacityInsertRunner',
 ]
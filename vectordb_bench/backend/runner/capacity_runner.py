@@ -0,0 +1,262 @@
+import time
+import queue
+import logging
+import traceback
+import concurrent
+import multiprocessing as mp
+from collections import deque
+
+import numpy as np
+
+from ..clients import api
+from ...models import LoadTimeoutError
+from .. import utils, preprocess
+from ... import config
+from ..dataset import DatasetManager
+from .serial_runner import SerialInsertRunner
+from .retry import RetryStats, insert_with_retry
+
+
+log = logging.getLogger(__name__)
+
+
+class EndlessBatches:
+    """Stream a float32 block of embeddings over and over in batches of (ids, embeddings).
+
+    The embeddings are views of the block, the ids of the n-th pass are the row numbers plus n * len(block),
+    written into a buffer reused by every batch, so that nothing is allocated once streaming.
+    With num_workers > 1, the worker-th of every num_workers batches is streamed, the ids of the workers never overlap.
+
+    Don't keep a batch after the next one is taken, its ids are overwritten.
+    """
+
+    def __init__(self, block: np.ndarray, batch_size: int, worker: int = 0, num_workers: int = 1):
+        num_batches = -(-len(block) // batch_size)
+        if not 0 <= worker < num_workers <= num_batches:
+            raise ValueError(f"Invalid worker {worker} of {num_workers} for {num_batches} batches")
+        self._block = block
+        self._starts = range(worker * batch_size, len(block), num_workers * batch_size)
+        self._batch_size = batch_size
+        self._rows = np.arange(len(block), dtype=np.int64)
+        self._ids = np.empty(batch_size, dtype=np.int64)
+
+    def __iter__(self):
+        id_offset = 0
+        while True:
+            for start in self._starts:
+                end = min(start + self._batch_size, len(self._block))
+                ids = self._ids[: end - start]
+                np.add(self._rows[start:end], id_offset, out=ids)
+                yield ids, self._block[start:end]
+            id_offset += len(self._block)
+
+
+class CapacityCurve:
+    """Insert throughput, and the memory reported by the database if any, sampled every `sample_rows` rows
+    of a capacity case, and the detection of the throughput collapse.
+
+    The throughput collapses once the rows/s of the last `collapse_window` seconds stay below
+    collapse_ratio * the initial throughput, the max of the first BASELINE_SAMPLES samples.
+    The clock restarts on every update until the first rows are inserted, the start up of the writers isn't counted.
+
+    Args:
+        sample_rows(int): rows between two samples.
+        collapse_ratio(float): 0 disables the detection.
+        collapse_window(float): seconds.
+    """
+    BASELINE_SAMPLES = 3
+
+    def __init__(
+        self,
+        sample_rows: int = config.CAPACITY_SAMPLE_ROWS,
+        collapse_ratio: float = config.CAPACITY_COLLAPSE_RATIO,
+        collapse_window: float = config.CAPACITY_COLLAPSE_WINDOW,
+        start: float | None = None,
+    ):
+        self.sample_rows = sample_rows
+        self.collapse_ratio = collapse_ratio
+        self.collapse_window = collapse_window
+        self.start = time.perf_counter() if start is None else start
+        self.rows, self.elapsed, self.rows_per_sec, self.mem = [], [], [], []
+        self._last = (self.start, 0)
+        self._progress = deque([(self.start, 0)])
+
+    @property
+    def baseline(self) -> float | None:
+        if len(self.rows_per_sec) < self.BASELINE_SAMPLES:
+            return None
+        return max(self.rows_per_sec[: self.BASELINE_SAMPLES])
+
+    def update(self, rows: int, now: float) -> bool:
+        """record the total rows inserted at `now`
+
+        Returns:
+            bool: whether it's time to take a sample, see sample()
+        """
+        if rows == 0:
+            self.start, self._last, self._progress = now, (now, 0), deque()
+        self._progress.append((now, rows))
+        while len(self._progress) > 1 and self._progress[1][0] <= now - self.collapse_window:
+            self._progress.popleft()
+        return rows - self._last[1] >= self.sample_rows
+
+    def sample(self, rows: int, now: float, mem: int | None = None):
+        last_t, last_rows = self._last
+        self.rows.append(rows)
+        self.elapsed.append(round(now - self.start, 4))
+        self.rows_per_sec.append(round((rows - last_rows) / max(now - last_t, 1e-9), 4))
+        self.mem.append(mem)
+        self._last = (now, rows)
+
+    def collapsed(self, now: float) -> bool:
+        """whether the throughput of the last collapse_window seconds is below collapse_ratio of the baseline"""
+        baseline = self.baseline
+        if self.collapse_ratio <= 0 or baseline is None:
+            return False
+        t, rows = self._progress[0]
+        if now - t < self.collapse_window:
+            return False
+        rate = (self._progress[-1][1] - rows) / (now - t)
+        return rate < self.collapse_ratio * baseline
+
+    def to_dict(self) -> dict:
+        """{"rows": [...], "elapsed": [...], "rows_per_sec": [...], "mem": [...]}, one value per sample,
+        elapsed in seconds since the load started, mem in bytes or None"""
+        if not self.rows:
+            return {}
+        return {"rows": self.rows, "elapsed": self.elapsed, "rows_per_sec": self.rows_per_sec, "mem": self.mem}
+
+
+class CapacityInsertRunner(SerialInsertRunner):
+    """Capacity case runner, `workers` writer processes insert the train data over and over
+    until the database fails to insert, which is the capacity of the database, or the timeout.
+
+    Every writer streams one float32 block of the train data, see EndlessBatches.
+    The throughput is sampled into `curve` while loading, the load stops early once it collapses, see CapacityCurve.
+
+    Args:
+        workers(int): number of writer processes, default to config.NUM_INSERT_WORKERS
+    """
+    def __init__(
+        self,
+        db: api.VectorDB,
+        dataset: DatasetManager,
+        normalize: bool,
+        timeout: float | None = None,
+        workers: int = config.NUM_INSERT_WORKERS,
+    ):
+        super().__init__(db, dataset, normalize, timeout)
+        self.workers = self.num_writers(db, workers)
+        self.curve = CapacityCurve()
+
+    def block(self) -> np.ndarray:
+        block = self.dataset.train_block()
+        if self.normalize and not self.dataset.normalized:
+            block = preprocess.normalize(block)
+        return block
+
+    def write(self, worker: int, num_workers: int, stop, progress, deadline: float) -> tuple[int, RetryStats, str | None]:
+        """insert the batches of `worker` until the insertion fails, `stop` is set or the wall clock deadline,
+        the count of every batch inserted is put into the `progress` queue
+
+        Returns:
+            tuple[int, RetryStats, str | None]: inserted count, retries, and the error that stopped the writer
+        """
+        count, retry = 0, RetryStats()
+        batches = EndlessBatches(self.block(), config.NUM_PER_BATCH, worker, num_workers)
+        try:
+            with self.db.init():
+                for data in batches:
+                    if stop.is_set() or time.time() > deadline:
+                        return count, retry, None
+                    embeddings, metadata = self.encode(data)
+                    insert_count = insert_with_retry(self.db, embeddings, metadata, self.retry_policy, retry)
+                    count += insert_count
+                    progress.put(insert_count)
+                    if count % 100_000 == 0:
+                        log.info(f"({mp.current_process().name:16}) Loaded {count} embeddings into VectorDB")
+        except Exception as e:
+            log.info(f"({mp.current_process().name:16}) Failed to insert after {count} embeddings, err={e}")
+            traceback.print_exc()
+            stop.set()
+            return count, retry, str(e)
+
+    def _monitor(self, futures: list[concurrent.futures.Future], stop, progress) -> bool:
+        """sample the progress of the writers into the curve until they're done
+
+        Returns:
+            bool: whether the writers are stopped for the collapse of the throughput
+        """
+        rows, mem_supported = 0, True
+
+        def sample(now: float):
+            nonlocal mem_supported
+            mem = None
+            if mem_supported:
+                try:
+                    mem = self.db.mem_usage()
+                except NotImplementedError:
+                    mem_supported = False
+                except Exception as e:
+                    log.warning(f"Failed to get the memory usage of the database, err={e}")
+            self.curve.sample(rows, now, mem)
+            log.info(f"Capacity case loaded {rows} embeddings, {self.curve.rows_per_sec[-1]} rows/s, mem={mem}")
+
+        with self.db.init():
+            while True:
+                done, _ = concurrent.futures.wait(futures, timeout=1)
+                try:
+                    while True:
+                        rows += progress.get_nowait()
+                except queue.Empty:
+                    pass
+
+                now = time.perf_counter()
+                if self.curve.update(rows, now):
+                    sample(now)
+                if len(done) == len(futures):
+                    if not self.curve.rows or self.curve.rows[-1] != rows:
+                        sample(now)
+                    return False
+                if self.curve.collapsed(now):
+                    stop.set()
+                    return True
+
+    def run_endlessness(self) -> int:
+        """run forever util DB raises exception or crash"""
+        with self.db.init():
+            self.db.ready_to_load()
+
+        num_batches = -(-self.dataset.data.size // config.NUM_PER_BATCH)
+        workers = min(self.workers, num_batches)
+        deadline = time.time() + (self.timeout if self.timeout is not None else float("inf"))
+        with mp.Manager() as m:
+            stop, progress = m.Event(), m.Queue()
+            with concurrent.futures.ProcessPoolExecutor(mp_context=mp.get_context("spawn"), max_workers=workers) as executor:
+                self.curve = CapacityCurve(
+                    config.CAPACITY_SAMPLE_ROWS, config.CAPACITY_COLLAPSE_RATIO, config.CAPACITY_COLLAPSE_WINDOW,
+                )
+                futures = [executor.submit(self.write, w, workers, stop, progress, deadline) for w in range(workers)]
+                collapsed = self._monitor(futures, stop, progress)
+                results = [f.result() for f in futures]
+
+        max_load_count = sum(c for c, _, _ in results)
+        for _, retry, _ in results:
+            self.load_stats.retry.extend(retry)
+        errors = [e for _, _, e in results if e is not None]
+        if collapsed:
+            log.info(
+                f"Capacity case load throughput collapsed below {self.curve.collapse_ratio} of {self.curve.baseline} rows/s "
+                f"for {self.curve.collapse_window}s, insertion counts={utils.numerize(max_load_count)}, {max_load_count}"
+            )
+            return max_load_count
+        if errors:
+            log.info(
+                f"Capacity case load reach limit, insertion counts={utils.numerize(max_load_count)}, {max_load_count}, "
+                f"writers={workers}, err={errors[0]}"
+            )
+            return max_load_count
+
+        msg = f"capacity case load timeout in {self.timeout}s"
+        log.info(msg)
+        raise LoadTimeoutError(msg)
@@ -0,0 +1,117 @@
+"""
+Usage:
+    >>> checkpoint = LoadCheckpoint.of(config.LOAD_CHECKPOINT_DIR, key)
+    >>> checkpoint.reset(num_workers=4, use_cache=False)
+    >>> checkpoint.ack(worker=0, batches=1, rows=10_000)
+"""
+
+import json
+import time
+import shutil
+import hashlib
+import logging
+import pathlib
+
+from ... import config
+
+log = logging.getLogger(__name__)
+
+
+class LoadCheckpoint:
+    """Progress of the load phase of a performance case, persisted in `path`:
+
+    - load.json: {"num_workers", "num_per_batch", "use_cache", "duration", "started"}, the batches are cut
+      differently from the vector cache and from the train files, duration is the seconds spent inserting
+      by the previous interrupted phases, started the wall clock time the current phase started.
+    - worker_{i}.json: {"batches", "rows", "elapsed"} acknowledged by writer i, batches of its shard,
+      and the seconds since the current phase started.
+
+    Every file is replaced atomically, a checkpoint survives the process being killed at any time.
+    """
+
+    def __init__(self, path: pathlib.Path):
+        self.path = pathlib.Path(path)
+
+    @classmethod
+    def of(cls, root: pathlib.Path, key: str) -> "LoadCheckpoint":
+        """checkpoint of a case in root/{sha1 of the key}, key identifies the db, its configs and the dataset"""
+        return cls(pathlib.Path(root, hashlib.sha1(key.encode()).hexdigest()))
+
+    @property
+    def meta_path(self) -> pathlib.Path:
+        return self.path.joinpath("load.json")
+
+    def _worker_path(self, worker: int) -> pathlib.Path:
+        return self.path.joinpath(f"worker_{worker}.json")
+
+    @staticmethod
+    def _read(p: pathlib.Path) -> dict:
+        if not p.exists():
+            return {}
+        with open(p) as f:
+            return json.load(f)
+
+    @staticmethod
+    def _write(p: pathlib.Path, d: dict):
+        tmp = p.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(d, f)
+        tmp.replace(p)
+
+    def meta(self) -> dict:
+        return self._read(self.meta_path)
+
+    def reset(self, num_workers: int, use_cache: bool):
+        """start a new load from the first row"""
+        self.clear()
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._write(self.meta_path, {
+            "num_workers": num_workers,
+            "num_per_batch": config.NUM_PER_BATCH,
+            "use_cache": use_cache,
+            "duration": 0.0,
+            "started": time.time(),
+        })
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def resumable(self, num_workers: int, use_cache: bool) -> bool:
+        """whether a load was interrupted with the same sharding and batches of the train data"""
+        meta = self.meta()
+        return (
+            meta.get("num_workers") == num_workers
+            and meta.get("num_per_batch") == config.NUM_PER_BATCH
+            and meta.get("use_cache") == use_cache
+        )
+
+    def progress(self, worker: int) -> dict:
+        return {"batches": 0, "rows": 0, "elapsed": 0.0, **self._read(self._worker_path(worker))}
+
+    def rows(self) -> int:
+        """rows acknowledged by all the writers"""
+        return sum(self.progress(w)["rows"] for w in range(self.meta().get("num_workers", 0)))
+
+    @property
+    def duration(self) -> float:
+        return self.meta().get("duration", 0.0)
+
+    @property
+    def started(self) -> float:
+        return self.meta().get("started", time.time())
+
+    def resume(self):
+        """start the next phase, the time spent by the interrupted one until its last acknowledged batch
+        is added to duration, the time after it is lost along with the batches not acknowledged."""
+        meta = self.meta()
+        elapsed = [self.progress(w)["elapsed"] for w in range(meta["num_workers"])]
+        meta["duration"] = meta.get("duration", 0.0) + max(elapsed, default=0.0)
+        meta["started"] = time.time()
+        self._write(self.meta_path, meta)
+        for w in range(meta["num_workers"]):
+            if self._worker_path(w).exists():
+                self._write(self._worker_path(w), {**self.progress(w), "elapsed": 0.0})
+
+    def ack(self, worker: int, batches: int, rows: int, started: float):
+        """record the batches and rows of the shard of `worker` inserted so far"""
+        self._write(self._worker_path(worker), {"batches": batches, "rows": rows, "elapsed": time.time() - started})
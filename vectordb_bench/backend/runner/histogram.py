@@ -0,0 +1,83 @@
+import math
+import logging
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+LATENCY_PERCENTILES = {"p50": 50, "p95": 95, "p99": 99, "p999": 99.9}
+
+
+class LatencyHistogram:
+    """HDR-style histogram of latencies in log buckets, each one `precision` wider than the previous one,
+    so that every percentile is within `precision` of the exact one whatever the latency.
+
+    The counts of all the buckets, about 2k int64 with the defaults, are what's pickled back from a
+    search process, and the histograms of several processes are merged by adding their counts.
+
+    Args:
+        min_value(float): seconds, latencies below are counted in the first bucket.
+        max_value(float): seconds, latencies above are counted in the last bucket.
+        precision(float): relative error of the percentiles.
+    """
+
+    def __init__(self, min_value: float = 1e-6, max_value: float = 100.0, precision: float = 0.01):
+        self.min_value = min_value
+        self.max_value = max_value
+        self.precision = precision
+        self._log_base = math.log1p(precision)
+        num_buckets = math.ceil(math.log(max_value / min_value) / self._log_base) + 2
+        self.counts = np.zeros(num_buckets, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def _bucket(self, latency: float) -> int:
+        """bucket i > 0 holds the latencies in (min_value * (1 + precision)**(i-1), min_value * (1 + precision)**i]"""
+        if latency <= self.min_value:
+            return 0
+        return min(int(math.log(latency / self.min_value) / self._log_base) + 1, len(self.counts) - 1)
+
+    def record(self, latency: float):
+        """count one latency in seconds"""
+        self.counts[self._bucket(latency)] += 1
+        self.count += 1
+        self.total += latency
+        self.min = min(self.min, latency)
+        self.max = max(self.max, latency)
+
+    def add(self, other: "LatencyHistogram"):
+        if (other.min_value, other.max_value, other.precision) != (self.min_value, self.max_value, self.precision):
+            raise ValueError("Can't merge latency histograms of different buckets")
+        self.counts += other.counts
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @classmethod
+    def merge(cls, hists: list["LatencyHistogram"]) -> "LatencyHistogram":
+        """merge the histograms of several processes"""
+        merged = cls(hists[0].min_value, hists[0].max_value, hists[0].precision) if hists else cls()
+        for h in hists:
+            merged.add(h)
+        return merged
+
+    def percentile(self, p: float) -> float:
+        """latency in seconds below which p% of the latencies are, the upper bound of its bucket,
+        0 if nothing is recorded"""
+        if self.count == 0:
+            return 0.0
+        rank = max(math.ceil(p / 100 * self.count), 1)
+        bucket = int(np.searchsorted(np.cumsum(self.counts), rank))
+        upper = self.min_value * (1 + self.precision) ** bucket
+        return min(max(upper, self.min), self.max)
+
+    def percentiles(self) -> dict[str, float]:
+        """{p50, p95, p99, p999} in seconds"""
+        return {name: round(self.percentile(p), 6) for name, p in LATENCY_PERCENTILES.items()}
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
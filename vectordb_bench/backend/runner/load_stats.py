@@ -0,0 +1,82 @@
+import math
+import time
+import logging
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from .pipeline import StageStats, merge_stage_stats
+from .retry import RetryStats
+
+log = logging.getLogger(__name__)
+
+MAX_TIMELINE_POINTS = 200
+
+
+@dataclass
+class InsertTimeline:
+    """latency and rows of every insert_embeddings call, with the wall clock time it returned,
+    so that the timelines of several writer processes can be merged"""
+    ends: list[float] = field(default_factory=list)
+    latencies: list[float] = field(default_factory=list)
+    rows: list[int] = field(default_factory=list)
+
+    def add(self, latency: float, rows: int):
+        self.ends.append(time.time())
+        self.latencies.append(latency)
+        self.rows.append(rows)
+
+    def extend(self, other: "InsertTimeline"):
+        self.ends.extend(other.ends)
+        self.latencies.extend(other.latencies)
+        self.rows.extend(other.rows)
+
+    def percentiles(self) -> tuple[float, float, float]:
+        """Returns:
+            tuple[float, float, float]: p50, p99 and max latency of insert_embeddings in seconds.
+        """
+        if not self.latencies:
+            return 0.0, 0.0, 0.0
+        p50, p99 = np.percentile(self.latencies, [50, 99])
+        return round(float(p50), 4), round(float(p99), 4), round(max(self.latencies), 4)
+
+    def series(self, max_points: int = MAX_TIMELINE_POINTS) -> dict:
+        """Compact time series of the load, in buckets of `interval` seconds since the first insert started.
+
+        Returns:
+            dict: {"interval": seconds, "rows_per_sec": [...], "latency_p99": [...]},
+                one value of rows/s and p99 latency in seconds per bucket.
+        """
+        if not self.ends:
+            return {}
+        ends, latencies, rows = np.array(self.ends), np.array(self.latencies), np.array(self.rows)
+        start = (ends - latencies).min()
+        duration = ends.max() - start
+        interval = max(math.ceil(duration / max_points), 1)
+        num_buckets = max(math.ceil(duration / interval), 1)
+        buckets = np.minimum(((ends - start) // interval).astype(int), num_buckets - 1)
+
+        rows_per_sec, latency_p99 = [], []
+        for b in range(num_buckets):
+            in_bucket = buckets == b
+            seconds = min(interval, duration - b * interval) or interval
+            rows_per_sec.append(round(float(rows[in_bucket].sum() / seconds), 4))
+            latency_p99.append(round(float(np.percentile(latencies[in_bucket], 99)), 4) if in_bucket.any() else 0.0)
+        return {"interval": interval, "rows_per_sec": rows_per_sec, "latency_p99": latency_p99}
+
+
+@dataclass
+class LoadStats:
+    """what's measured while loading the train data besides the count and duration"""
+    stages: list[StageStats] = field(default_factory=list)
+    timeline: InsertTimeline = field(default_factory=InsertTimeline)
+    retry: RetryStats = field(default_factory=RetryStats)
+
+    @classmethod
+    def merge(cls, stats: list["LoadStats"]) -> "LoadStats":
+        """merge the stats of several writers"""
+        merged = cls(stages=merge_stage_stats([s.stages for s in stats]))
+        for s in stats:
+            merged.timeline.extend(s.timeline)
+            merged.retry.extend(s.retry)
+        return merged
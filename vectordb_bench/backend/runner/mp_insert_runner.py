@@ -0,0 +1,111 @@
+import time
+import logging
+import concurrent
+import multiprocessing as mp
+import psutil
+
+from ..clients import api
+from ...models import PerformanceTimeoutError
+from .. import utils
+from ... import config
+from ..dataset import DatasetManager
+from .serial_runner import SerialInsertRunner
+from .load_stats import LoadStats
+from .checkpoint import LoadCheckpoint
+
+
+log = logging.getLogger(__name__)
+
+
+class MultiProcessingInsertRunner(SerialInsertRunner):
+    """ multiprocessing insert runner, the train data is sharded over `workers` writer processes,
+    each of them inserts its shard through its own db.init().
+
+    Writers never send last_batch, it's sent once in an empty insert_embeddings after
+    all the writers finish, so that post-insert hooks like the flush of Milvus run exactly once.
+    A single writer sends it itself, clients without parallel_insert keep the inserted data
+    in the memory of the writer process.
+
+    Args:
+        workers(int): number of writer processes, default to config.NUM_INSERT_WORKERS
+    """
+    def __init__(
+        self,
+        db: api.VectorDB,
+        dataset: DatasetManager,
+        normalize: bool,
+        timeout: float | None = None,
+        workers: int = config.NUM_INSERT_WORKERS,
+        checkpoint: LoadCheckpoint | None = None,
+    ):
+        super().__init__(db, dataset, normalize, timeout, checkpoint)
+        self.workers = self.num_writers(db, workers)
+
+    def write(self, worker: int) -> tuple[int, float, LoadStats]:
+        """insert the shard of the worker
+
+        Returns:
+            tuple[int, float, LoadStats]: inserted count, duration and load stats of this writer
+        """
+        (count, stats), dur = utils.time_it(self.task)(worker, self.workers, send_last_batch=self.workers == 1)
+        log.info(
+            f"({mp.current_process().name:16}) writer {worker}/{self.workers} inserted {count} embeddings, "
+            f"dur={round(dur, 4)}s, throughput={round(count / dur, 4)} rows/s"
+        )
+        return count, dur, stats
+
+    def post_insert(self):
+        with self.db.init():
+            _, error = self.db.insert_embeddings(embeddings=[], metadata=[], last_batch=True)
+            if error is not None:
+                raise error
+
+    @utils.time_it
+    def _insert_all_batches(self) -> tuple[int, LoadStats]:
+        """Performance case only"""
+        deadline = None if self.timeout is None else time.perf_counter() + self.timeout
+        with concurrent.futures.ProcessPoolExecutor(mp_context=mp.get_context('spawn'), max_workers=self.workers) as executor:
+            try:
+                start = time.perf_counter()
+                futures = [executor.submit(self.write, worker) for worker in range(self.workers)]
+                done, not_done = concurrent.futures.wait(
+                    futures, timeout=self.timeout, return_when=concurrent.futures.FIRST_EXCEPTION,
+                )
+                for f in done:
+                    if f.exception() is not None:
+                        raise f.exception()
+                if not_done:
+                    raise TimeoutError
+                dur = time.perf_counter() - start
+
+                results = [f.result() for f in futures]
+                count = sum(c for c, _, _ in results)
+                stats = LoadStats.merge([st for _, _, st in results])
+                log.info(
+                    f"{self.workers} writers inserted {count} embeddings, dur={round(dur, 4)}s, "
+                    f"throughput={round(count / dur, 4)} rows/s, "
+                    f"throughput per writer={[round(c / d, 4) for c, d, _ in results]} rows/s"
+                )
+
+                if self.workers > 1:
+                    remaining = None if deadline is None else max(deadline - time.perf_counter(), 0)
+                    executor.submit(self.post_insert).result(timeout=remaining)
+            except TimeoutError as e:
+                msg = f"VectorDB load dataset timeout in {self.timeout}"
+                log.warning(msg)
+                self._kill(executor)
+                raise PerformanceTimeoutError(msg) from e
+            except Exception as e:
+                log.warning(f"VectorDB load dataset error: {e}")
+                self._kill(executor)
+                raise e from e
+            else:
+                return count, stats
+
+    @staticmethod
+    def _kill(executor: concurrent.futures.ProcessPoolExecutor):
+        for pid, _ in executor._processes.items():
+            try:
+                psutil.Process(pid).kill()
+            except psutil.NoSuchProcess:
+                pass
@@ -6,6 +6,8 @@ import logging
 from typing import Iterable
 from ..clients import api
 from ... import config
+from .histogram import LatencyHistogram
+from .retry import RetryPolicy, classify
 
 
 NUM_PER_BATCH = config.NUM_PER_BATCH
@@ -19,6 +21,14 @@ class MultiProcessingSearchRunner:
         k(int): search topk, default to 100
         concurrency(Iterable): concurrencies, default [1, 5, 10, 15, 20, 25, 30, 35]
         duration(int): duration for each concurency, default to 30s
+        max_error_ratio(float): failed / all the searches of a concurrency above which the remaining
+            concurrencies are not run, default to config.SEARCH_MAX_ERROR_RATIO
+
+    Attributes:
+        conc_results(list[dict]): one entry per concurrency run, {"concurrency", "qps", "errors", "duration",
+            "latency_p50", "latency_p95", "latency_p99", "latency_p999"}, qps of the successful searches,
+            the count of the failed ones, the actual duration in seconds, and the latencies in seconds
+            of the successful search_embedding calls of all the processes.
     """
     def __init__(
         self,
@@ -28,17 +38,31 @@ class MultiProcessingSearchRunner:
         filters: dict | None = None,
         concurrencies: Iterable[int] = (1, 5, 10, 15, 20, 25, 30, 35),
         duration: int = 30,
+        max_error_ratio: float = config.SEARCH_MAX_ERROR_RATIO,
     ):
         self.db = db
         self.k = k
         self.filters = filters
         self.concurrencies = concurrencies
         self.duration = duration
+        self.max_error_ratio = max_error_ratio
+        self.retry_policy = RetryPolicy(base_delay=config.SEARCH_RETRY_BASE_DELAY, max_delay=config.SEARCH_RETRY_MAX_DELAY)
 
         self.test_data = test_data
+        self.conc_results = []
         log.debug(f"test dataset columns: {len(test_data)}")
 
-    def search(self, test_data: list[list[float]], q: mp.Queue, cond: mp.Condition) -> tuple[int, float]:
+    def search(self, test_data: list[list[float]], q: mp.Queue, cond: mp.Condition) -> tuple[int, int, float, LatencyHistogram]:
+        """search the test data over and over for `duration` seconds, a failed search is counted and skipped
+        after a backoff, growing while the searches keep failing
+
+        Returns:
+            tuple[int, int, float, LatencyHistogram]: count of the successful searches, count of the failed ones,
+                actual duration and the latencies of the successful searches.
+
+        Raises:
+            the last error if every search failed.
+        """
         # sync all process
         q.put(1)
         with cond:
@@ -48,7 +72,8 @@ class MultiProcessingSearchRunner:
             num, idx = len(test_data), 0
 
             start_time = time.perf_counter()
-            count = 0
+            count, errors, error, consecutive = 0, 0, None, 0
+            hist = LatencyHistogram()
             while time.perf_counter() < start_time + self.duration:
                 s = time.perf_counter()
                 try:
@@ -57,25 +82,30 @@ class MultiProcessingSearchRunner:
                         self.k,
                         self.filters,
                     )
+                    hist.record(time.perf_counter() - s)
+                    count, consecutive = count + 1, 0
+                    if count % 500 == 0:
+                        log.debug(f"({mp.current_process().name:16}) search_count: {count}, latest_latency={time.perf_counter()-s}")
                 except Exception as e:
-                    log.warning(f"VectorDB search_embedding error: {e}")
-                    traceback.print_exc(chain=True)
-                    raise e from None
+                    if errors == 0:
+                        log.warning(f"VectorDB search_embedding error: {e}")
+                        traceback.print_exc(chain=True)
+                    errors, error = errors + 1, e
+                    time.sleep(self.retry_policy.delay(consecutive, classify(e)))
+                    consecutive += 1
 
-                count += 1
                 # loop through the test data
                 idx = idx + 1 if idx < num - 1 else 0
 
-                if count % 500 == 0:
-                    log.debug(f"({mp.current_process().name:16}) search_count: {count}, latest_latency={time.perf_counter()-s}")
-
         total_dur = round(time.perf_counter() - start_time, 4)
         log.info(
             f"{mp.current_process().name:16} search {self.duration}s: "
-            f"actual_dur={total_dur}s, count={count}, qps in this process: {round(count / total_dur, 4):3}"
+            f"actual_dur={total_dur}s, count={count}, errors={errors}, qps in this process: {round(count / total_dur, 4):3}"
          )
+        if count == 0 and error is not None:
+            raise error
 
-        return (count, total_dur)
+        return (count, errors, total_dur, hist)
 
     @staticmethod
     def get_mp_context():
@@ -85,6 +115,7 @@ class MultiProcessingSearchRunner:
 
     def _run_all_concurrencies_mem_efficient(self) -> float:
         max_qps = 0
+        self.conc_results = []
         try:
             for conc in self.concurrencies:
                 with mp.Manager() as m:
@@ -102,11 +133,30 @@ class MultiProcessingSearchRunner:
                             log.info(f"Syncing all process and start concurrency search, concurrency={conc}")
 
                         start = time.perf_counter()
-                        all_count = sum([r.result()[0] for r in future_iter])
+                        results = [r.result() for r in future_iter]
+                        all_count = sum([count for count, _, _, _ in results])
+                        all_errors = sum([errors for _, errors, _, _ in results])
                         cost = time.perf_counter() - start
 
                         qps = round(all_count / cost, 4)
-                        log.info(f"End search in concurrency {conc}: dur={cost}s, total_count={all_count}, qps={qps}")
+                        latency = LatencyHistogram.merge([hist for _, _, _, hist in results]).percentiles()
+                        self.conc_results.append({
+                            "concurrency": conc,
+                            "qps": qps,
+                            "errors": all_errors,
+                            "duration": round(cost, 4),
+                            **{f"latency_{name}": v for name, v in latency.items()},
+                        })
+                        log.info(
+                            f"End search in concurrency {conc}: dur={cost}s, total_count={all_count}, "
+                            f"errors={all_errors}, qps={qps}, "
+                            f"latency p50/p99/p999={latency['p50']}/{latency['p99']}/{latency['p999']}s"
+                        )
+                        if all_errors > self.max_error_ratio * (all_count + all_errors):
+                            raise RuntimeError(
+                                f"{all_errors} of {all_count + all_errors} searches failed in concurrency {conc}, "
+                                f"above max_error_ratio={self.max_error_ratio}"
+                            )
 
                 if qps > max_qps:
                     max_qps = qps
@@ -0,0 +1,179 @@
+"""
+Usage:
+    >>> pipeline = Pipeline(dataset.iter_numpy(), [("preprocess", f), ("encode", g), ("send", h)], depth=1)
+    >>> stats = pipeline.run()
+"""
+
+import time
+import queue
+import logging
+import threading
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Iterable
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class StageStats:
+    """Timings of one pipeline stage in seconds.
+
+    busy: processing items, idle: waiting for an item from the upstream stage,
+    stall: blocked on the full queue of the downstream stage.
+    A slow stage is busy most of the time, the others are idle before it and stall after it.
+    """
+    name: str
+    count: int = 0
+    busy: float = 0.0
+    idle: float = 0.0
+    stall: float = 0.0
+
+    def to_dict(self) -> dict:
+        d = asdict(self)
+        d.pop("name")
+        return {k: round(v, 4) for k, v in d.items()}
+
+
+def merge_stage_stats(stats: list[list[StageStats]]) -> list[StageStats]:
+    """sum the stats of the same stages from several pipelines"""
+    merged = {}
+    for pipeline_stats in stats:
+        for s in pipeline_stats:
+            m = merged.setdefault(s.name, StageStats(s.name))
+            m.count += s.count
+            m.busy += s.busy
+            m.idle += s.idle
+            m.stall += s.stall
+    return list(merged.values())
+
+
+class Pipeline:
+    """Run a source iterable and a chain of stages, each stage in its own thread,
+    connected by bounded queues of `depth` items, so that the stages overlap.
+
+    Items go through the stages in order, the output of the last stage is dropped.
+    The first exception raised by any stage stops the pipeline and is re-raised by run().
+    With depth 0 all the stages run one after another in the calling thread.
+
+    Args:
+        source(Iterable): the items, timed as the first stage named `source_name`.
+        stages(list[tuple[str, Callable]]): (name, function) of the stages.
+        depth(int): max items waiting between two stages.
+    """
+    _END = object()
+    _POLL_INTERVAL = 0.1
+
+    def __init__(
+        self,
+        source: Iterable,
+        stages: list[tuple[str, Callable[[Any], Any]]],
+        depth: int = 1,
+        source_name: str = "read",
+    ):
+        self.source = source
+        self.stages = stages
+        self.depth = depth
+        self.stats = [StageStats(source_name)] + [StageStats(name) for name, _ in stages]
+        self._stop = threading.Event()
+        self._error = None
+
+    def run(self) -> list[StageStats]:
+        if self.depth <= 0:
+            self._run_serial()
+        else:
+            self._run_threads()
+        return self.stats
+
+    def _run_serial(self):
+        it = iter(self.source)
+        while True:
+            s = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                break
+            self._count(self.stats[0], s)
+            for (_, fn), stats in zip(self.stages, self.stats[1:], strict=True):
+                s = time.perf_counter()
+                item = fn(item)
+                self._count(stats, s)
+
+    def _run_threads(self):
+        queues = [queue.Queue(maxsize=self.depth) for _ in self.stages]
+        threads = [threading.Thread(target=self._read, args=(queues[0],), daemon=True)]
+        for i, (_, fn) in enumerate(self.stages):
+            outq = queues[i + 1] if i + 1 < len(queues) else None
+            threads.append(threading.Thread(target=self._work, args=(self.stats[i + 1], fn, queues[i], outq), daemon=True))
+
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if self._error is not None:
+            raise self._error
+
+    @staticmethod
+    def _count(stats: StageStats, start: float):
+        stats.busy += time.perf_counter() - start
+        stats.count += 1
+
+    def _fail(self, e: BaseException):
+        if self._error is None:
+            self._error = e
+        self._stop.set()
+
+    def _put(self, q: queue.Queue, item, stats: StageStats):
+        s = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=self._POLL_INTERVAL)
+                break
+            except queue.Full:
+                continue
+        stats.stall += time.perf_counter() - s
+
+    def _get(self, q: queue.Queue, stats: StageStats):
+        s = time.perf_counter()
+        item = self._END
+        while not self._stop.is_set():
+            try:
+                item = q.get(timeout=self._POLL_INTERVAL)
+                break
+            except queue.Empty:
+                continue
+        stats.idle += time.perf_counter() - s
+        return item
+
+    def _read(self, outq: queue.Queue):
+        stats = self.stats[0]
+        try:
+            it = iter(self.source)
+            while not self._stop.is_set():
+                s = time.perf_counter()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    break
+                self._count(stats, s)
+                self._put(outq, item, stats)
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._put(outq, self._END, stats)
+
+    def _work(self, stats: StageStats, fn: Callable, inq: queue.Queue, outq: queue.Queue | None):
+        try:
+            while True:
+                item = self._get(inq, stats)
+                if item is self._END:
+                    break
+                s = time.perf_counter()
+                out = fn(item)
+                self._count(stats, s)
+                if outq is not None:
+                    self._put(outq, out, stats)
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            if outq is not None:
+                self._put(outq, self._END, stats)
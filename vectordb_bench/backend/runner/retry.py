@@ -0,0 +1,129 @@
+"""
+Usage:
+    >>> policy, stats = RetryPolicy(), RetryStats()
+    >>> count = insert_with_retry(db, embeddings, metadata, policy, stats, last_batch=False)
+"""
+
+import re
+import time
+import random
+import logging
+import multiprocessing as mp
+from enum import Enum
+from dataclasses import dataclass, field
+
+from ..clients import api
+from ... import config
+
+log = logging.getLogger(__name__)
+
+
+class ErrorKind(str, Enum):
+    RETRYABLE = "retryable"
+    THROTTLED = "throttled"
+    FATAL = "fatal"
+
+
+_THROTTLED = re.compile(r"rate limit|too many requests|throttl|slow down|\b429\b", re.IGNORECASE)
+# the database is full, retrying won't help, this is how capacity cases end
+_FATAL = re.compile(r"out of memory|memory limit|no space|disk quota|quota exceeded|capacity|limit exceeded", re.IGNORECASE)
+_FATAL_TYPES = (AssertionError, TypeError, ValueError, KeyError, AttributeError, NotImplementedError)
+
+
+def classify(e: Exception) -> ErrorKind:
+    """Classify an insert error by its HTTP status, type and message.
+
+    Unknown errors are retryable, as any error was retried before.
+    """
+    status = next((getattr(e, a) for a in ("status_code", "status") if isinstance(getattr(e, a, None), int)), None)
+    if status == 429 or _THROTTLED.search(str(e)):
+        return ErrorKind.THROTTLED
+    if _FATAL.search(str(e)) or isinstance(e, _FATAL_TYPES):
+        return ErrorKind.FATAL
+    if status is not None and 400 <= status < 500 and status not in (408, 409):
+        return ErrorKind.FATAL
+    return ErrorKind.RETRYABLE
+
+
+@dataclass
+class RetryPolicy:
+    """Exponential backoff with full jitter: the n-th retry waits uniform(0, min(max_delay, base_delay * 2**n)),
+    times throttle_multiplier if the database is throttling. Fatal errors are never retried.
+
+    Args:
+        max_tries(int): tries of one insert, including the first one.
+        base_delay(float): seconds.
+        max_delay(float): seconds.
+    """
+    max_tries: int = config.INSERT_MAX_TRIES
+    base_delay: float = config.RETRY_BASE_DELAY
+    max_delay: float = config.RETRY_MAX_DELAY
+    throttle_multiplier: float = 2.0
+
+    def delay(self, retry: int, kind: ErrorKind) -> float:
+        cap = min(self.max_delay, self.base_delay * 2 ** retry)
+        if kind == ErrorKind.THROTTLED:
+            cap = min(self.max_delay, cap * self.throttle_multiplier)
+        return random.uniform(0, cap)
+
+
+@dataclass
+class RetryStats:
+    """retries of the inserts by error kind, and the seconds spent in backoff"""
+    retries: int = 0
+    backoff: float = 0.0
+    errors: dict[str, int] = field(default_factory=dict)
+
+    def record(self, kind: ErrorKind, delay: float | None):
+        """count an error, delay is None if it's not retried"""
+        self.errors[kind.value] = self.errors.get(kind.value, 0) + 1
+        if delay is not None:
+            self.retries += 1
+            self.backoff += delay
+
+    def extend(self, other: "RetryStats"):
+        self.retries += other.retries
+        self.backoff += other.backoff
+        for k, v in other.errors.items():
+            self.errors[k] = self.errors.get(k, 0) + v
+
+
+def insert_with_retry(
+    db: api.VectorDB,
+    embeddings,
+    metadata,
+    policy: RetryPolicy,
+    stats: RetryStats,
+    **kwargs,
+) -> int:
+    """insert_embeddings, and after an error, insert the rows not inserted yet after a backoff.
+
+    Returns:
+        int: rows inserted, all of them unless an error is raised.
+
+    Raises:
+        the last error if it's fatal or the tries are exhausted.
+    """
+    done, tries = 0, 0
+    while True:
+        try:
+            count, error = db.insert_embeddings(embeddings=embeddings[done:], metadata=metadata[done:], **kwargs)
+        except Exception as e:
+            count, error = 0, e
+        done += count
+        tries += 1
+        if error is None:
+            return done
+
+        kind = classify(error)
+        if kind == ErrorKind.FATAL or tries >= policy.max_tries:
+            stats.record(kind, None)
+            raise error
+
+        delay = policy.delay(tries - 1, kind)
+        stats.record(kind, delay)
+        log.info(
+            f"({mp.current_process().name:16}) Failed to insert data, {kind.value} error: {error}, "
+            f"inserted {done}/{len(metadata)}, retry {tries}/{policy.max_tries - 1} in {round(delay, 2)}s"
+        )
+        time.sleep(delay)
@@ -1,112 +1,150 @@
 import time
 import logging
-import traceback
 import concurrent
 import multiprocessing as mp
-import math
 import psutil
 
 import numpy as np
 import pandas as pd
 
 from ..clients import api
-from ...metric import calc_recall
-from ...models import LoadTimeoutError, PerformanceTimeoutError
-from .. import utils
+from ...metric import calc_latency_stats
+from ..recall import calc_recall_stats
+from ...models import PerformanceTimeoutError
+from .. import utils, preprocess
 from ... import config
-from vectordb_bench.backend.dataset import DatasetManager
+from vectordb_bench.backend.dataset import DatasetManager, PrefetchDataSetIterator
+from .pipeline import Pipeline
+from .load_stats import LoadStats
+from .retry import RetryPolicy, insert_with_retry
+from .checkpoint import LoadCheckpoint
 
-NUM_PER_BATCH = config.NUM_PER_BATCH
-LOAD_MAX_TRY_COUNT = 10
-WAITTING_TIME = 60
 
 log = logging.getLogger(__name__)
 
+
 class SerialInsertRunner:
-    def __init__(self, db: api.VectorDB, dataset: DatasetManager, normalize: bool, timeout: float | None = None):
+    """Insert the train data, if a checkpoint is given, the batches acknowledged are recorded in it
+    and the batches acknowledged by an interrupted load are skipped, see LoadCheckpoint.
+    """
+    def __init__(
+        self,
+        db: api.VectorDB,
+        dataset: DatasetManager,
+        normalize: bool,
+        timeout: float | None = None,
+        checkpoint: LoadCheckpoint | None = None,
+    ):
         self.timeout = timeout if isinstance(timeout, (int, float)) else None
         self.dataset = dataset
         self.db = db
         self.normalize = normalize
+        self.checkpoint = checkpoint
+        self.load_stats = LoadStats()
+        self.retry_policy = RetryPolicy()
+
+    @staticmethod
+    def num_writers(db: api.VectorDB, workers: int) -> int:
+        """writer processes of the load, 1 if the client doesn't support parallel insert"""
+        if not db.parallel_insert and workers > 1:
+            log.warning(f"{db.__class__.__name__} doesn't support parallel insert, fall back to 1 writer")
+            return 1
+        return max(workers, 1)
+
+    def preprocess(self, data: tuple[np.ndarray, np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+        """normalize the batch unless the dataset is prepared with normalized embeddings already"""
+        ids, emb_np = data
+        if self.normalize and not self.dataset.normalized:
+            log.debug("normalize the train data batch")
+            emb_np = preprocess.normalize(emb_np)
+        return ids, emb_np
+
+    def encode(self, data: tuple[np.ndarray, np.ndarray]) -> tuple[list | np.ndarray, list | np.ndarray]:
+        """convert a batch into the (embeddings, metadata) accepted by the client"""
+        ids, emb_np = data
+        if self.db.numpy_vectors:
+            return emb_np, ids
+        return emb_np.tolist(), ids.tolist()
+
+    def task(self, worker: int = 0, num_workers: int = 1, send_last_batch: bool = True) -> tuple[int, LoadStats]:
+        """insert the shard of `worker` through the read -> preprocess -> encode -> send pipeline,
+        send_last_batch is only allowed for a single writer
+
+        Returns:
+            tuple[int, LoadStats]: count inserted by this call, the timings of each stage and of each insert_embeddings
+        """
+        assert num_workers == 1 or not send_last_batch
+        batches, count, sent_last_batch = 0, 0, False
+        stats = LoadStats()
+        if self.checkpoint is not None:
+            progress = self.checkpoint.progress(worker)
+            batches, count = progress["batches"], progress["rows"]
+            started = self.checkpoint.started
+            if batches:
+                log.info(f"({mp.current_process().name:16}) Resume loading after {batches} batches, {count} embeddings")
+        resumed = count
+
+        def send(data: tuple[list | np.ndarray, list | np.ndarray]):
+            nonlocal batches, count, sent_last_batch
+            all_embeddings, all_metadata = data
+            log.debug(f"batch dataset size: {len(all_embeddings)}, {len(all_metadata)}")
+
+            last_batch = send_last_batch and self.dataset.data.size - count == len(all_metadata)
+            s, backoff = time.perf_counter(), stats.retry.backoff
+            insert_count = insert_with_retry(
+                self.db, all_embeddings, all_metadata, self.retry_policy, stats.retry,
+                last_batch=last_batch,
+            )
+            # the time slept between the retries is not the latency of the database
+            stats.timeline.add(time.perf_counter() - s - (stats.retry.backoff - backoff), insert_count)
+
+            assert insert_count == len(all_metadata)
+            count += insert_count
+            batches += 1
+            sent_last_batch = sent_last_batch or last_batch
+            if self.checkpoint is not None:
+                self.checkpoint.ack(worker, batches, count, started)
+            if count % 100_000 == 0:
+                log.info(f"({mp.current_process().name:16}) Loaded {count} embeddings into VectorDB")
 
-    def task(self) -> int:
-        count = 0
         with self.db.init():
             log.info(f"({mp.current_process().name:16}) Start inserting embeddings in batch {config.NUM_PER_BATCH}")
             start = time.perf_counter()
-            for data_df in self.dataset:
-                all_metadata = data_df['id'].tolist()
-
-                emb_np = np.stack(data_df['emb'])
-                if self.normalize:
-                    log.debug("normalize the 100k train data")
-                    all_embeddings = emb_np / np.linalg.norm(emb_np, axis=1)[:, np.newaxis].tolist()
-                else:
-                    all_embeddings = emb_np.tolist()
-                del(emb_np)
-                log.debug(f"batch dataset size: {len(all_embeddings)}, {len(all_metadata)}")
-
-                last_batch = self.dataset.data.size - count == len(all_metadata)
-                insert_count, error = self.db.insert_embeddings(
-                    embeddings=all_embeddings,
-                    metadata=all_metadata,
-                    last_batch=last_batch,
+            data_iter = self.dataset.iter_numpy(worker, num_workers, start=batches)
+            pipeline = Pipeline(
+                data_iter,
+                [("preprocess", self.preprocess), ("encode", self.encode), ("send", send)],
+                depth=config.INSERT_PIPELINE_DEPTH,
+            )
+            try:
+                stats.stages = pipeline.run()
+            finally:
+                if isinstance(data_iter, PrefetchDataSetIterator):
+                    data_iter.close()
+            if send_last_batch and resumed and not sent_last_batch:
+                # all the batches were acknowledged before the load was interrupted
+                insert_with_retry(self.db, [], [], self.retry_policy, stats.retry, last_batch=True)
+
+            if isinstance(data_iter, PrefetchDataSetIterator):
+                log.info(
+                    f"({mp.current_process().name:16}) Waited for dataset prefetching {data_iter.stall_count} times, "
+                    f"stall_duration={round(data_iter.stall_duration, 4)}s"
                 )
-                if error is not None:
-                    raise error
-
-                assert insert_count == len(all_metadata)
-                count += insert_count
-                if count % 100_000 == 0:
-                    log.info(f"({mp.current_process().name:16}) Loaded {count} embeddings into VectorDB")
-
-            log.info(f"({mp.current_process().name:16}) Finish loading all dataset into VectorDB, dur={time.perf_counter()-start}")
-            return count
-
-    def endless_insert_data(self, all_embeddings, all_metadata, left_id: int = 0) -> int:
-        with self.db.init():
-            # unique id for endlessness insertion
-            all_metadata = [i+left_id for i in all_metadata]
-
-            NUM_BATCHES = math.ceil(len(all_embeddings)/NUM_PER_BATCH)
-            log.info(f"({mp.current_process().name:16}) Start inserting {len(all_embeddings)} embeddings in batch {NUM_PER_BATCH}")
-            count = 0
-            for batch_id in range(NUM_BATCHES):
-                retry_count = 0
-                already_insert_count = 0
-                metadata = all_metadata[batch_id*NUM_PER_BATCH : (batch_id+1)*NUM_PER_BATCH]
-                embeddings = all_embeddings[batch_id*NUM_PER_BATCH : (batch_id+1)*NUM_PER_BATCH]
-
-                log.debug(f"({mp.current_process().name:16}) batch [{batch_id:3}/{NUM_BATCHES}], Start inserting {len(metadata)} embeddings")
-                while retry_count < LOAD_MAX_TRY_COUNT:
-                    insert_count, error = self.db.insert_embeddings(
-                        embeddings=embeddings[already_insert_count :],
-                        metadata=metadata[already_insert_count :],
-                    )
-                    already_insert_count += insert_count
-                    if error is not None:
-                        retry_count += 1
-                        time.sleep(WAITTING_TIME)
-
-                        log.info(f"Failed to insert data, try {retry_count} time")
-                        if retry_count >= LOAD_MAX_TRY_COUNT:
-                            raise error
-                    else:
-                        break
-                log.debug(f"({mp.current_process().name:16}) batch [{batch_id:3}/{NUM_BATCHES}], Finish inserting {len(metadata)} embeddings")
-
-                assert already_insert_count == len(metadata)
-                count += already_insert_count
-            log.info(f"({mp.current_process().name:16}) Finish inserting {len(all_embeddings)} embeddings in batch {NUM_PER_BATCH}")
-        return count
+            log.info(
+                f"({mp.current_process().name:16}) Finish loading all dataset into VectorDB, dur={time.perf_counter()-start}, "
+                f"stages={ {st.name: st.to_dict() for st in stats.stages} }, "
+                f"insert latency p50/p99/max={stats.timeline.percentiles()}, "
+                f"retries={stats.retry.retries}, backoff={round(stats.retry.backoff, 4)}s"
+            )
+            return count - resumed, stats
 
     @utils.time_it
-    def _insert_all_batches(self) -> int:
+    def _insert_all_batches(self) -> tuple[int, LoadStats]:
         """Performance case only"""
         with concurrent.futures.ProcessPoolExecutor(mp_context=mp.get_context('spawn'), max_workers=1) as executor:
             future = executor.submit(self.task)
             try:
-                count = future.result(timeout=self.timeout)
+                count, stats = future.result(timeout=self.timeout)
             except TimeoutError as e:
                 msg = f"VectorDB load dataset timeout in {self.timeout}"
                 log.warning(msg)
@@ -117,36 +155,11 @@ class SerialInsertRunner:
                 log.warning(f"VectorDB load dataset error: {e}")
                 raise e from e
             else:
-                return count
-
-    def run_endlessness(self) -> int:
-        """run forever util DB raises exception or crash"""
-        # datasets for load tests are quite small, can fit into memory
-        # only 1 file
-        data_df = [data_df for data_df in self.dataset][0]
-        all_embeddings, all_metadata = np.stack(data_df["emb"]).tolist(), data_df['id'].tolist()
-
-        start_time = time.perf_counter()
-        max_load_count, times = 0, 0
-        try:
-            with self.db.init():
-                self.db.ready_to_load()
-            while time.perf_counter() - start_time < self.timeout:
-                count = self.endless_insert_data(all_embeddings, all_metadata, left_id=max_load_count)
-                max_load_count += count
-                times += 1
-                log.info(f"Loaded {times} entire dataset, current max load counts={utils.numerize(max_load_count)}, {max_load_count}")
-        except Exception as e:
-            log.info(f"Capacity case load reach limit, insertion counts={utils.numerize(max_load_count)}, {max_load_count}, err={e}")
-            traceback.print_exc()
-            return max_load_count
-        else:
-            msg = f"capacity case load timeout in {self.timeout}s"
-            log.info(msg)
-            raise LoadTimeoutError(msg)
+                return count, stats
 
     def run(self) -> int:
-        count, dur = self._insert_all_batches()
+        """insert the entire dataset, the timings measured are kept in load_stats"""
+        (count, self.load_stats), dur = self._insert_all_batches()
         return count
 
 
@@ -163,14 +176,21 @@ class SerialSearchRunner:
         self.k = k
         self.filters = filters
 
-        if isinstance(test_data[0], np.ndarray):
+        if len(test_data) > 0 and isinstance(test_data[0], np.ndarray) and not self.db.numpy_vectors:
             self.test_data = [query.tolist() for query in test_data]
         else:
             self.test_data = test_data
         self.ground_truth = ground_truth
-        self.load_mem = self.db.load_mem
 
-    def search(self, args: tuple[list, pd.DataFrame]):
+    def search(self, args: tuple[list, pd.DataFrame]) -> dict:
+        """Search the test queries one by one, each search_embedding call timed on its own,
+        then all of them in one search_batch call.
+
+        Returns:
+            dict: recall, recall_at_{1, 10, 100}, ndcg and mrr, see recall.calc_recall_stats,
+                serial_latency_{p50, p90, p95, p99, p999, max, mean} in seconds,
+                batch_search_qps, batch_search_nq and load_mem, fields of Metric.
+        """
         log.info(f"{mp.current_process().name:14} start search the entire test_data to get recall and latency")
         with self.db.init():
             test_data, ground_truth = args
@@ -178,39 +198,43 @@ class SerialSearchRunner:
             log.debug(f"test dataset size: {len(test_data)}")
             log.debug(f"ground truth size: {ground_truth.columns}, shape: {ground_truth.shape}")
 
-            latencies, recalls = [], []
-            quries = [emb for emb in test_data]
-            s = time.perf_counter()
-            results = self.db.search_batch(
-                quries,
-                self.k,
-                self.filters,
-            )
-            latencies.append(time.perf_counter() - s)
-            for idx, res in enumerate(results):
-                gt = ground_truth['neighbors_id'][idx]
-                recalls.append(calc_recall(self.k, gt[:self.k], res))
-        avg_latency = round(np.mean(latencies) / len(quries), 4)
-        avg_recall = round(np.mean(recalls), 4)
-        cost = round(np.sum(latencies), 4)
-        p99 = round(np.percentile(latencies, 99), 4)
-        qps = round(1.0 / avg_latency, 4)
+            latencies, results = [], []
+            for query in test_data:
+                s = time.perf_counter_ns()
+                res = self.db.search_embedding(query, self.k, self.filters)
+                latencies.append(time.perf_counter_ns() - s)
+                results.append(res)
+
+            batch_qps, nq = 0.0, 0
+            if len(test_data) > 1:
+                nq = len(test_data)
+                s = time.perf_counter_ns()
+                self.db.search_batch(test_data, self.k, self.filters)
+                batch_qps = round(nq / ((time.perf_counter_ns() - s) / 1e9), 4)
+
+        result = {
+            **calc_recall_stats(results, ground_truth['neighbors_id'], self.k),
+            **calc_latency_stats(latencies),
+            "batch_search_qps": batch_qps,
+            "batch_search_nq": nq,
+            "load_mem": self.db.load_mem,
+        }
         log.info(
             f"{mp.current_process().name:14} search entire test_data: "
-            f"cost={cost}s, "
-            f"queries={len(quries)}, "
-            f"avg_recall={avg_recall}, "
-            f"avg_latency={avg_latency}, "
-            f"QPS@(NQ = {len(quries)}) = {qps}"
+            f"cost={round(sum(latencies) / 1e9, 4)}s, "
+            f"queries={len(test_data)}, "
+            f"avg_recall={result.get('recall', 0.0)}, "
+            f"latency p50/p99/max={result['serial_latency_p50']}/{result['serial_latency_p99']}/{result['serial_latency_max']}s, "
+            f"batch QPS@(NQ = {nq}) = {batch_qps}"
          )
-        return (avg_recall, p99, self.load_mem)
+        return result
 
 
-    def _run_in_subprocess(self) -> tuple[float, float]:
+    def _run_in_subprocess(self) -> dict:
         with concurrent.futures.ProcessPoolExecutor(max_workers=1) as executor:
             future = executor.submit(self.search, (self.test_data, self.ground_truth))
             result = future.result()
             return result
 
-    def run(self) -> tuple[float, float]:
+    def run(self) -> dict:
         return self._run_in_subprocess()
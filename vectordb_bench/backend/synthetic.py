@@ -0,0 +1,111 @@
+"""
+Usage:
+    >>> from xxx.dataset import Synthetic, DatasetManager
+    >>> ds = DatasetManager(data=Synthetic(size=1_000_000, dim=256, distribution="clustered"))
+    >>> ds.prepare()
+"""
+
+import math
+import logging
+import pathlib
+from enum import Enum
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .clients import MetricType
+from .ground_truth import TopK, write_neighbors
+
+log = logging.getLogger(__name__)
+
+ROWS_PER_FILE = 1_000_000
+BLOCK_SIZE = 100_000  # rows generated at once, the data depends only on the seed and the block index
+NUM_CLUSTERS = 100
+CLUSTER_STD = 0.1
+
+
+class SyntheticDistribution(str, Enum):
+    GAUSSIAN = "gaussian"
+    CLUSTERED = "clustered"
+    NORMALIZED = "normalized"
+
+
+def to_arrow(ids: np.ndarray, emb: np.ndarray) -> pa.RecordBatch:
+    """RecordBatch of id: int64, emb: list<float32>, the layout of the dataset parquet files"""
+    offsets = pa.array(np.arange(0, emb.size + 1, emb.shape[1], dtype=np.int32))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(ids, type=pa.int64()), pa.ListArray.from_arrays(offsets, pa.array(emb.ravel()))],
+        names=["id", "emb"],
+    )
+
+
+class SyntheticGenerator:
+    """Deterministic random vectors of the distribution, seeded by (seed, stream, block)"""
+
+    TRAIN, TEST, CENTERS = 0, 1, 2
+
+    def __init__(self, dim: int, distribution: SyntheticDistribution, seed: int):
+        self.dim = dim
+        self.distribution = SyntheticDistribution(distribution)
+        self.seed = seed
+        self.centers = None
+        if self.distribution == SyntheticDistribution.CLUSTERED:
+            rng = np.random.default_rng([seed, self.CENTERS])
+            self.centers = rng.standard_normal((NUM_CLUSTERS, dim), dtype=np.float32)
+
+    def block(self, n: int, stream: int, block_idx: int = 0) -> np.ndarray:
+        rng = np.random.default_rng([self.seed, stream, block_idx])
+        if self.distribution == SyntheticDistribution.CLUSTERED:
+            labels = rng.integers(0, NUM_CLUSTERS, n)
+            return self.centers[labels] + rng.standard_normal((n, self.dim), dtype=np.float32) * CLUSTER_STD
+
+        emb = rng.standard_normal((n, self.dim), dtype=np.float32)
+        if self.distribution == SyntheticDistribution.NORMALIZED:
+            emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+        return emb
+
+
+def write_synthetic_dataset(
+    data_dir: pathlib.Path,
+    size: int,
+    dim: int,
+    metric_type: MetricType,
+    distribution: SyntheticDistribution,
+    seed: int,
+    num_test: int = 1000,
+    k: int = 100,
+) -> list[str]:
+    """Write train-*.parquet, test.parquet and the exact ground truth neighbors.parquet into data_dir.
+
+    Train data is generated in blocks and streamed into the files and the ground truth computation,
+    so memory usage doesn't grow with the size.
+
+    Returns:
+        list[str]: names of the files written.
+    """
+    data_dir.mkdir(parents=True, exist_ok=True)
+    gen = SyntheticGenerator(dim, distribution, seed)
+    test = gen.block(num_test, SyntheticGenerator.TEST)
+    topk = TopK(test, k, metric_type)
+
+    num_files = math.ceil(size / ROWS_PER_FILE)
+    file_names = [f"train-{i:02d}-of-{num_files:02d}.parquet" for i in range(num_files)]
+    schema = to_arrow(np.empty(0, dtype=np.int64), np.empty((0, dim), dtype=np.float32)).schema
+
+    log.info(f"generating synthetic dataset {distribution}, size={size}, dim={dim}, seed={seed} in {data_dir}")
+    for file_idx, file_name in enumerate(file_names):
+        with pq.ParquetWriter(data_dir.joinpath(file_name), schema) as writer:
+            file_end = min((file_idx + 1) * ROWS_PER_FILE, size)
+            for start in range(file_idx * ROWS_PER_FILE, file_end, BLOCK_SIZE):
+                end = min(start + BLOCK_SIZE, file_end)
+                ids = np.arange(start, end, dtype=np.int64)
+                emb = gen.block(end - start, SyntheticGenerator.TRAIN, start // BLOCK_SIZE)
+                writer.write_batch(to_arrow(ids, emb))
+                topk.add(ids, emb)
+        log.info(f"generated {file_name}")
+
+    pq.write_table(pa.Table.from_batches([to_arrow(np.arange(num_test, dtype=np.int64), test)]), data_dir.joinpath("test.parquet"))
+
+    write_neighbors(data_dir.joinpath("neighbors.parquet"), np.arange(num_test), *topk.result())
+    return [*file_names, "test.parquet", "neighbors.parquet"]
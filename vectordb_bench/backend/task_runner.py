@@ -1,3 +1,4 @@
+import json
 import logging
 import psutil
 import traceback
@@ -5,7 +6,8 @@ import concurrent
 import numpy as np
 from enum import Enum, auto
 
-from . import utils
+from . import utils, preprocess
+from .. import config
 from .cases import Case, CaseLabel
 from ..base import BaseModel
 from ..models import TaskConfig, PerformanceTimeoutError
@@ -18,7 +20,9 @@ from .clients import (
 )
 from ..metric import Metric
 from .runner import MultiProcessingSearchRunner
-from .runner import SerialSearchRunner, SerialInsertRunner
+from .runner import SerialSearchRunner, SerialInsertRunner, MultiProcessingInsertRunner, CapacityInsertRunner
+from .runner.load_stats import LoadStats
+from .runner.checkpoint import LoadCheckpoint
 
 
 log = logging.getLogger(__name__)
@@ -40,6 +44,8 @@ class CaseRunner(BaseModel):
         status(RunningStatus): RunningStatus of this case runner.
 
         db(api.VectorDB): The vector database for this case runner.
+        checkpoint(LoadCheckpoint): progress of the load of a performance case,
+            resumed instead of loading from the first row if config.LOAD_RESUME.
     """
 
     run_id: str
@@ -48,9 +54,11 @@ class CaseRunner(BaseModel):
     status: RunningStatus
 
     db: api.VectorDB | None = None
-    test_emb: list[list[float]] | None = None
+    test_emb: list[list[float]] | np.ndarray | None = None
     search_runner: MultiProcessingSearchRunner | None = None
     serial_search_runner: SerialSearchRunner | None = None
+    checkpoint: LoadCheckpoint | None = None
+    resume_load: bool = False
 
     def __eq__(self, obj):
         if isinstance(obj, CaseRunner):
@@ -67,8 +75,7 @@ class CaseRunner(BaseModel):
 
     @property
     def normalize(self) -> bool:
-        assert self.db
-        return True
+        return preprocess.needs_normalize(self.ca.dataset.data.metric_type)
 
     def init_db(self, drop_old: bool = True) -> None:
         db_cls = self.config.db.init_cls
@@ -80,14 +87,59 @@ class CaseRunner(BaseModel):
             drop_old=drop_old,
         )
 
+    @property
+    def insert_workers(self) -> int:
+        return config.NUM_INSERT_WORKERS if self.config.db.init_cls.parallel_insert else 1
+
+    def _checkpoint_key(self) -> str:
+        return json.dumps([
+            self.config.db.value,
+            self.config.db_config.to_dict(),
+            str(self.config.db_case_config),
+            self.ca.case_id,
+            self.ca.dataset.data.dir_name,
+            self.ca.dataset.data.use_shuffled,
+        ], default=str)
+
     def _pre_run(self, drop_old: bool = True):
         try:
-            self.ca.dataset.prepare()
-            self.init_db(drop_old)
+            self.ca.dataset.prepare(normalize=self.normalize)
+            self.checkpoint, self.resume_load = None, False
+            if drop_old and self.ca.label == CaseLabel.Performance:
+                self.checkpoint = LoadCheckpoint.of(config.LOAD_CHECKPOINT_DIR, self._checkpoint_key())
+                if config.LOAD_RESUME and self.checkpoint.meta():
+                    self.init_db(drop_old=False)
+                    self.resume_load = self._verify_checkpoint()
+            if not self.resume_load:
+                self.init_db(drop_old)
         except Exception as e:
             log.warning(f"pre run case error: {e}")
             raise e from None
 
+    def _verify_checkpoint(self) -> bool:
+        """whether the interrupted load recorded in the checkpoint can be resumed,
+        the collection must have exactly the rows acknowledged in the checkpoint"""
+        use_cache = self.ca.dataset.use_cache
+        if not self.checkpoint.resumable(self.insert_workers, use_cache):
+            log.info(
+                f"The checkpoint of the load is sharded differently from {self.insert_workers} writers "
+                f"with use_cache={use_cache}, start over"
+            )
+            return False
+
+        rows = self.checkpoint.rows()
+        try:
+            with self.db.init():
+                count = self.db.count()
+        except NotImplementedError:
+            log.warning(f"{self.config.db_name} can't count the embeddings to verify the checkpoint, start over")
+            return False
+        if count != rows:
+            log.warning(f"{count} embeddings in the collection while {rows} are acknowledged in the checkpoint, start over")
+            return False
+        log.info(f"Resume the load of {self.config.db_name} after {rows} embeddings")
+        return True
+
     def run(self, drop_old: bool = True) -> Metric:
         self._pre_run(drop_old)
 
@@ -108,37 +160,49 @@ class CaseRunner(BaseModel):
         """
         log.info("Start capacity case")
         try:
-            runner = SerialInsertRunner(self.db, self.ca.dataset, self.normalize, self.ca.load_timeout)
+            runner = CapacityInsertRunner(self.db, self.ca.dataset, self.normalize, self.ca.load_timeout)
             count = runner.run_endlessness()
         except Exception as e:
             log.warning(f"Failed to run capacity case, reason = {e}")
             raise e from None
         else:
             log.info(f"Capacity case loading dataset reaches VectorDB's limit: max capacity = {count}")
-            return Metric(max_load_count=count)
+            m = Metric(max_load_count=count, capacity_curve=runner.curve.to_dict())
+            self._set_retry_metrics(m, runner.load_stats)
+            return m
 
     def _run_perf_case(self, drop_old: bool = True) -> Metric:
         """ run performance cases
 
         Returns:
-            Metric: load_duration, recall, serial_latency_p99, and, qps
+            Metric: load_duration, recall, serial_latency_*, batch_search_qps, qps, and, conc_results
         """
         try:
             m = Metric()
             if drop_old:
-                _, load_dur = self._load_train_data()
+                load_stats, load_dur = self._load_train_data()
+                # the interrupted loads resumed by this one
+                load_dur += self.checkpoint.duration
+                m.load_stages = {s.name: s.to_dict() for s in load_stats.stages}
+                m.insert_latency_p50, m.insert_latency_p99, m.insert_latency_max = load_stats.timeline.percentiles()
+                m.insert_timeline = load_stats.timeline.series()
+                self._set_retry_metrics(m, load_stats)
                 build_dur = self._optimize()
                 m.load_duration = round(load_dur+build_dur, 4)
+                self.checkpoint.clear()
                 log.info(
                     f"Finish loading the entire dataset into VectorDB,"
                     f" insert_duration={load_dur}, optimize_duration={build_dur}"
-                    f" load_duration(insert + optimize) = {m.load_duration}"
+                    f" load_duration(insert + optimize) = {m.load_duration},"
+                    f" insert_retries={m.insert_retries}, insert_backoff={m.insert_backoff}"
                 )
 
             self._init_search_runner()
-            m.recall, m.serial_latency_p99, m.load_mem = self._serial_search()
+            for key, value in self._serial_search().items():
+                setattr(m, key, value)
 
             m.qps = self._conc_search()
+            m.conc_results = self.search_runner.conc_results
         except Exception as e:
             log.warning(f"Failed to run performance case, reason = {e}")
             traceback.print_exc()
@@ -147,23 +211,41 @@ class CaseRunner(BaseModel):
             log.info(f"Performance case got result: {m}")
             return m
 
+    @staticmethod
+    def _set_retry_metrics(m: Metric, load_stats: LoadStats):
+        m.insert_retries = load_stats.retry.retries
+        m.insert_backoff = round(load_stats.retry.backoff, 4)
+        m.insert_errors = dict(load_stats.retry.errors)
+
     @utils.time_it
-    def _load_train_data(self):
-        """Insert train data and get the insert_duration"""
+    def _load_train_data(self) -> LoadStats:
+        """Insert train data and get the insert_duration and the timings measured while inserting"""
         try:
-            runner = SerialInsertRunner(self.db, self.ca.dataset, self.normalize, self.ca.load_timeout)
+            if self.resume_load:
+                self.checkpoint.resume()
+            else:
+                self.checkpoint.reset(self.insert_workers, self.ca.dataset.use_cache)
+            if self.insert_workers > 1:
+                runner = MultiProcessingInsertRunner(
+                    self.db, self.ca.dataset, self.normalize, self.ca.load_timeout, checkpoint=self.checkpoint,
+                )
+            else:
+                runner = SerialInsertRunner(
+                    self.db, self.ca.dataset, self.normalize, self.ca.load_timeout, checkpoint=self.checkpoint,
+                )
             runner.run()
+            return runner.load_stats
         except Exception as e:
             raise e from None
         finally:
             runner = None
 
-    def _serial_search(self) -> tuple[float, float, int]:
+    def _serial_search(self) -> dict:
         """Performance serial tests, search the entire test data once,
-        calculate the recall, serial_latency_p99
+        calculate the recall, the latency percentiles of single queries, and the batch search qps
 
         Returns:
-            tuple[float, float]: recall, serial_latency_p99
+            dict: the Metric fields measured, see SerialSearchRunner.search
         """
         try:
             return self.serial_search_runner.run()
@@ -207,10 +289,11 @@ class CaseRunner(BaseModel):
                 raise e from None
 
     def _init_search_runner(self):
-        test_emb = np.stack(self.ca.dataset.test_data["emb"])
-        if self.normalize:
-            test_emb = test_emb / np.linalg.norm(test_emb, axis=1)[:, np.newaxis]
-        self.test_emb = test_emb.tolist()
+        test_emb = self.ca.dataset.test_emb()
+        if self.db.numpy_vectors:
+            self.test_emb = test_emb
+        else:
+            self.test_emb = test_emb.tolist()
 
         gt_df = self.ca.dataset.get_ground_truth(self.ca.filter_rate)
 
@@ -1,4 +1,6 @@
+import os
 import time
+from hashlib import md5
 from functools import wraps
 
 
@@ -42,3 +44,46 @@ def time_it(func):
         delta = time.perf_counter() - pref
         return result, delta
     return inner
+
+
+def match_etag(expected_etag: str, local_file) -> int | None:
+    """Check if the local file's etag matches with S3 by computing its (multipart) md5
+
+    Returns:
+        int | None: the part size the etag matched with, 0 for a single part upload,
+            None if the etag doesn't match.
+    """
+    def factor_of_1MB(filesize, num_parts):
+        x = filesize / int(num_parts)
+        y = x % 1048576
+        return int(x + 1048576 - y)
+
+    def calc_etag(inputfile, partsize):
+        md5_digests = []
+        with open(inputfile, 'rb') as f:
+            for chunk in iter(lambda: f.read(partsize), b''):
+                md5_digests.append(md5(chunk).digest())
+        return md5(b''.join(md5_digests)).hexdigest() + '-' + str(len(md5_digests))
+
+    def possible_partsizes(filesize, num_parts):
+        return lambda partsize: partsize < filesize and (float(filesize) / float(partsize)) <= num_parts
+
+    filesize = os.path.getsize(local_file)
+    if '-' not in expected_etag: # no spliting uploading
+        h = md5()
+        with open(local_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(8388608), b''):
+                h.update(chunk)
+        return 0 if expected_etag == h.hexdigest() else None
+
+    num_parts = int(expected_etag.split('-')[-1])
+    partsizes = [ ## Default Partsizes Map
+        8388608, # aws_cli/boto3
+        15728640, # s3cmd
+        factor_of_1MB(filesize, num_parts) # Used by many clients to upload large files
+    ]
+
+    for partsize in filter(possible_partsizes(filesize, num_parts), partsizes):
+        if expected_etag == calc_etag(local_file, partsize):
+            return partsize
+    return None
@@ -45,6 +45,10 @@ def drawChart(data, st):
         container = st.container()
         drawMetricChart(data, metric, container)
 
+    drawInsertTimelineChart(data, st.container())
+    drawCapacityCurveChart(data, st.container())
+    drawConcurrencyChart(data, st.container())
+
 
 def getLabelToShapeMap(data):
     labelIndexMap = {}
@@ -162,3 +166,115 @@ def drawMetricChart(data, metric, st):
     )
 
     chart.plotly_chart(fig, use_container_width=True)
+
+
+def drawInsertTimelineChart(data, st):
+    points = []
+    for d in data:
+        timeline = d.get("insert_timeline") or {}
+        interval = timeline.get("interval", 0)
+        for i, (rows_per_sec, latency_p99) in enumerate(
+            zip(timeline.get("rows_per_sec", []), timeline.get("latency_p99", []), strict=True)
+        ):
+            points.append({
+                "db_name": d["db_name"],
+                "time": (i + 1) * interval,
+                "rows_per_sec": rows_per_sec,
+                "latency_p99": latency_p99 * 1000,
+            })
+    if len(points) == 0:
+        return
+
+    fig = px.line(
+        points,
+        x="time",
+        y="rows_per_sec",
+        color="db_name",
+        hover_data={"latency_p99": ":.4~r"},
+        labels={
+            "time": "time since the load started (s)",
+            "rows_per_sec": "rows/s",
+            "latency_p99": "insert latency p99 (ms)",
+        },
+        title="Insert throughput over time (more is better)",
+    )
+    fig.update_layout(
+        margin=dict(l=0, r=0, t=48, b=12, pad=8),
+        legend=dict(orientation="h", yanchor="bottom", y=1, xanchor="right", x=1, title=""),
+        title=dict(font=dict(size=16, color="#666"), pad=dict(l=16)),
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+
+def drawCapacityCurveChart(data, st):
+    points = []
+    for d in data:
+        curve = d.get("capacity_curve") or {}
+        for rows, rows_per_sec, mem in zip(
+            curve.get("rows", []), curve.get("rows_per_sec", []), curve.get("mem", []), strict=True
+        ):
+            points.append({
+                "db_name": d["db_name"],
+                "rows": rows,
+                "rows_per_sec": rows_per_sec,
+                "mem": mem / 1024 / 1024 if mem is not None else None,
+            })
+    if len(points) == 0:
+        return
+
+    fig = px.line(
+        points,
+        x="rows",
+        y="rows_per_sec",
+        color="db_name",
+        hover_data={"mem": ":.4~r"},
+        labels={
+            "rows": "rows loaded",
+            "rows_per_sec": "rows/s",
+            "mem": "memory (MB)",
+        },
+        title="Insert throughput by rows loaded (more is better)",
+    )
+    fig.update_layout(
+        margin=dict(l=0, r=0, t=48, b=12, pad=8),
+        legend=dict(orientation="h", yanchor="bottom", y=1, xanchor="right", x=1, title=""),
+        title=dict(font=dict(size=16, color="#666"), pad=dict(l=16)),
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+
+def drawConcurrencyChart(data, st):
+    points = []
+    for d in data:
+        for result in d.get("conc_results") or []:
+            points.append({
+                "db_name": d["db_name"],
+                "concurrency": result["concurrency"],
+                "qps": result["qps"],
+                "errors": result["errors"],
+                "latency_p99": result["latency_p99"],
+            })
+    if len(points) == 0:
+        return
+
+    fig = px.line(
+        points,
+        x="concurrency",
+        y="qps",
+        color="db_name",
+        markers=True,
+        hover_data={"latency_p99": ":.4~r", "errors": True},
+        labels={
+            "concurrency": "concurrency",
+            "qps": "qps",
+            "latency_p99": "search latency p99 (ms)",
+            "errors": "errors",
+        },
+        title="Search throughput by concurrency (more is better)",
+    )
+    fig.update_layout(
+        margin=dict(l=0, r=0, t=48, b=12, pad=8),
+        legend=dict(orientation="h", yanchor="bottom", y=1, xanchor="right", x=1, title=""),
+        title=dict(font=dict(size=16, color="#666"), pad=dict(l=16)),
+    )
+    st.plotly_chart(fig, use_container_width=True)
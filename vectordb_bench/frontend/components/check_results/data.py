@@ -79,6 +79,10 @@ def mergeTasks(tasks: list[CaseResult]):
 def mergeMetrics(metrics_1: dict, metrics_2: dict) -> dict:
     metrics = {**metrics_1}
     for key, value in metrics_2.items():
+        if key in metrics and not isinstance(value, (int, float)):
+            # keep the first non-empty detail, such as the timings of the insert stages
+            metrics[key] = metrics[key] or value
+            continue
         metrics[key] = (
             getBetterMetric(key, value, metrics[key]) if key in metrics else value
         )
@@ -1,7 +1,7 @@
 import logging
 import numpy as np
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 
 log = logging.getLogger(__name__)
@@ -13,13 +13,49 @@ class Metric:
 
     # for load cases
     max_load_count: int = 0
+    # rows/s and database memory sampled while loading, {"rows", "elapsed", "rows_per_sec", "mem"}
+    capacity_curve: dict = field(default_factory=dict)
 
     # for performance cases
     load_duration: float = 0.0  # duration to load all dataset into DB
     qps: float = 0.0
+    # one entry per concurrency of the concurrent search, qps is the max of them,
+    # [{"concurrency", "qps", "errors", "duration", "latency_p50", "latency_p95", "latency_p99", "latency_p999"}],
+    # duration and the search_embedding latencies in seconds
+    conc_results: list[dict] = field(default_factory=list)
+    # latency of each search_embedding call of the serial search, in seconds
+    serial_latency_p50: float = 0.0
+    serial_latency_p90: float = 0.0
+    serial_latency_p95: float = 0.0
     serial_latency_p99: float = 0.0
+    serial_latency_p999: float = 0.0
+    serial_latency_max: float = 0.0
+    serial_latency_mean: float = 0.0
+    # queries/s of one search_batch call over all the test queries
+    batch_search_qps: float = 0.0
+    batch_search_nq: int = 0
     recall: float = 0.0
+    # recall of the first 1, 10, 100 results, nDCG, MRR and distance ratio of the serial search, see backend.recall
+    recall_at_1: float = 0.0
+    recall_at_10: float = 0.0
+    recall_at_100: float = 0.0
+    ndcg: float = 0.0
+    mrr: float = 0.0
+    distance_ratio: float = 0.0
     load_mem: int = 0
+    # busy/idle/stall seconds of each insert pipeline stage: read, preprocess, encode, send
+    load_stages: dict[str, dict[str, float]] = field(default_factory=dict)
+    # latency of each insert_embeddings call
+    insert_latency_p50: float = 0.0
+    insert_latency_p99: float = 0.0
+    insert_latency_max: float = 0.0
+    # rows/s and p99 insert latency per `interval` seconds, {"interval", "rows_per_sec", "latency_p99"}
+    insert_timeline: dict = field(default_factory=dict)
+    # retries of the failed inserts and the seconds slept before them, which are part of load_duration,
+    # and the count of the insert errors by kind: retryable, throttled, fatal
+    insert_retries: int = 0
+    insert_backoff: float = 0.0
+    insert_errors: dict[str, int] = field(default_factory=dict)
 
 QURIES_PER_DOLLAR_METRIC = "QP$ (Quries per Dollar)"
 LOAD_DURATION_METRIC = "load_duration"
@@ -28,6 +64,7 @@ MAX_LOAD_COUNT_METRIC = "max_load_count"
 QPS_METRIC = "qps"
 RECALL_METRIC = "recall"
 LOAD_MEM_METRIC = "load_mem"
+INSERT_LATENCY_P99_METRIC = "insert_latency_p99"
 
 metricUnitMap = {
     LOAD_DURATION_METRIC: "s",
@@ -35,11 +72,13 @@ metricUnitMap = {
     MAX_LOAD_COUNT_METRIC: "K",
     QURIES_PER_DOLLAR_METRIC: "K",
     LOAD_MEM_METRIC: "MB",
+    INSERT_LATENCY_P99_METRIC: "ms",
 }
 
 lowerIsBetterMetricList = [
     LOAD_DURATION_METRIC,
     SERIAL_LATENCY_P99_METRIC,
+    INSERT_LATENCY_P99_METRIC,
 ]
 
 metricOrder = [
@@ -49,6 +88,7 @@ metricOrder = [
     SERIAL_LATENCY_P99_METRIC,
     MAX_LOAD_COUNT_METRIC,
     LOAD_MEM_METRIC,
+    INSERT_LATENCY_P99_METRIC,
 ]
 
 
@@ -56,10 +96,28 @@ def isLowerIsBetterMetric(metric: str) -> bool:
     return metric in lowerIsBetterMetricList
 
 
-def calc_recall(count: int, ground_truth: list[int], got: list[int]) -> float:
-    recalls = np.zeros(count)
-    for i, result in enumerate(got):
-        if result in ground_truth:
-            recalls[i] = 1
+SERIAL_LATENCY_PERCENTILES = {"p50": 50, "p90": 90, "p95": 95, "p99": 99, "p999": 99.9}
+
+
+def calc_latency_stats(latencies_ns: list[int] | np.ndarray) -> dict[str, float]:
+    """serial_latency_{p50, p90, p95, p99, p999, max, mean} in seconds of the latencies in nanoseconds, 0 if there are none"""
+    names = [f"serial_latency_{name}" for name in SERIAL_LATENCY_PERCENTILES] + ["serial_latency_max", "serial_latency_mean"]
+    if len(latencies_ns) == 0:
+        return dict.fromkeys(names, 0.0)
+    lat = np.asarray(latencies_ns, dtype=np.float64) / 1e9
+    stats = {
+        f"serial_latency_{name}": round(float(v), 6)
+        for name, v in zip(
+            SERIAL_LATENCY_PERCENTILES, np.percentile(lat, list(SERIAL_LATENCY_PERCENTILES.values())), strict=True,
+        )
+    }
+    stats["serial_latency_max"] = round(float(lat.max()), 6)
+    stats["serial_latency_mean"] = round(float(lat.mean()), 6)
+    return stats
 
-    return np.mean(recalls)
+
+
+def calc_recall(count: int, ground_truth: list[int], got: list[int]) -> float:
+    """recall of one query, see backend.recall.calc_recall_stats for the recall of many queries"""
+    ground_truth = set(ground_truth)
+    return sum(1 for result in got if result in ground_truth) / count
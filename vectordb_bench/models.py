@@ -167,6 +167,17 @@ class TestResult(BaseModel):
                     case_result["metrics"]["serial_latency_p99"] = (
                         cur_latency * 1000 if cur_latency > 0 else cur_latency
                     )
+
+                    for key in (
+                        "serial_latency_p50", "serial_latency_p90", "serial_latency_p95", "serial_latency_p999",
+                        "serial_latency_max", "serial_latency_mean",
+                        "insert_latency_p50", "insert_latency_p99", "insert_latency_max",
+                    ):
+                        if key in case_result["metrics"]:
+                            case_result["metrics"][key] *= 1000
+                    for conc_result in case_result["metrics"].get("conc_results", []):
+                        for key in ("latency_p50", "latency_p95", "latency_p99", "latency_p999"):
+                            conc_result[key] *= 1000
             c = TestResult.validate(test_result)
 
             return c